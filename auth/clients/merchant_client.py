@@ -1,10 +1,18 @@
+import asyncio
 from typing import Optional
 import aiohttp
 from auth.dto import UserCreate
-from auth.exceptions import MerchantCreationFailed
+from auth.exceptions import DeadlineExceeded, MerchantCreationFailed
+from auth.utils import codec
+from auth.utils.api_utils import retry_with_backoff
+from auth.utils.deadline import expired, timeout_for
 from loguru import logger
 import os
 
+# Fields the auth path actually reads from the merchant payload
+AUTH_MERCHANT_FIELDS = ("id",)
+IDENTITY_FIELDS = ("id", "is_active")
+
 
 class MerchantApiClient:
     def __init__(self, session: aiohttp.ClientSession, config: Optional[dict] = None):
@@ -16,23 +24,49 @@ class MerchantApiClient:
         self.prefix = "/merchant"
         self.base_url = f"{self.service_url}{self.prefix}"
 
-    async def _get_merchant(self, username: str) -> Optional[dict]:
-        try:
-            async with self.session.get(
-                f"{self.base_url}/get_merchant?username={username}"
-            ) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    if data:
-                        return data
-                elif resp.status == 404:
-                    return None
+        config = config or {}
+        self.decode_mode = config.get(
+            "decode_mode", os.getenv("USER_CLIENT_DECODE_MODE", "light")
+        )
+        self.timeout = float(
+            config.get("timeout", os.getenv("USER_SERVICE_TIMEOUT", "5"))
+        )
+
+    def _timeout(self, operation: str) -> aiohttp.ClientTimeout:
+        return aiohttp.ClientTimeout(total=timeout_for(operation, self.timeout))
+
+    @retry_with_backoff(name="user_service.get_merchant")
+    async def _request_merchant(
+        self, username: str, fields: tuple[str, ...] = AUTH_MERCHANT_FIELDS
+    ) -> Optional[dict]:
+        async with self.session.get(
+            f"{self.base_url}/get_merchant?username={username}",
+            timeout=self._timeout("user_service.get_merchant"),
+        ) as resp:
+            if resp.status == 200:
+                raw = await resp.read()
+                if self.decode_mode == "light":
+                    data = codec.pick(raw, fields)
                 else:
-                    msg = f"Merchant {username} not found"
-                    logger.info(msg)
-                    return None
+                    data = codec.loads(raw) if raw else None
+                if data:
+                    return data
+            elif resp.status != 404:
+                msg = f"Merchant {username} not found"
+                logger.info(msg)
+            return None
 
-        except aiohttp.ClientConnectionError:
+    async def _get_merchant(
+        self, username: str, fields: tuple[str, ...] = AUTH_MERCHANT_FIELDS
+    ) -> Optional[dict]:
+        try:
+            return await self._request_merchant(username, fields)
+
+        except DeadlineExceeded:
+            raise
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if expired():
+                raise DeadlineExceeded("Deadline exceeded calling user service")
             msg = "Failed to connect to user service"
             logger.error(msg)
             raise MerchantCreationFailed(msg)
@@ -40,8 +74,6 @@ class MerchantApiClient:
             msg = f"Unhandled exception: {e}"
             logger.error(msg)
             raise Exception(msg)
-        
-        return None
 
     async def get_merchant_id(self, username: str) -> Optional[int]:
         merchant = await self._get_merchant(username)
@@ -53,10 +85,12 @@ class MerchantApiClient:
     async def _create_merchant(self, merchant_registration_info: UserCreate) -> Optional[str]:
         try:
             async with self.session.post(
-                f"{self.base_url}/create", json=merchant_registration_info.model_dump()
+                f"{self.base_url}/create",
+                json=merchant_registration_info.model_dump(),
+                timeout=self._timeout("user_service.create_merchant"),
             ) as resp:
                 if resp.status == 200:
-                    data = await resp.json()
+                    data = codec.pick(await resp.read(), AUTH_MERCHANT_FIELDS)
                     if data:
                         return str(data["id"])
                 else:
@@ -64,7 +98,11 @@ class MerchantApiClient:
                     logger.error(msg)
                     raise MerchantCreationFailed(msg)
 
-        except aiohttp.ClientConnectionError:
+        except (DeadlineExceeded, MerchantCreationFailed):
+            raise
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if expired():
+                raise DeadlineExceeded("Deadline exceeded calling user service")
             msg = "Failed to connect to user service"
             logger.error(msg)
             raise MerchantCreationFailed(msg)
@@ -76,3 +114,20 @@ class MerchantApiClient:
         return None
     async def create_merchant(self, merchant_registration_info: UserCreate) -> Optional[str]:
         return await self._create_merchant(merchant_registration_info)
+
+    # Same interface as UserApiClient so the password auth service can use
+    # either client
+    async def get_user_id(self, username: str) -> Optional[int]:
+        return await self.get_merchant_id(username)
+
+    async def get_identity(
+        self, username: str, fields: tuple[str, ...] = ()
+    ) -> Optional[dict[str, object]]:
+        wanted = IDENTITY_FIELDS + fields
+        merchant = await self._get_merchant(username, wanted)
+        if merchant is None or "id" not in merchant:
+            return None
+        return {field: merchant[field] for field in wanted if field in merchant}
+
+    async def create_user(self, user_registration_info: UserCreate) -> Optional[str]:
+        return await self.create_merchant(user_registration_info)
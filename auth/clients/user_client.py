@@ -1,3 +1,4 @@
+import asyncio
 import os
 from typing import Optional
 
@@ -6,7 +7,15 @@ from loguru import logger
 from pydantic import BaseModel, Field
 
 from auth.dto import UserCreate
-from auth.exceptions import UserCreationFailed
+from auth.exceptions import DeadlineExceeded, UserCreationFailed
+from auth.utils import codec
+from auth.utils.api_utils import retry_with_backoff
+from auth.utils.deadline import expired, timeout_for
+
+# Fields the auth path actually reads from the user service payload
+AUTH_USER_FIELDS = ("id",)
+# read at signin, inactive users are turned away there
+IDENTITY_FIELDS = ("id", "is_active")
 
 
 class UserGetInfo(BaseModel):
@@ -33,26 +42,45 @@ class UserApiClient:
         else:
             self.base_url = f"{self.service_url}{self.prefix}"
 
-        print(self.base_url)
-
-    async def _get_user(self, username: str) -> Optional[UserGetInfo]:
+        config = config or {}
+        # "light" only decodes the fields the auth path needs, "full" validates
+        # the whole payload into UserGetInfo
+        self.decode_mode = config.get(
+            "decode_mode", os.getenv("USER_CLIENT_DECODE_MODE", "light")
+        )
+        # per call, further capped by what is left of the request deadline
+        self.timeout = float(
+            config.get("timeout", os.getenv("USER_SERVICE_TIMEOUT", "5"))
+        )
+
+    def _timeout(self, operation: str) -> aiohttp.ClientTimeout:
+        return aiohttp.ClientTimeout(total=timeout_for(operation, self.timeout))
+
+    # lookups are idempotent, so transport failures are retried
+    @retry_with_backoff(name="user_service.get_user")
+    async def _request_user(self, username: str) -> Optional[bytes]:
+        async with self.session.get(
+            f"{self.base_url}/get_user?username={username}",
+            timeout=self._timeout("user_service.get_user"),
+        ) as resp:
+            if resp.status == 200:
+                data = await resp.read()
+                if data:
+                    return data
+            elif resp.status != 404:
+                msg = f"User {username} not found"
+                logger.error(msg)
+            return None
+
+    async def _fetch_user(self, username: str) -> Optional[bytes]:
         try:
-            async with self.session.get(
-                f"{self.base_url}/get_user?username={username}"
-            ) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    if data:
-                        print(data)
-                        return UserGetInfo(**data)
-                elif resp.status == 404:
-                    return None
-                else:
-                    msg = f"User {username} not found"
-                    logger.error(msg)
-                    return None
+            return await self._request_user(username)
 
-        except aiohttp.ClientConnectionError:
+        except DeadlineExceeded:
+            raise
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if expired():
+                raise DeadlineExceeded("Deadline exceeded calling user service")
             msg = "Failed to connect to user service"
             logger.error(msg)
             raise UserCreationFailed(msg)
@@ -61,28 +89,60 @@ class UserApiClient:
             logger.error(msg)
             raise Exception(msg)
 
-        return None
+    async def _get_user(self, username: str) -> Optional[UserGetInfo]:
+        data = await self._fetch_user(username)
+        if data is None:
+            return None
+
+        return UserGetInfo.model_validate_json(data)
+
+    async def _get_user_fields(
+        self, username: str, fields: tuple[str, ...] = AUTH_USER_FIELDS
+    ) -> Optional[dict[str, object]]:
+        data = await self._fetch_user(username)
+        if data is None:
+            return None
+
+        return codec.pick(data, fields)
 
     async def get_user_id(self, username: str) -> Optional[str]:
+        if self.decode_mode == "light":
+            fields = await self._get_user_fields(username)
+            if fields is not None and "id" in fields:
+                return fields["id"]  # type: ignore
+            return None
+
         user = await self._get_user(username)
         if user is not None:
-            return user.id
+            return user.id  # type: ignore
 
         return None
 
-    async def create_user(self, user_registration_info: UserCreate) -> Optional[str]:
-        try:
-            async with self.session.get("http://api_user:80/user/health") as response:
-                print(response)
-        except Exception as e:
-            print(e)
+    async def get_identity(
+        self, username: str, fields: tuple[str, ...] = ()
+    ) -> Optional[dict[str, object]]:
+        """``id``, ``is_active`` and the profile ``fields`` the payload has."""
+        wanted = IDENTITY_FIELDS + fields
+        if self.decode_mode == "light":
+            identity = await self._get_user_fields(username, wanted)
+        else:
+            user = await self._get_user(username)
+            identity = user.model_dump(include=set(wanted)) if user else None
 
+        if identity is None or "id" not in identity:
+            return None
+        return identity
+
+    async def create_user(self, user_registration_info: UserCreate) -> Optional[str]:
         try:
+            # not idempotent: a timed out create may have happened, never retry
             async with self.session.post(
-                f"{self.base_url}/create", json=user_registration_info.model_dump()
+                f"{self.base_url}/create",
+                json=user_registration_info.model_dump(),
+                timeout=self._timeout("user_service.create"),
             ) as resp:
                 if resp.status == 200:
-                    data = await resp.json()
+                    data = codec.pick(await resp.read(), AUTH_USER_FIELDS)
                     if data:
                         return str(data["id"])
                 else:
@@ -90,7 +150,11 @@ class UserApiClient:
                     logger.error(msg)
                     raise UserCreationFailed(msg)
 
-        except aiohttp.ClientConnectionError:
+        except (DeadlineExceeded, UserCreationFailed):
+            raise
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if expired():
+                raise DeadlineExceeded("Deadline exceeded calling user service")
             msg = "Failed to connect to user service"
             logger.error(msg)
             raise UserCreationFailed(msg)
@@ -0,0 +1,154 @@
+import asyncio
+from typing import TYPE_CHECKING, Awaitable, Optional
+
+import aiohttp
+from loguru import logger
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from auth.clients import MerchantApiClient, UserApiClient
+from auth.dao import SignupOutboxDAO, SimplePasswordAuthDAO
+from auth.services import (
+    ClientCredentialsService,
+    ClientRegistry,
+    IdempotencyService,
+    MerchantOAuthPasswordAuthService,
+    LoginAuditLogger,
+    OAuthPasswordAuthService,
+    SignupOutboxService,
+    SignupOutboxWorker,
+)
+from auth.services.idempotency_service import IDEMPOTENCY_SECRET
+from auth.utils.bloom import MembershipFilter
+from auth.utils.breached_passwords import BreachedPasswordIndex
+from auth.utils.near_cache import NearTokenCache
+from auth.utils.token_store import TokenStore
+from auth.utils.warmup import warm_engine, warm_http, warm_redis
+
+if TYPE_CHECKING:
+    RedisType = Redis[str]  # this is only processed by mypy
+else:
+    RedisType = Redis  # this is not seen by mypy but will be executed at runtime
+
+
+class ServiceContainer:
+    """Components that live as long as the app, built once in the lifespan.
+
+    Clients, Redis, the token store, the near cache and the signup filter are
+    shared by every request. The DAOs and services wrap a request's DB
+    session, so they are the only objects put together per request, out of
+    the shared parts.
+    """
+
+    def __init__(
+        self,
+        redis: RedisType,
+        token_store: TokenStore,
+        aio_session: aiohttp.ClientSession,
+        signup_filter: Optional[MembershipFilter] = None,
+        token_cache: Optional[NearTokenCache] = None,
+        audit: Optional[LoginAuditLogger] = None,
+        breached_passwords: Optional[BreachedPasswordIndex] = None,
+        oauth_clients: Optional[ClientRegistry] = None,
+    ):
+        self.redis = redis
+        self.token_store = token_store
+        self.aio_session = aio_session
+        self.user_client = UserApiClient(session=aio_session)
+        self.merchant_client = MerchantApiClient(session=aio_session)
+        self.signup_filter = signup_filter
+        self.token_cache = token_cache
+        self.audit = audit
+        self.breached_passwords = breached_passwords
+        self.idempotency = IdempotencyService(redis, IDEMPOTENCY_SECRET)
+        # app scoped, it remembers the tokens it issued
+        self.client_credentials = ClientCredentialsService(
+            oauth_clients or ClientRegistry([]), token_store, audit=audit
+        )
+        self.signup_worker: Optional[SignupOutboxWorker] = None
+
+    def auth_service(
+        self, session: AsyncSession, read_session: Optional[AsyncSession] = None
+    ) -> OAuthPasswordAuthService:
+        return OAuthPasswordAuthService(
+            session,
+            auth_dao=SimplePasswordAuthDAO(session=session, read_session=read_session),
+            user_client=self.user_client,
+            token_store=self.token_store,
+            signup_filter=self.signup_filter,
+            audit=self.audit,
+            breached_passwords=self.breached_passwords,
+        )
+
+    def merchant_auth_service(
+        self, session: AsyncSession, read_session: Optional[AsyncSession] = None
+    ) -> MerchantOAuthPasswordAuthService:
+        return MerchantOAuthPasswordAuthService(
+            session,
+            auth_dao=SimplePasswordAuthDAO(session=session, read_session=read_session),
+            merchant_client=self.merchant_client,
+            token_store=self.token_store,
+            signup_filter=self.signup_filter,
+            audit=self.audit,
+            breached_passwords=self.breached_passwords,
+        )
+
+    def signup_outbox_service(self, session: AsyncSession) -> SignupOutboxService:
+        worker = self.signup_worker
+        return SignupOutboxService(
+            session,
+            outbox_dao=SignupOutboxDAO(session),
+            on_enqueue=worker.notify if worker is not None else None,
+            breached_passwords=self.breached_passwords,
+        )
+
+    async def warm_up(
+        self,
+        engines: list[AsyncEngine],
+        db_connections: int,
+        redis_connections: int,
+        http_connections: int,
+        http_path: str = "/health",
+        timeout: float = 10.0,
+    ) -> dict[str, int]:
+        """Pre-open pooled connections so the first requests skip the handshakes.
+
+        Failures are logged and skipped, a backend that is down at boot will
+        show up on the first real request anyway.
+        """
+        steps: dict[str, Awaitable[int]] = {
+            "redis": warm_redis(self.redis, redis_connections),
+            "http": warm_http(
+                self.aio_session,
+                f"{self.user_client.base_url}{http_path}",
+                http_connections,
+            ),
+        }
+        for index, engine in enumerate(engines):
+            steps[f"db-{index}"] = warm_engine(engine, db_connections)
+
+        warmed: dict[str, int] = {}
+        for name, step in steps.items():
+            try:
+                warmed[name] = await asyncio.wait_for(step, timeout)
+            except Exception as e:
+                logger.warning(f"Warm up of {name} connections failed: {e!r}")
+                warmed[name] = 0
+
+        logger.info(f"Warmed up connections: {warmed}")
+        return warmed
+
+    async def close(self) -> None:
+        if self.signup_worker is not None:
+            await self.signup_worker.stop()
+        if self.audit is not None:
+            await self.audit.stop()
+        if self.token_cache is not None:
+            await self.token_cache.stop()
+            if self.token_cache.pubsub_redis is not self.redis:
+                await self.token_cache.pubsub_redis.close()
+        await self.token_store.close()
+        if self.breached_passwords is not None:
+            self.breached_passwords.close()
+        await self.redis.close()
+        await self.aio_session.close()
@@ -1,3 +1,5 @@
 from .simple_password_auth_dao import SimplePasswordAuthDAO
+from .signup_outbox_dao import SignupOutboxDAO
+from .login_audit_dao import LoginAuditDAO
 
-__all__ = ["SimplePasswordAuthDAO"]
+__all__ = ["SimplePasswordAuthDAO", "SignupOutboxDAO", "LoginAuditDAO"]
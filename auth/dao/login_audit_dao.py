@@ -0,0 +1,61 @@
+from datetime import datetime
+from typing import Any, Optional
+
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth.models import LoginAudit
+
+
+class LoginAuditDAO:
+    def __init__(self, session: AsyncSession, model: type[LoginAudit] = LoginAudit):
+        self.session = session
+        self.model = model
+
+    async def insert_many(self, rows: list[dict[str, Any]]) -> None:
+        """One multi-row INSERT for the whole batch. The caller commits."""
+        if rows:
+            await self.session.execute(insert(self.model).values(rows))
+
+    async def list_signed_in(
+        self, after: tuple[str, str], limit: int
+    ) -> list[tuple[str, str]]:
+        """Distinct (username, subject) pairs that signed in, keyset paged."""
+        key = tuple_(self.model.username, self.model.user_id)  # type: ignore
+        query = (
+            select(self.model.username, self.model.user_id)  # type: ignore
+            .where(self.model.success.is_(True))  # type: ignore
+            .where(self.model.user_id.is_not(None))  # type: ignore
+            .where(key > after)
+            .group_by(self.model.username, self.model.user_id)  # type: ignore
+            .order_by(self.model.username, self.model.user_id)  # type: ignore
+            .limit(limit)
+        )
+        result = await self.session.execute(query)
+        return [(row[0], row[1]) for row in result.all()]
+
+    async def search(
+        self,
+        username: Optional[str] = None,
+        user_id: Optional[str] = None,
+        ip: Optional[str] = None,
+        success: Optional[bool] = None,
+        since: Optional[datetime] = None,
+        limit: int = 100,
+    ) -> list[LoginAudit]:
+        """Newest first, filtered on whichever arguments are given."""
+        query = select(self.model)
+        if username is not None:
+            query = query.where(self.model.username == username)  # type: ignore
+        if user_id is not None:
+            query = query.where(self.model.user_id == user_id)  # type: ignore
+        if ip is not None:
+            query = query.where(self.model.ip == ip)  # type: ignore
+        if success is not None:
+            query = query.where(self.model.success == success)  # type: ignore
+        if since is not None:
+            query = query.where(self.model.created_at >= since)  # type: ignore
+        query = query.order_by(self.model.created_at.desc()).limit(limit)  # type: ignore
+
+        result = await self.session.execute(query)
+        return list(result.scalars().all())
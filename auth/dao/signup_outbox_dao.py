@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth.models import SignupOutbox
+from auth.models.signup_outbox_model import utcnow
+
+
+class SignupOutboxDAO:
+    def __init__(
+        self, session: AsyncSession, model: type[SignupOutbox] = SignupOutbox
+    ):
+        self.session = session
+        self.model = model
+
+    async def enqueue(
+        self,
+        signup_id: str,
+        username: str,
+        full_name: str,
+        phone_number: str,
+        password_hash: str,
+    ) -> SignupOutbox:
+        entry = self.model(
+            signup_id=signup_id,
+            username=username,
+            open_username=username,
+            full_name=full_name,
+            phone_number=phone_number,
+            password_hash=password_hash,
+        )
+        self.session.add(entry)
+        return entry
+
+    async def get_by_signup_id(self, signup_id: str) -> Optional[SignupOutbox]:
+        query = select(self.model).where(self.model.signup_id == signup_id).limit(1)  # type: ignore
+        result = await self.session.execute(query)
+        return result.scalars().first()
+
+    async def get_open_by_username(self, username: str) -> Optional[SignupOutbox]:
+        """Latest pending or completed entry for ``username``."""
+        query = (
+            select(self.model)
+            .where(self.model.open_username == username)  # type: ignore
+            .limit(1)
+        )
+        result = await self.session.execute(query)
+        return result.scalars().first()
+
+    async def list_completed_usernames(
+        self, after_id: int, limit: int
+    ) -> list[tuple[int, str]]:
+        """(id, username) of completed signups with id above ``after_id``."""
+        query = (
+            select(self.model.id, self.model.username)  # type: ignore
+            .where(self.model.status == "completed")  # type: ignore
+            .where(self.model.id > after_id)  # type: ignore
+            .order_by(self.model.id)  # type: ignore
+            .limit(limit)
+        )
+        result = await self.session.execute(query)
+        return [(row[0], row[1]) for row in result.all()]
+
+    async def claim_due(self, limit: int, lease: timedelta) -> list[SignupOutbox]:
+        """Lease up to ``limit`` due entries to the caller.
+
+        Claimed rows are pushed ``lease`` into the future so other workers
+        skip them; if the worker dies they become due again. The caller
+        commits.
+        """
+        now = utcnow()
+        query = (
+            select(self.model)
+            .where(self.model.status == "pending")  # type: ignore
+            .where(self.model.next_attempt_at <= now)  # type: ignore
+            .order_by(self.model.next_attempt_at)  # type: ignore
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = await self.session.execute(query)
+        entries = list(result.scalars().all())
+        for entry in entries:
+            entry.attempts += 1
+            entry.next_attempt_at = now + lease
+            entry.updated_at = now
+        return entries
+
+    async def mark_create_issued(self, entry: SignupOutbox) -> None:
+        entry.create_issued_at = utcnow()
+        entry.updated_at = entry.create_issued_at
+
+    async def mark_user_created(self, entry: SignupOutbox, user_id: str) -> None:
+        entry.user_id = user_id
+        entry.updated_at = utcnow()
+
+    async def mark_completed(self, entry: SignupOutbox) -> None:
+        entry.status = "completed"
+        entry.password_hash = ""
+        entry.last_error = None
+        entry.updated_at = utcnow()
+
+    async def mark_retry(
+        self, entry: SignupOutbox, error: str, next_attempt_at: datetime
+    ) -> None:
+        entry.last_error = error
+        entry.next_attempt_at = next_attempt_at
+        entry.updated_at = utcnow()
+
+    async def mark_failed(self, entry: SignupOutbox, error: str) -> None:
+        entry.status = "failed"
+        entry.open_username = None
+        entry.password_hash = ""
+        entry.last_error = error
+        entry.updated_at = utcnow()
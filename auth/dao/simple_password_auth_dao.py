@@ -1,3 +1,6 @@
+import math
+import os
+import time
 from typing import Optional
 
 import bcrypt
@@ -7,38 +10,102 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from auth.exceptions import UserCreationFailed
 from auth.models import AuthModel
+from auth.utils.deadline import check_deadline, remaining
+from auth.utils.tracing import span
+
+# Seconds after a write during which reads for that user_id stay on the primary
+READ_YOUR_WRITES_WINDOW = float(os.getenv("READ_YOUR_WRITES_WINDOW", "5"))
+
+# user_id -> monotonic time of its last write in this process
+_recent_writes: dict[str, float] = {}
+
+
+def _remember_write(user_id: str) -> None:
+    now = time.monotonic()
+    _recent_writes[user_id] = now
+
+    # keep the map bounded to the ids still inside the window
+    if len(_recent_writes) > 1024:
+        for key, written_at in list(_recent_writes.items()):
+            if now - written_at > READ_YOUR_WRITES_WINDOW:
+                del _recent_writes[key]
+
+
+def _recently_written(user_id: str) -> bool:
+    written_at = _recent_writes.get(user_id)
+    return (
+        written_at is not None
+        and time.monotonic() - written_at <= READ_YOUR_WRITES_WINDOW
+    )
 
 
 class SimplePasswordAuthDAO:
-    def __init__(self, session: AsyncSession, model: type[AuthModel] = AuthModel):
+    def __init__(
+        self,
+        session: AsyncSession,
+        model: type[AuthModel] = AuthModel,
+        read_session: Optional[AsyncSession] = None,
+    ):
         self.session = session
         self.model = model
+        # replica session for lookups, writes always go through ``session``
+        self.read_session = read_session
+
+    def _read_sessions(self, user_id: str) -> list[AsyncSession]:
+        """Sessions to try for a lookup, in order.
+
+        The replica is skipped right after a write to ``user_id``; otherwise
+        a replica miss falls back to the primary in case of replication lag.
+        """
+        if self.read_session is None or _recently_written(str(user_id)):
+            return [self.session]
+
+        return [self.read_session, self.session]
+
+    async def _get_by_user_id(self, user_id: str) -> Optional[AuthModel]:
+        query = select(self.model).where(self.model.user_id == user_id).limit(1)  # type: ignore
+        left = remaining()
+        if left is not None:
+            # let MySQL abort the statement once the request budget is spent;
+            # 100ms steps keep the number of distinct cached statements small
+            budget_ms = max(1, math.ceil(left * 10)) * 100
+            query = query.prefix_with(
+                f"/*+ MAX_EXECUTION_TIME({budget_ms}) */", dialect="mysql"
+            )
+
+        for session in self._read_sessions(user_id):
+            check_deadline("db.auth.get_by_user_id")
+            replica = session is not self.session
+            async with span("db.auth.get_by_user_id", replica=replica):
+                result = await session.execute(query)
+            user = result.scalars().first()
+            if user is not None:
+                return user
+
+        return None
 
     async def authenticate(self, user_id: str, password: str) -> Optional[AuthModel]:
         # optimize query by selecting only relevant field
 
-        query = select(self.model).where(self.model.user_id == user_id)  # type: ignore
-        result = await self.session.execute(query)
-        user = result.scalars().first()
-        if user and bcrypt.checkpw(
-            password.encode("utf-8"),
-            user.password.encode("utf-8"),
-        ):
-            return user
-
-        else:
+        user = await self._get_by_user_id(user_id)
+        if user is None:
             return None
 
+        with span("bcrypt.checkpw"):
+            if bcrypt.checkpw(password.encode("utf-8"), user.password.encode("utf-8")):
+                return user
+
+        return None
+
     async def create_user(self, user_id: str, password: str) -> AuthModel:
         try:
             auth = self.model(user_id=user_id, password=password)
             self.session.add(auth)
+            _remember_write(str(user_id))
             return auth
         except IntegrityError as e:
             raise UserCreationFailed(str(e))
 
-    async def is_user_id_exist(self, user_id: int) -> bool:
-        query = select(self.model).filter(self.model.user_id == user_id).limit(1)  # type: ignore
-        result = await self.session.execute(query)
-        exists = result.scalars().first() is not None
+    async def is_user_id_exist(self, user_id: str) -> bool:
+        exists = await self._get_by_user_id(user_id) is not None
         return exists
@@ -1,8 +1,10 @@
 from .userinfo import UserInfo, UserPrivate, AuthCredentials, UserCreate
+from .oauth_client import OAuthClient
 
 __all__ = [
     "UserInfo",
     "UserPrivate",
     "AuthCredentials",
     "UserCreate",
+    "OAuthClient",
 ]
@@ -0,0 +1,11 @@
+from pydantic import BaseModel, Field
+
+
+class OAuthClient(BaseModel):
+    """A registered machine client of the client-credentials grant."""
+
+    client_id: str = Field(min_length=1)
+    # hex sha256 of the secret; secrets are long random strings, not passwords
+    secret_sha256: str = Field(min_length=64, max_length=64)
+    scopes: list[str] = []
+    roles: list[str] = ["service"]
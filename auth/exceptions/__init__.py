@@ -1,8 +1,15 @@
-from .user_registration_exc import UserCreationFailed, MerchantCreationFailed
+from .user_registration_exc import (
+    UserCreationFailed,
+    MerchantCreationFailed,
+    SignupRejected,
+)
 from .user_exc import UserNotFound
+from .deadline_exc import DeadlineExceeded
 
 __all__ = [
     "UserCreationFailed",
     "MerchantCreationFailed",
+    "SignupRejected",
     "UserNotFound",
+    "DeadlineExceeded",
 ]
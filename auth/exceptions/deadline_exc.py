@@ -0,0 +1,9 @@
+class DeadlineExceeded(Exception):
+    """The request ran out of time budget before an outbound call finished."""
+
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+    def __str__(self) -> str:
+        return self.message
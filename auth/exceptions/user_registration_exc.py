@@ -14,3 +14,14 @@ class MerchantCreationFailed(Exception):
 
     def __str__(self) -> str:
         return self.message
+
+
+class SignupRejected(Exception):
+    """Signup that can never succeed, as opposed to a transient failure."""
+
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+    def __str__(self) -> str:
+        return self.message
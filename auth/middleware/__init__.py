@@ -0,0 +1,14 @@
+from .capture import TrafficCaptureMiddleware
+from .deadline import DeadlineMiddleware
+from .profiling import ProfileStore, ProfilingMiddleware
+from .token_verify import TokenVerifyFastPath
+from .tracing import TracingMiddleware
+
+__all__ = [
+    "DeadlineMiddleware",
+    "ProfileStore",
+    "ProfilingMiddleware",
+    "TokenVerifyFastPath",
+    "TracingMiddleware",
+    "TrafficCaptureMiddleware",
+]
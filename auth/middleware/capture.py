@@ -0,0 +1,226 @@
+import asyncio
+import base64
+import binascii
+import gzip
+import hashlib
+import os
+import time
+from collections import deque
+from typing import Any, Optional
+from urllib.parse import parse_qs, unquote_plus
+
+from loguru import logger
+
+from auth.utils import codec
+
+from .token_verify import ASGIApp, Message, Receive, Scope, Send, parse_bearer_header
+
+# request and response bodies larger than this are not inspected
+MAX_INSPECTED_BODY = 4096
+
+
+def _basic_client_id(value: bytes) -> Optional[str]:
+    scheme, _, credentials = value.partition(b" ")
+    if scheme.lower() != b"basic":
+        return None
+    try:
+        decoded = base64.b64decode(credentials, validate=True)
+    except binascii.Error:
+        return None
+    return unquote_plus(decoded.partition(b":")[0].decode("latin-1"))
+
+
+class TrafficCaptureMiddleware:
+    """Records the shape and timing of every request for ``benchmarks.replay``.
+
+    One JSON object per request and line, gzip'd, in
+    ``<directory>/traffic-<start>-<pid>.jsonl.gz``. A record has the start
+    time, method, route template, status, duration and body sizes. Bodies,
+    usernames, client ids and tokens are never written: usernames, client
+    ids, bearer tokens, issued tokens and idempotency keys become keyed
+    hashes, so a replay can still tell the same user, session or retry
+    apart without learning who it was. Workers must share ``secret`` for
+    their hashes to match.
+
+    Records are buffered and written off the request path every
+    ``interval`` seconds; past ``max_queue`` waiting records the oldest are
+    dropped and counted.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        directory: str,
+        secret: Optional[str] = None,
+        interval: float = 2.0,
+        max_queue: int = 100_000,
+    ):
+        self.app = app
+        self.path = os.path.join(
+            directory, f"traffic-{int(time.time())}-{os.getpid()}.jsonl.gz"
+        )
+        if secret is None:
+            logger.warning("CAPTURE_SECRET unset, hashes only match within a worker")
+        key = (secret or os.urandom(16).hex()).encode("utf-8")
+        self._key = hashlib.blake2b(key, digest_size=32).digest()
+        self.interval = interval
+        self._queue: deque[dict[str, Any]] = deque(maxlen=max_queue)
+        self._task: Optional[asyncio.Task[None]] = None
+        self.recorded = 0
+        self.dropped = 0
+
+    def _hash(self, value: str | bytes) -> str:
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        return hashlib.blake2b(value, key=self._key, digest_size=8).hexdigest()
+
+    def _identity(self, body: bytes, content_type: bytes) -> Optional[str]:
+        """Username or client id of a signin, signup or token request."""
+        if content_type.startswith(b"application/json"):
+            try:
+                payload = codec.loads(body)
+            except ValueError:
+                return None
+            if not isinstance(payload, dict):
+                return None
+            value = payload.get("username") or payload.get("client_id")
+        else:
+            values = parse_qs(body.decode("latin-1")).get("client_id")
+            value = values[0] if values else None
+        return self._hash(str(value)) if value else None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self.app(scope, self._on_shutdown(receive), send)
+            return
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+        record: dict[str, Any] = {"m": scope["method"]}
+        content_type = b""
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                token = parse_bearer_header(value)
+                if token is not None:
+                    record["tok"] = self._hash(token)
+                else:
+                    client_id = _basic_client_id(value)
+                    if client_id:
+                        record["id"] = self._hash(client_id)
+            elif name == b"idempotency-key":
+                record["idem"] = self._hash(value)
+            elif name == b"x-request-timeout-ms":
+                record["dl"] = value.decode("latin-1")
+            elif name == b"content-type":
+                content_type = value
+                is_json = value.startswith(b"application/json")
+                record["ct"] = "json" if is_json else "form"
+
+        request_body = bytearray()
+        request_size = 0
+
+        async def receive_and_inspect() -> Message:
+            nonlocal request_size
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                request_size += len(chunk)
+                if request_size <= MAX_INSPECTED_BODY:
+                    request_body.extend(chunk)
+            return message
+
+        status = 0
+        response_body = bytearray()
+        response_size = 0
+
+        async def send_and_inspect(message: Message) -> None:
+            nonlocal status, response_size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                chunk = message.get("body", b"")
+                response_size += len(chunk)
+                if response_size <= MAX_INSPECTED_BODY:
+                    response_body.extend(chunk)
+            await send(message)
+
+        started_at = time.time()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive_and_inspect, send_and_inspect)
+        finally:
+            record["d"] = round((time.perf_counter() - start) * 1000, 3)
+            record["t"] = round(started_at, 4)
+            record["s"] = status or 500
+            # the template, never the raw path, which can carry ids
+            route = scope.get("route")
+            record["p"] = getattr(route, "path", None) or (
+                scope["path"] if status != 404 else "*"
+            )
+            record["in"] = request_size
+            record["out"] = response_size
+            if request_body and request_size <= MAX_INSPECTED_BODY:
+                identity = self._identity(bytes(request_body), content_type)
+                if identity is not None:
+                    record["id"] = identity
+            if status == 200 and b"access_token" in response_body:
+                try:
+                    issued = codec.loads(bytes(response_body)).get("access_token")
+                except (ValueError, AttributeError):
+                    issued = None
+                if issued:
+                    record["iss"] = self._hash(issued)
+            self._add(record)
+
+    def _add(self, record: dict[str, Any]) -> None:
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1
+        self._queue.append(record)
+        self.recorded += 1
+
+    def _on_shutdown(self, receive: Receive) -> Receive:
+        async def receive_and_flush() -> Message:
+            message = await receive()
+            if message["type"] == "lifespan.shutdown":
+                await self.close()
+            return message
+
+        return receive_and_flush
+
+    def _write(self, lines: bytes) -> None:
+        # every flush appends a gzip member, gzip.open reads them as one stream
+        with gzip.open(self.path, "ab", compresslevel=5) as f:
+            f.write(lines)
+
+    async def flush(self) -> None:
+        if not self._queue:
+            return
+        records = [self._queue.popleft() for _ in range(len(self._queue))]
+        lines = b"".join(codec.dumps(record) + b"\n" for record in records)
+        try:
+            await asyncio.to_thread(self._write, lines)
+        except OSError as e:
+            self.dropped += len(records)
+            logger.warning(f"Dropped {len(records)} capture records: {e!r}")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        logger.info(
+            f"Captured {self.recorded} requests to {self.path}, "
+            f"{self.dropped} dropped"
+        )
@@ -0,0 +1,43 @@
+from typing import Optional
+
+from auth.utils.deadline import reset_deadline, set_deadline
+
+from .token_verify import ASGIApp, Receive, Scope, Send
+
+DEADLINE_HEADER = b"x-request-timeout-ms"
+
+
+class DeadlineMiddleware:
+    """Gives every request a time budget that outbound calls draw from.
+
+    The budget is ``default_ms``; a caller (gateway or another service) can
+    shorten it with ``X-Request-Timeout-Ms`` but never extend it.
+    """
+
+    def __init__(self, app: ASGIApp, default_ms: float):
+        self.app = app
+        self.default_ms = default_ms
+
+    def _budget_ms(self, scope: Scope) -> float:
+        requested: Optional[float] = None
+        for name, value in scope["headers"]:
+            if name == DEADLINE_HEADER:
+                try:
+                    requested = float(value)
+                except ValueError:
+                    pass
+                break
+        if requested is None or requested <= 0:
+            return self.default_ms
+        return min(requested, self.default_ms)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = set_deadline(self._budget_ms(scope) / 1000)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            reset_deadline(token)
@@ -0,0 +1,264 @@
+import asyncio
+import hashlib
+import hmac
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from types import CodeType, FrameType
+from typing import Any, Optional
+
+from loguru import logger
+
+from .token_verify import ASGIApp, Message, Receive, Scope, Send
+
+PROFILE_HEADER = b"x-profile-signature"
+# how long a signed header stays valid, bounds replay of a leaked header
+SIGNATURE_TTL = 300
+
+
+def sign_profile_request(secret: str, path: str, ttl: int = SIGNATURE_TTL) -> str:
+    """Value for the ``X-Profile-Signature`` header of a request to ``path``."""
+    expires = int(time.time()) + ttl
+    digest = hmac.new(
+        secret.encode("utf-8"), f"{expires}:{path}".encode("utf-8"), hashlib.sha256
+    ).hexdigest()
+    return f"{expires}:{digest}"
+
+
+def verify_profile_signature(secret: str, path: str, value: bytes) -> bool:
+    expires, _, digest = value.decode("latin-1").partition(":")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    expected = hmac.new(
+        secret.encode("utf-8"), f"{expires}:{path}".encode("utf-8"), hashlib.sha256
+    ).hexdigest()
+    return hmac.compare_digest(expected, digest)
+
+
+class ProfileStore:
+    """The last ``max_profiles`` request profiles, in speedscope format."""
+
+    def __init__(self, max_profiles: int = 50):
+        self._profiles: deque[dict[str, Any]] = deque(maxlen=max_profiles)
+        self._ids = itertools.count(1)
+
+    def next_id(self) -> str:
+        return f"{os.getpid()}-{next(self._ids)}"
+
+    def add(self, profile: dict[str, Any]) -> None:
+        self._profiles.append(profile)
+
+    def summaries(self) -> list[dict[str, Any]]:
+        return [
+            {key: value for key, value in profile.items() if key != "speedscope"}
+            for profile in reversed(self._profiles)
+        ]
+
+    def get(self, profile_id: str) -> Optional[dict[str, Any]]:
+        for profile in self._profiles:
+            if profile["id"] == profile_id:
+                return profile["speedscope"]
+        return None
+
+
+class _Sampler(threading.Thread):
+    """Samples the stack of one request task from a side thread.
+
+    While the task runs on the loop thread its live frames are read from
+    ``sys._current_frames``; while it is suspended the coroutine chain is
+    walked instead and ends in an ``(await)`` frame, so the profile shows
+    wall time, including time spent waiting on MySQL, Redis or the user
+    service. Frames above ``root`` (server and event loop) are dropped.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        task: "asyncio.Task[Any]",
+        root: CodeType,
+        interval: float,
+    ):
+        super().__init__(name="request-profiler", daemon=True)
+        self.loop = loop
+        self.task = task
+        self.root = root
+        self.interval = interval
+        self.loop_thread_id = threading.get_ident()
+        self.stopped = threading.Event()
+
+        self.frames: dict[tuple[str, str, int], int] = {}
+        self.samples: list[list[int]] = []
+        self.weights: list[float] = []
+
+    def _frame_index(self, name: str, file: str, line: int) -> int:
+        key = (name, file, line)
+        index = self.frames.get(key)
+        if index is None:
+            index = self.frames[key] = len(self.frames)
+        return index
+
+    def _running_stack(self) -> list[FrameType]:
+        frame: Optional[FrameType] = sys._current_frames().get(self.loop_thread_id)
+        stack = []
+        while frame is not None:
+            stack.append(frame)
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def _suspended_stack(self) -> list[FrameType]:
+        stack = []
+        coro: Any = self.task.get_coro()
+        while coro is not None:
+            frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+            if frame is None:
+                break
+            stack.append(frame)
+            coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+        return stack
+
+    def _sample(self) -> Optional[list[int]]:
+        running = asyncio.current_task(self.loop) is self.task
+        frames = self._running_stack() if running else self._suspended_stack()
+
+        for start, frame in enumerate(frames):
+            if frame.f_code is self.root:
+                break
+        else:
+            return None
+
+        sample = [
+            self._frame_index(f.f_code.co_name, f.f_code.co_filename, f.f_lineno)
+            for f in frames[start:]
+        ]
+        if not running:
+            sample.append(self._frame_index("(await)", "", 0))
+        return sample
+
+    def run(self) -> None:
+        last = time.perf_counter()
+        while not self.stopped.wait(self.interval):
+            now = time.perf_counter()
+            try:
+                sample = self._sample()
+            except Exception:
+                # frames of another thread can change under us, skip the tick
+                sample = None
+            if sample is not None:
+                self.samples.append(sample)
+                self.weights.append((now - last) * 1000)
+            last = now
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.join()
+
+    def speedscope(self, name: str, duration_ms: float) -> dict[str, Any]:
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "auth-service",
+            "shared": {
+                "frames": [
+                    {"name": name, "file": file, "line": line}
+                    for name, file, line in self.frames
+                ]
+            },
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": name,
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": duration_ms,
+                    "samples": self.samples,
+                    "weights": self.weights,
+                }
+            ],
+        }
+
+
+class ProfilingMiddleware:
+    """Opt-in sampling profiler for single requests.
+
+    A request is profiled when it carries a valid ``X-Profile-Signature``
+    (see ``sign_profile_request``) or is picked at ``sample_rate``. Its
+    profile is kept in ``store`` and the response gets an ``X-Profile-Id``
+    header to fetch it with. Requests that are not picked pay one header
+    scan and one ``random()`` call.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        store: ProfileStore,
+        secret: Optional[str] = None,
+        sample_rate: float = 0.0,
+        interval_ms: float = 1.0,
+    ):
+        self.app = app
+        self.store = store
+        self.secret = secret
+        self.sample_rate = sample_rate
+        self.interval = interval_ms / 1000
+
+    def _selected(self, scope: Scope) -> bool:
+        if self.secret:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER:
+                    return verify_profile_signature(self.secret, scope["path"], value)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._selected(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = self.store.next_id()
+        status = 0
+
+        async def send_with_id(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", profile_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        task = asyncio.current_task()
+        assert task is not None
+        sampler = _Sampler(
+            asyncio.get_running_loop(), task, self.__call__.__code__, self.interval
+        )
+        started_at = time.time()
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            sampler.stop()
+            duration_ms = (time.perf_counter() - start) * 1000
+            name = f"{scope['method']} {scope['path']}"
+            self.store.add(
+                {
+                    "id": profile_id,
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status,
+                    "started_at": started_at,
+                    "duration_ms": round(duration_ms, 3),
+                    "samples": len(sampler.samples),
+                    "speedscope": sampler.speedscope(name, duration_ms),
+                }
+            )
+            logger.info(f"Profiled {name} in {duration_ms:.1f} ms as {profile_id}")
+
+
+if __name__ == "__main__":
+    # python -m auth.middleware.profiling /signin
+    print(sign_profile_request(os.environ["PROFILE_SECRET"], sys.argv[1]))
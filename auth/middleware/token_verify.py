@@ -0,0 +1,112 @@
+from typing import Any, Awaitable, Callable, MutableMapping, Optional
+
+from loguru import logger
+
+from auth.exceptions import DeadlineExceeded
+from auth.utils import codec
+from auth.utils.token_utils import get_token
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+
+def _response(
+    status: int, body: bytes, extra: Optional[list[tuple[bytes, bytes]]] = None
+) -> tuple[Message, Message]:
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode("latin-1")),
+    ] + (extra or [])
+    return (
+        {"type": "http.response.start", "status": status, "headers": headers},
+        {"type": "http.response.body", "body": body},
+    )
+
+
+_UNAUTHORIZED_HEADERS = [(b"www-authenticate", b"Bearer")]
+NO_TOKEN = _response(401, b'{"detail":"No token provided"}', _UNAUTHORIZED_HEADERS)
+INVALID_TOKEN = _response(401, b'{"detail":"Invalid token"}', _UNAUTHORIZED_HEADERS)
+SERVER_ERROR = _response(500, b'{"detail":"Internal Server Error"}')
+DEADLINE_EXCEEDED = _response(504, b'{"detail":"Request deadline exceeded"}')
+
+
+def _header(headers: list[tuple[bytes, bytes]], name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key == name:
+            return value
+    return None
+
+
+def parse_bearer_header(value: bytes) -> Optional[str]:
+    """Bytes twin of ``parse_bearer``: the token, or None unless ``Bearer <token>``."""
+    scheme, _, token = value.partition(b" ")
+    token = token.strip()
+    if scheme.lower() != b"bearer" or not token or b" " in token:
+        return None
+    try:
+        return token.decode("ascii")
+    except UnicodeDecodeError:
+        return None
+
+
+class TokenVerifyFastPath:
+    """Serves ``POST /token/verify`` before FastAPI sees the request.
+
+    Verification is the hottest endpoint and needs none of the framework:
+    no routing, dependency resolution or CORS (it is called server to
+    server). Everything else, including lifespan, goes to ``app``. Redis and
+    the near cache come from the container the lifespan puts on
+    ``app.state``. Wrap it in ``DeadlineMiddleware`` for the request budget,
+    the one inside ``app`` is never reached from here.
+    """
+
+    def __init__(
+        self,
+        app: Any,
+        paths: tuple[str, ...] = ("/token/verify", "/auth/token/verify"),
+    ):
+        self.app = app
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] == "http"
+            and scope["method"] == "POST"
+            and scope["path"] in self.paths
+        ):
+            await self._verify(scope, send)
+            return
+
+        await self.app(scope, receive, send)
+
+    async def _verify(self, scope: Scope, send: Send) -> None:
+        authorization = _header(scope["headers"], b"authorization")
+        token = parse_bearer_header(authorization) if authorization else None
+
+        if not authorization:
+            start, body = NO_TOKEN
+        elif token is None:
+            start, body = INVALID_TOKEN
+        else:
+            container = self.app.state.container
+            try:
+                token_info = await get_token(
+                    container.token_store, token, cache=container.token_cache
+                )
+            except DeadlineExceeded as e:
+                logger.warning(f"POST {scope['path']}: {e}")
+                start, body = DEADLINE_EXCEEDED
+            except Exception as e:
+                logger.error(f"Token verification failed: {e}")
+                start, body = SERVER_ERROR
+            else:
+                if token_info:
+                    start, body = _response(200, codec.dumps(token_info))
+                else:
+                    start, body = INVALID_TOKEN
+
+        await send(start)
+        await send(body)
@@ -0,0 +1,53 @@
+from auth.utils.tracing import (
+    parse_traceparent,
+    reset_current_span,
+    set_current_span,
+    tracer,
+)
+
+from .token_verify import ASGIApp, Message, Receive, Scope, Send
+
+
+class TracingMiddleware:
+    """Server span per request, joined to the caller's W3C ``traceparent``."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+
+        span = tracer.start_span(
+            f"{scope['method']} {scope['path']}",
+            kind="server",
+            attributes={"http.method": scope["method"], "http.target": scope["path"]},
+            parent=parse_traceparent(traceparent),
+        )
+
+        async def send_with_status(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                span.set_attribute("http.status_code", message["status"])
+                span.error = message["status"] >= 500
+            await send(message)
+
+        token = set_current_span(span)
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception as e:
+            span.record_exception(e)
+            raise
+        finally:
+            reset_current_span(token)
+            # the router leaves the matched route in scope, name by template
+            route = scope.get("route")
+            if route is not None and hasattr(route, "path"):
+                span.name = f"{scope['method']} {route.path}"
+            tracer.end_span(span)
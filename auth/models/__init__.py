@@ -1,6 +1,10 @@
 from .auth_model import AuthModel
+from .login_audit_model import LoginAudit
+from .signup_outbox_model import SignupOutbox
 
 
 __all__ = [
     "AuthModel",
+    "LoginAudit",
+    "SignupOutbox",
 ]
@@ -0,0 +1,20 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlmodel import Field, SQLModel
+
+from .signup_outbox_model import utcnow
+
+
+class LoginAudit(SQLModel, table=True):
+    __tablename__ = "login_audit"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    # when the signin happened, not when the row was flushed
+    created_at: datetime = Field(default_factory=utcnow, index=True)
+    username: str = Field(index=True)
+    user_id: Optional[str] = Field(default=None, index=True)
+    role: Optional[str] = Field(default=None)
+    success: bool
+    reason: Optional[str] = Field(default=None)
+    ip: Optional[str] = Field(default=None, index=True)
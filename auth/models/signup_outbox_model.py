@@ -0,0 +1,35 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlmodel import Field, SQLModel
+
+
+def utcnow() -> datetime:
+    # naive UTC, DATETIME columns carry no timezone
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class SignupOutbox(SQLModel, table=True):
+    __tablename__ = "signup_outbox"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    signup_id: str = Field(unique=True, index=True)
+    username: str = Field(index=True)
+    # the username while pending or completed, cleared on failure; unique, so
+    # concurrent submits cannot queue the same username twice
+    open_username: Optional[str] = Field(default=None, unique=True)
+    full_name: str
+    phone_number: str
+    # cleared once the auth row exists
+    password_hash: str
+    # pending -> completed | failed
+    status: str = Field(default="pending", index=True)
+    user_id: Optional[str] = Field(default=None)
+    # committed before the upstream create is sent, so a retry knows whether
+    # an existing upstream user can be its own
+    create_issued_at: Optional[datetime] = Field(default=None)
+    attempts: int = Field(default=0)
+    last_error: Optional[str] = Field(default=None)
+    next_attempt_at: datetime = Field(default_factory=utcnow, index=True)
+    created_at: datetime = Field(default_factory=utcnow)
+    updated_at: datetime = Field(default_factory=utcnow)
@@ -1,5 +1,17 @@
 from .oauth_password_auth_service import OAuthPasswordAuthService
+from .merchant_oauth_service import MerchantOAuthPasswordAuthService
+from .signup_outbox_service import SignupOutboxService, SignupOutboxWorker
+from .login_audit_service import LoginAuditLogger
+from .idempotency_service import IdempotencyService
+from .client_credentials_service import ClientCredentialsService, ClientRegistry
 
-# from .merchant_oauth_service import MerchantOAuthPasswordAuthService
-
-__all__ = ["OAuthPasswordAuthService"]
+__all__ = [
+    "OAuthPasswordAuthService",
+    "MerchantOAuthPasswordAuthService",
+    "SignupOutboxService",
+    "SignupOutboxWorker",
+    "LoginAuditLogger",
+    "IdempotencyService",
+    "ClientCredentialsService",
+    "ClientRegistry",
+]
@@ -0,0 +1,211 @@
+import hashlib
+import hmac
+import os
+import secrets
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import jwt
+from fastapi import HTTPException, status
+from loguru import logger
+from pydantic import TypeAdapter
+
+from auth.dto import OAuthClient
+from auth.services.login_audit_service import LoginAuditLogger
+from auth.services.oauth_password_auth_service import ALGORITHM, SECRET_KEY
+from auth.utils import codec
+from auth.utils.token_store import TokenStore
+from auth.utils.token_utils import set_token
+
+CLIENT_TOKEN_EXPIRE_MINUTES = int(os.getenv("CLIENT_TOKEN_EXPIRE_MINUTES", "60"))
+# a cached token is handed out again while it has at least this long to live
+CLIENT_TOKEN_MIN_REMAINING_SECONDS = float(
+    os.getenv("CLIENT_TOKEN_MIN_REMAINING_SECONDS", "300")
+)
+CLIENT_TOKEN_CACHE_SIZE = 1024
+
+# compared against when the client id is unknown, so timing does not tell
+_UNKNOWN_CLIENT_DIGEST = hashlib.sha256(secrets.token_bytes(32)).digest()
+
+
+def hash_client_secret(secret: str) -> str:
+    return hashlib.sha256(secret.encode("utf-8")).hexdigest()
+
+
+class ClientRegistry:
+    """Registered clients, loaded once; secret checks are constant time."""
+
+    def __init__(self, clients: list[OAuthClient]):
+        self._clients = {client.client_id: client for client in clients}
+        self._digests = {
+            client.client_id: bytes.fromhex(client.secret_sha256) for client in clients
+        }
+
+    @classmethod
+    def from_json(cls, data: str | bytes) -> "ClientRegistry":
+        return cls(TypeAdapter(list[OAuthClient]).validate_json(data))
+
+    @classmethod
+    def from_env(cls) -> "ClientRegistry":
+        """OAUTH_CLIENTS_FILE, else OAUTH_CLIENTS, each a JSON list of clients."""
+        path = os.getenv("OAUTH_CLIENTS_FILE")
+        if path:
+            with open(path, "rb") as f:
+                return cls.from_json(f.read())
+        return cls.from_json(os.getenv("OAUTH_CLIENTS", "[]"))
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def authenticate(self, client_id: str, client_secret: str) -> Optional[OAuthClient]:
+        expected = self._digests.get(client_id, _UNKNOWN_CLIENT_DIGEST)
+        supplied = hashlib.sha256(client_secret.encode("utf-8")).digest()
+        if hmac.compare_digest(expected, supplied):
+            return self._clients.get(client_id)
+        return None
+
+
+class ClientCredentialsService:
+    """OAuth2 client-credentials grant (RFC 6749 section 4.4).
+
+    Tokens are signed like user tokens and stored in the token store, so
+    verify, introspect and revoke treat them alike; their subject is
+    ``client:<client_id>``. The service lives as long as the app and keeps
+    the tokens it issued, so a client asking again for the same scopes gets
+    the same token back while it has CLIENT_TOKEN_MIN_REMAINING_SECONDS to
+    live, unless it was revoked.
+    """
+
+    def __init__(
+        self,
+        registry: ClientRegistry,
+        token_store: TokenStore,
+        audit: Optional[LoginAuditLogger] = None,
+    ):
+        self.registry = registry
+        self.token_store = token_store
+        self.audit = audit
+        # (client_id, scope) -> (access_token, expires_at)
+        self._issued: dict[tuple[str, str], tuple[str, float]] = {}
+        self.minted = 0
+        self.reused = 0
+
+    def _audit(
+        self,
+        client_id: str,
+        success: bool,
+        client: Optional[OAuthClient],
+        ip: Optional[str],
+        reason: Optional[str] = None,
+    ) -> None:
+        if self.audit is not None:
+            self.audit.record(
+                f"client:{client_id}",
+                success,
+                user_id=f"client:{client_id}" if success else None,
+                role=",".join(client.roles) if client else None,
+                ip=ip,
+                reason=reason,
+            )
+
+    def _granted_scope(self, client: OAuthClient, requested: Optional[str]) -> str:
+        if not requested:
+            return " ".join(sorted(client.scopes))
+        scopes = set(requested.split())
+        if not scopes <= set(client.scopes):
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, detail="invalid_scope")
+        return " ".join(sorted(scopes))
+
+    async def _cached(self, key: tuple[str, str]) -> Optional[tuple[str, float]]:
+        issued = self._issued.get(key)
+        if issued is None:
+            return None
+        access_token, expires_at = issued
+        if expires_at - time.time() < CLIENT_TOKEN_MIN_REMAINING_SECONDS:
+            del self._issued[key]
+            return None
+        # a revoked token must not be handed out again
+        if await self.token_store.get(access_token) is None:
+            del self._issued[key]
+            return None
+        return issued
+
+    async def _mint(self, client: OAuthClient, scope: str) -> tuple[str, float]:
+        subject = f"client:{client.client_id}"
+        expires_delta = timedelta(minutes=CLIENT_TOKEN_EXPIRE_MINUTES)
+        expire = datetime.now(timezone.utc) + expires_delta
+        access_token = jwt.encode(
+            {
+                "sub": client.client_id,
+                "user_id": subject,
+                "role": client.roles,
+                "scope": scope,
+                "exp": expire,
+                # two tokens minted in the same second must still differ
+                "jti": secrets.token_hex(8),
+            },
+            SECRET_KEY,
+            algorithm=ALGORITHM,
+        )
+        await set_token(
+            self.token_store,
+            subject,
+            access_token,
+            expires_delta,
+            owner=subject,
+            claims={"client_id": client.client_id, "scope": scope},
+        )
+        return access_token, expire.timestamp()
+
+    async def issue_token(
+        self,
+        client_id: str,
+        client_secret: str,
+        scope: Optional[str] = None,
+        client_ip: Optional[str] = None,
+    ) -> dict[str, object]:
+        client = self.registry.authenticate(client_id, client_secret)
+        if client is None:
+            self._audit(client_id, False, None, client_ip, reason="invalid_client")
+            raise HTTPException(
+                status.HTTP_401_UNAUTHORIZED,
+                detail="invalid_client",
+                headers={"WWW-Authenticate": "Basic"},
+            )
+
+        granted = self._granted_scope(client, scope)
+        key = (client.client_id, granted)
+        issued = await self._cached(key)
+        if issued is not None:
+            self.reused += 1
+        else:
+            issued = await self._mint(client, granted)
+            self.minted += 1
+            if len(self._issued) >= CLIENT_TOKEN_CACHE_SIZE:
+                self._issued.clear()
+            self._issued[key] = issued
+            logger.info(f"Issued client token for {client.client_id}")
+            self._audit(client.client_id, True, client, client_ip)
+
+        access_token, expires_at = issued
+        return {
+            "access_token": access_token,
+            "token_type": "bearer",
+            "expires_in": int(expires_at - time.time()),
+            "scope": granted,
+        }
+
+
+if __name__ == "__main__":
+    # python -m auth.services.client_credentials_service billing users:read
+    client_id, scopes = sys.argv[1], sys.argv[2:]
+    secret = secrets.token_urlsafe(32)
+    print(f"client secret: {secret}")
+    entry = {
+        "client_id": client_id,
+        "secret_sha256": hash_client_secret(secret),
+        "scopes": scopes,
+    }
+    print(f"registry entry: {codec.dumps_str(entry)}")
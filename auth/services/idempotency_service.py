@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import secrets
+from typing import TYPE_CHECKING, Any, Optional
+
+from fastapi import HTTPException, status
+from loguru import logger
+from redis.asyncio import Redis
+
+from auth.utils import codec
+from auth.utils.deadline import remaining
+
+if TYPE_CHECKING:
+    RedisType = Redis[str]  # this is only processed by mypy
+else:
+    RedisType = Redis  # this is not seen by mypy but will be executed at runtime
+
+# how long a completed response is replayed
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+# in-progress marker lifetime, frees the key if the owning worker dies
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "30"))
+# how long a duplicate waits for the first request before giving up
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+IDEMPOTENCY_POLL_SECONDS = float(os.getenv("IDEMPOTENCY_POLL_SECONDS", "0.05"))
+# keys request fingerprints, every worker must get the same one
+IDEMPOTENCY_SECRET = os.getenv("IDEMPOTENCY_SECRET")
+
+# delete the in-progress marker only while it is still ours
+RELEASE_SCRIPT = """
+local raw = redis.call("GET", KEYS[1])
+if raw and cjson.decode(raw)["owner"] == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+# store the response unless a retry took the key over after our lock expired
+COMPLETE_SCRIPT = """
+local raw = redis.call("GET", KEYS[1])
+if raw and cjson.decode(raw)["owner"] ~= ARGV[1] then
+    return 0
+end
+redis.call("SET", KEYS[1], ARGV[2], "EX", ARGV[3])
+return 1
+"""
+
+
+def request_fingerprint(secret: Optional[bytes], payload: dict[str, Any]) -> str:
+    # keyed when possible, the payload holds personal data and the digest
+    # sits in Redis; callers leave secrets such as passwords out of it
+    body = codec.dumps(payload)
+    if secret is None:
+        return hashlib.sha256(body).hexdigest()
+    return hmac.new(secret, body, hashlib.sha256).hexdigest()
+
+
+class IdempotencyClaim:
+    """Outcome of ``IdempotencyService.begin``.
+
+    Either ``replay`` holds the stored response of an earlier request with
+    the same key, or the caller owns the key and must ``complete`` or
+    ``release`` it.
+    """
+
+    def __init__(
+        self,
+        redis: RedisType,
+        key: str,
+        owner: str,
+        fingerprint: str,
+        replay: Optional[dict[str, Any]] = None,
+    ):
+        self.redis = redis
+        self.key = key
+        self.owner = owner
+        self.fingerprint = fingerprint
+        self.replay = replay
+
+    async def complete(self, status_code: int, body: Any) -> None:
+        record = {
+            "state": "completed",
+            "fingerprint": self.fingerprint,
+            "status": status_code,
+            "body": body,
+        }
+        stored = await self.redis.eval(
+            COMPLETE_SCRIPT,
+            1,
+            self.key,
+            self.owner,
+            codec.dumps_str(record),
+            IDEMPOTENCY_TTL_SECONDS,
+        )
+        if not stored:
+            logger.warning("Idempotency key was taken over, response not stored")
+
+    async def release(self) -> None:
+        """Forget the key so a retry runs again, e.g. after a 5xx."""
+        # atomic, a retry that took over after our lock expired keeps its marker
+        await self.redis.eval(RELEASE_SCRIPT, 1, self.key, self.owner)
+
+
+class IdempotencyService:
+    """``Idempotency-Key`` handling backed by Redis.
+
+    The first request with a key stores an in-progress marker (SET NX).
+    Duplicates arriving meanwhile poll until the first one completes, then
+    get its response replayed; later duplicates are answered from the
+    stored response right away. Reusing a key for a different request body
+    is a 422.
+    """
+
+    def __init__(self, redis: RedisType, secret: Optional[str] = None):
+        self.redis = redis
+        if secret is None:
+            # still the same on every worker, so a retry anywhere matches
+            logger.warning("IDEMPOTENCY_SECRET unset, request fingerprints are unkeyed")
+        self.secret = secret.encode("utf-8") if secret is not None else None
+
+    async def begin(
+        self, scope: str, key: str, payload: dict[str, Any]
+    ) -> IdempotencyClaim:
+        redis_key = f"idempotency:{scope}:{key}"
+        fingerprint = request_fingerprint(self.secret, payload)
+        owner = secrets.token_hex(8)
+        marker = codec.dumps_str(
+            {"state": "in_progress", "owner": owner, "fingerprint": fingerprint}
+        )
+
+        wait = IDEMPOTENCY_WAIT_SECONDS
+        left = remaining()
+        if left is not None:
+            # leave the waiter enough of its own deadline to answer
+            wait = min(wait, left - IDEMPOTENCY_POLL_SECONDS)
+        loop = asyncio.get_running_loop()
+        give_up_at = loop.time() + wait
+
+        while True:
+            if await self.redis.set(
+                redis_key, marker, nx=True, ex=IDEMPOTENCY_LOCK_SECONDS
+            ):
+                return IdempotencyClaim(self.redis, redis_key, owner, fingerprint)
+
+            raw = await self.redis.get(redis_key)
+            if raw is None:
+                # released or expired in between, try to take it
+                continue
+
+            record = codec.loads(raw)
+            if record["fingerprint"] != fingerprint:
+                raise HTTPException(
+                    status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail="Idempotency-Key was already used for a different request",
+                )
+            if record["state"] == "completed":
+                logger.info(f"Replaying {scope} response for idempotency key")
+                return IdempotencyClaim(
+                    self.redis, redis_key, owner, fingerprint, replay=record
+                )
+            if loop.time() >= give_up_at:
+                raise HTTPException(
+                    status.HTTP_409_CONFLICT,
+                    detail="A request with this Idempotency-Key is still in progress",
+                )
+            await asyncio.sleep(IDEMPOTENCY_POLL_SECONDS)
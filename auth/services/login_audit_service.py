@@ -0,0 +1,140 @@
+import asyncio
+import os
+from typing import Any, Optional
+
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from auth.dao.login_audit_dao import LoginAuditDAO
+from auth.models.signup_outbox_model import utcnow
+
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_SECONDS = float(os.getenv("AUDIT_FLUSH_SECONDS", "1"))
+
+
+class LoginAuditLogger:
+    """Signin audit trail, written off the request path.
+
+    ``record`` only puts the event on a bounded in-memory queue; a
+    background task writes batches of up to AUDIT_BATCH_SIZE events with
+    one multi-row insert, at the latest AUDIT_FLUSH_SECONDS after the first
+    event of a batch arrived. When the queue is full (the database is slow
+    or down) new events are dropped and counted rather than slowing signin
+    down. Events still queued at shutdown are flushed; a crash loses them.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        max_queue: int = AUDIT_QUEUE_SIZE,
+        batch_size: int = AUDIT_BATCH_SIZE,
+        flush_seconds: float = AUDIT_FLUSH_SECONDS,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue(max_queue)
+        self._task: Optional[asyncio.Task[None]] = None
+        # set on every record, and once a full batch is waiting
+        self._wakeup = asyncio.Event()
+        self._full = asyncio.Event()
+        self._closing = False
+
+        self.recorded = 0
+        self.dropped = 0
+        self.written = 0
+        self.lost = 0
+        self.batches = 0
+
+    def record(
+        self,
+        username: str,
+        success: bool,
+        user_id: Optional[object] = None,
+        role: Optional[str] = None,
+        ip: Optional[str] = None,
+        reason: Optional[str] = None,
+    ) -> None:
+        event = {
+            "created_at": utcnow(),
+            "username": username,
+            "user_id": None if user_id is None else str(user_id),
+            "role": role,
+            "success": success,
+            "reason": reason,
+            "ip": ip,
+        }
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f"Login audit queue full, {self.dropped} events dropped")
+            return
+        self.recorded += 1
+        self._wakeup.set()
+        if self._queue.qsize() >= self.batch_size:
+            self._full.set()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Flush what is queued, then stop the writer."""
+        if self._task is None:
+            return
+        self._closing = True
+        self._wakeup.set()
+        self._full.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Login audit not flushed, {self._queue.qsize()} events lost")
+        self._task = None
+
+    def _take(self, limit: int) -> list[dict[str, Any]]:
+        batch = []
+        while len(batch) < limit and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _write(self, batch: list[dict[str, Any]]) -> None:
+        try:
+            async with self.session_factory() as session:
+                await LoginAuditDAO(session).insert_many(batch)
+                await session.commit()
+        except Exception as e:
+            self.lost += len(batch)
+            logger.error(f"Failed to write {len(batch)} login audit events: {e}")
+            return
+        self.written += len(batch)
+        self.batches += 1
+
+    async def _run(self) -> None:
+        while True:
+            if self._queue.empty():
+                if self._closing:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            if self._queue.qsize() < self.batch_size and not self._closing:
+                # give a partial batch until the flush interval to fill up
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.flush_seconds)
+                except asyncio.TimeoutError:
+                    pass
+            self._full.clear()
+            await self._write(self._take(self.batch_size))
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "queued": self._queue.qsize(),
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "written": self.written,
+            "lost": self.lost,
+            "batches": self.batches,
+        }
@@ -1,5 +1,6 @@
+import os
 from datetime import datetime, timedelta, timezone
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Optional, Protocol
 
 import bcrypt
 import jwt  # Changed from jose import jwt
@@ -7,29 +8,32 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from loguru import logger
 from pydantic import BaseModel
-from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from auth.clients.user_client import UserApiClient
 from auth.dao.simple_password_auth_dao import SimplePasswordAuthDAO
 from auth.dto import AuthCredentials, UserCreate, UserPrivate
 from auth.exceptions import UserCreationFailed
+from auth.services.login_audit_service import LoginAuditLogger
+from auth.utils.bloom import MembershipFilter, add_later
+from auth.utils.breached_passwords import (
+    BREACHED_PASSWORD_DETAIL,
+    BreachedPasswordIndex,
+)
+from auth.utils.token_store import TokenStore
 from auth.utils.token_utils import get_token, set_token
+from auth.utils.tracing import span
 
 # from auth.models import Au
 
 if TYPE_CHECKING:
     from auth.models import AuthModel
 
-    RedisType = Redis[str]  # this is only processed by mypy
-else:
-    RedisType = Redis  # this is not seen by mypy but will be executed at runtime
-
 
 def hash_password(password: str) -> str:
     """Hashes a password using bcrypt with a generated salt."""
     salt = bcrypt.gensalt()  # Generate a new salt
-    hashed_password = bcrypt.hashpw(password.encode("utf-8"), salt)  # Hash the password
+    with span("bcrypt.hashpw"):
+        hashed_password = bcrypt.hashpw(password.encode("utf-8"), salt)  # Hash the password
     return hashed_password.decode("utf-8")  # Convert to string for storage
 
 
@@ -37,10 +41,21 @@ def hash_password(password: str) -> str:
 SECRET_KEY = "your-secret-key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# profile fields copied into the session record and returned by verify,
+# next to is_active which is always there
+CLAIM_FIELDS = tuple(f for f in os.getenv("CLAIM_FIELDS", "").split(",") if f)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
+def decode_access_token(token: str) -> Optional[dict[str, object]]:
+    """Claims of a validly signed, unexpired access token, else None."""
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.PyJWTError:
+        return None
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -52,19 +67,46 @@ class TokenData(BaseModel):
     username: Optional[str] = None
 
 
+class IdentityClient(Protocol):
+    """Upstream service that owns the identities (users or merchants)."""
+
+    async def get_user_id(self, username: str) -> Optional[object]: ...
+
+    async def get_identity(
+        self, username: str, fields: tuple[str, ...] = ()
+    ) -> Optional[dict[str, object]]: ...
+
+    async def create_user(self, user_registration_info: UserCreate) -> Optional[str]: ...
+
+
 class OAuthPasswordAuthService:
     def __init__(
         self,
         session: AsyncSession,
         auth_dao: SimplePasswordAuthDAO,
-        user_client: UserApiClient,
-        redis: RedisType,
+        user_client: IdentityClient,
+        token_store: TokenStore,
+        signup_filter: Optional[MembershipFilter] = None,
+        audit: Optional[LoginAuditLogger] = None,
+        breached_passwords: Optional[BreachedPasswordIndex] = None,
     ):
         self.user_client = user_client
         self.auth_dao = auth_dao
         self.session = session
 
-        self.redis = redis
+        self.token_store = token_store
+        # known usernames, lets a duplicate signup be rejected before the create
+        self.signup_filter = signup_filter
+        self.audit = audit
+        self.breached_passwords = breached_passwords
+
+    def auth_subject(self, user_id: object) -> str:
+        """Key under which the identity's credentials live in the auth table."""
+        return str(user_id)
+
+    def username_key(self, username: str) -> str:
+        # namespaced like auth subjects so roles don't share usernames
+        return f"username:{self.auth_subject(username)}"
 
     # async def create_access_token(
     #     self, data: dict[str, str], expires_delta: Optional[timedelta] = None
@@ -89,7 +131,8 @@ class OAuthPasswordAuthService:
         else:
             expire = datetime.now(timezone.utc) + timedelta(minutes=15)
 
-        to_encode.update(exp={"exp": str( expire )})
+        # a numeric exp claim, so jwt.decode enforces it
+        to_encode.update({"exp": expire})
         encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
         return encoded_jwt
 
@@ -105,12 +148,12 @@ class OAuthPasswordAuthService:
             if user_id is None:
                 raise credentials_exception
 
-            # Verify token in Redis
-            stored_token = await get_token(self.redis, str(user_id))
+            # the token must still be live in the store, i.e. not revoked
+            stored_token = await get_token(self.token_store, token)
             if stored_token is None:
                 raise credentials_exception
 
-            if str(stored_token) != token:
+            if str(stored_token["user_id"]) != str(user_id):
                 raise credentials_exception
 
             token_data = TokenData(
@@ -123,31 +166,79 @@ class OAuthPasswordAuthService:
     async def authenticate(
         self, auth_info: AuthCredentials
     ) -> Optional[dict[str, object]]:
-        user_id = await self.user_client.get_user_id(auth_info.username)
+        identity = await self.user_client.get_identity(
+            auth_info.username, CLAIM_FIELDS
+        )
 
-        if user_id is None:
+        if identity is None:
             logger.info("User does not exist")
             raise HTTPException(
                 status.HTTP_401_UNAUTHORIZED, detail="User does not exist..."
             )
+        # checked before bcrypt, a disabled account costs no hashing
+        if identity.get("is_active") is False:
+            raise HTTPException(status.HTTP_403_FORBIDDEN, detail="Inactive user")
+        user_id = identity["id"]
 
         auth = await self.auth_dao.authenticate(
-            str(user_id), auth_info.password.get_secret_value()
+            self.auth_subject(user_id), auth_info.password.get_secret_value()
         )
         if auth:
             logger.info("User authenticated successfully, Generating token")
             logger.info("Token generated")
-
-            return {"sub": auth_info.username, "user_id": user_id}
+            if self.signup_filter is not None:
+                add_later(self.signup_filter, self.username_key(auth_info.username))
+
+            return {
+                "sub": auth_info.username,
+                "user_id": user_id,
+                "claims": {
+                    # inactive users never get here, but downstream checks it
+                    "is_active": identity.get("is_active", True),
+                    **{
+                        field: identity[field]
+                        for field in CLAIM_FIELDS
+                        if field in identity
+                    },
+                },
+            }
         else:
             raise HTTPException(
                 status.HTTP_401_UNAUTHORIZED, detail="Invalid username or password"
             )
 
+    def _audit(
+        self,
+        username: str,
+        success: bool,
+        role: list[str],
+        ip: Optional[str],
+        user_id: Optional[object] = None,
+        reason: Optional[str] = None,
+    ) -> None:
+        if self.audit is not None:
+            self.audit.record(
+                username,
+                success,
+                user_id=user_id,
+                role=",".join(role),
+                ip=ip,
+                reason=reason,
+            )
+
     async def login_for_access_token(
-        self, auth_info: AuthCredentials, role: list[str]
+        self,
+        auth_info: AuthCredentials,
+        role: list[str],
+        client_ip: Optional[str] = None,
     ) -> dict[str, str]:
-        user = await self.authenticate(auth_info)
+        try:
+            user = await self.authenticate(auth_info)
+        except HTTPException as e:
+            self._audit(
+                auth_info.username, False, role, client_ip, reason=str(e.detail)
+            )
+            raise
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -160,17 +251,54 @@ class OAuthPasswordAuthService:
             data={"sub": user["sub"], "user_id": user["user_id"], "role": role},
             expires_delta=access_token_expires,
         )
-        logger.info("Storing Token in Redis")
+        logger.info("Storing Token")
 
-        # Store token in Redis
-        # await self.store_token_in_redis(user["user_id"], access_token, access_token_expires)
         await set_token(
-            self.redis, str(user["user_id"]), access_token, access_token_expires
+            self.token_store,
+            str(user["user_id"]),
+            access_token,
+            access_token_expires,
+            owner=self.auth_subject(user["user_id"]),
+            claims=user["claims"],  # type: ignore
+        )
+        self._audit(
+            auth_info.username,
+            True,
+            role,
+            client_ip,
+            user_id=self.auth_subject(user["user_id"]),
         )
 
         return {"access_token": access_token, "token_type": "bearer"}
 
+    async def _reject_known_username(self, username: str) -> None:
+        if self.signup_filter is None:
+            return
+        # a filter miss means the username was never seen, skip the lookup
+        if not await self.signup_filter.might_contain(self.username_key(username)):
+            return
+
+        if await self.user_client.get_user_id(username) is not None:
+            logger.info(f"Duplicate signup rejected for user {username}")
+            raise HTTPException(status.HTTP_409_CONFLICT, detail="User already exists")
+
+    def _reject_breached_password(self, password: str) -> None:
+        if self.breached_passwords is None:
+            return
+        with span("breached_passwords.lookup"):
+            breached = self.breached_passwords.is_breached(password)
+        if breached:
+            raise HTTPException(
+                status.HTTP_422_UNPROCESSABLE_ENTITY, detail=BREACHED_PASSWORD_DETAIL
+            )
+
     async def create_user(self, user_registration_info: UserPrivate) -> "AuthModel":
+        # before the upstream create, a rejected signup leaves nothing behind
+        self._reject_breached_password(
+            user_registration_info.password.get_secret_value()
+        )
+        await self._reject_known_username(user_registration_info.username)
+
         user_id = await self.user_client.create_user(
             UserCreate(**user_registration_info.model_dump())
         )
@@ -182,11 +310,13 @@ class OAuthPasswordAuthService:
 
         logger.info("User created successfully on User Model")
 
+        subject = self.auth_subject(user_id)
         password = hash_password(user_registration_info.password.get_secret_value())
 
         try:
-            auth = await self.auth_dao.create_user(user_id, password)
-            await self.session.commit()
+            auth = await self.auth_dao.create_user(subject, password)
+            async with span("db.auth.commit"):
+                await self.session.commit()
             await self.session.refresh(auth)
         except UserCreationFailed as e:
             logger.error(e)
@@ -194,12 +324,9 @@ class OAuthPasswordAuthService:
             raise HTTPException(status.HTTP_409_CONFLICT, detail="User already exists")
 
         logger.info("User created successfully on Auth Model")
+        if self.signup_filter is not None:
+            await self.signup_filter.add(
+                self.username_key(user_registration_info.username)
+            )
 
         return auth
-
-    async def store_token_in_redis(
-        self, user_id: int, access_token: str, expires_delta: timedelta
-    ) -> None:
-        # Convert timedelta to seconds
-        expires = int(expires_delta.total_seconds())
-        await self.redis.set(f"access_token:{user_id}", access_token, ex=expires)
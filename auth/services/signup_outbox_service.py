@@ -0,0 +1,288 @@
+import asyncio
+import os
+import uuid
+from datetime import timedelta
+from typing import Callable, Optional
+
+from fastapi import HTTPException, status
+from loguru import logger
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from auth.clients.user_client import UserApiClient
+from auth.dao.signup_outbox_dao import SignupOutboxDAO
+from auth.dao.simple_password_auth_dao import SimplePasswordAuthDAO
+from auth.dto import UserCreate, UserPrivate
+from auth.exceptions import SignupRejected
+from auth.models import SignupOutbox
+from auth.models.signup_outbox_model import utcnow
+from auth.utils.breached_passwords import (
+    BREACHED_PASSWORD_DETAIL,
+    BreachedPasswordIndex,
+)
+from auth.utils.security import hash_password, verify_password
+
+SIGNUP_MAX_ATTEMPTS = int(os.getenv("SIGNUP_MAX_ATTEMPTS", "8"))
+SIGNUP_RETRY_BASE_SECONDS = float(os.getenv("SIGNUP_RETRY_BASE_SECONDS", "2"))
+SIGNUP_RETRY_MAX_SECONDS = float(os.getenv("SIGNUP_RETRY_MAX_SECONDS", "300"))
+SIGNUP_POLL_SECONDS = float(os.getenv("SIGNUP_POLL_SECONDS", "1"))
+SIGNUP_BATCH_SIZE = int(os.getenv("SIGNUP_BATCH_SIZE", "20"))
+# how long a claimed entry is hidden from other workers
+SIGNUP_LEASE_SECONDS = float(os.getenv("SIGNUP_LEASE_SECONDS", "60"))
+# an upstream user must match these to be adopted by a retried signup
+UPSTREAM_MATCH_FIELDS = ("full_name", "phone_number")
+
+
+class SignupOutboxService:
+    """Request side of the signup pipeline: record the signup, answer status."""
+
+    def __init__(
+        self,
+        session: AsyncSession,
+        outbox_dao: SignupOutboxDAO,
+        on_enqueue: Optional[Callable[[], None]] = None,
+        breached_passwords: Optional[BreachedPasswordIndex] = None,
+    ):
+        self.session = session
+        self.outbox_dao = outbox_dao
+        self.on_enqueue = on_enqueue
+        self.breached_passwords = breached_passwords
+
+    async def submit(self, user_registration_info: UserPrivate) -> SignupOutbox:
+        if self.breached_passwords is not None:
+            password = user_registration_info.password.get_secret_value()
+            if self.breached_passwords.is_breached(password):
+                raise HTTPException(
+                    status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail=BREACHED_PASSWORD_DETAIL,
+                )
+
+        existing = await self.outbox_dao.get_open_by_username(
+            user_registration_info.username
+        )
+        if existing is not None:
+            return await self._resubmitted(existing, user_registration_info)
+
+        # bcrypt is CPU bound, keep it off the event loop
+        password_hash = await asyncio.to_thread(
+            hash_password, user_registration_info.password.get_secret_value()
+        )
+        entry = await self.outbox_dao.enqueue(
+            signup_id=uuid.uuid4().hex,
+            username=user_registration_info.username,
+            full_name=user_registration_info.full_name,
+            phone_number=user_registration_info.phone_number,
+            password_hash=password_hash,
+        )
+        try:
+            await self.session.commit()
+        except IntegrityError:
+            # a concurrent submit queued the username first
+            await self.session.rollback()
+            existing = await self.outbox_dao.get_open_by_username(
+                user_registration_info.username
+            )
+            if existing is None:
+                raise
+            return await self._resubmitted(existing, user_registration_info)
+        await self.session.refresh(entry)
+        logger.info(f"Signup {entry.signup_id} queued for {entry.username}")
+
+        if self.on_enqueue is not None:
+            self.on_enqueue()
+
+        return entry
+
+    async def _resubmitted(
+        self, existing: SignupOutbox, user_registration_info: UserPrivate
+    ) -> SignupOutbox:
+        """``existing`` if this is a double submit of it, else a 409."""
+        if existing.status != "pending":
+            raise HTTPException(status.HTTP_409_CONFLICT, detail="User already exists")
+
+        same = (
+            existing.full_name == user_registration_info.full_name
+            and existing.phone_number == user_registration_info.phone_number
+            and await asyncio.to_thread(
+                verify_password,
+                user_registration_info.password.get_secret_value(),
+                existing.password_hash,
+            )
+        )
+        if not same:
+            # someone else's signup, do not leak its id or adopt it
+            raise HTTPException(
+                status.HTTP_409_CONFLICT, detail="Signup already in progress"
+            )
+        return existing
+
+    async def get_status(self, signup_id: str) -> dict[str, object]:
+        entry = await self.outbox_dao.get_by_signup_id(signup_id)
+        if entry is None:
+            raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Unknown signup")
+
+        result: dict[str, object] = {
+            "signup_id": entry.signup_id,
+            "status": entry.status,
+        }
+        if entry.status == "failed":
+            result["error"] = entry.last_error
+        return result
+
+
+class SignupOutboxWorker:
+    """Background task that drives queued signups to completion.
+
+    Each step is idempotent so an entry can be retried after any failure:
+    the upstream user is looked up before being created again, and the auth
+    row is only inserted if it is missing. The auth row and the completed
+    status are committed in the same transaction.
+
+    An existing upstream user is only taken as this signup's own when an
+    earlier attempt recorded that it sent the create and the user's name and
+    phone number match; anyone else who registered the username meanwhile
+    fails the signup.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        user_client: UserApiClient,
+    ):
+        self.session_factory = session_factory
+        self.user_client = user_client
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task[None]] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                processed = await self.run_once()
+            except Exception as e:
+                logger.error(f"Signup outbox worker error: {e}")
+                processed = 0
+
+            if processed >= SIGNUP_BATCH_SIZE:
+                continue
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), SIGNUP_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def run_once(self) -> int:
+        async with self.session_factory() as session:
+            entries = await SignupOutboxDAO(session).claim_due(
+                SIGNUP_BATCH_SIZE, timedelta(seconds=SIGNUP_LEASE_SECONDS)
+            )
+            signup_ids = [entry.signup_id for entry in entries]
+            await session.commit()
+
+        for signup_id in signup_ids:
+            await self._process(signup_id)
+
+        return len(signup_ids)
+
+    async def _ensure_upstream_user(
+        self,
+        session: AsyncSession,
+        outbox_dao: SignupOutboxDAO,
+        entry: SignupOutbox,
+    ) -> str:
+        existing = await self.user_client.get_identity(
+            entry.username, UPSTREAM_MATCH_FIELDS
+        )
+        if existing is not None:
+            if entry.create_issued_at is not None and all(
+                existing.get(field) == getattr(entry, field)
+                for field in UPSTREAM_MATCH_FIELDS
+            ):
+                # an earlier attempt created it but died before recording the id
+                return str(existing["id"])
+            raise SignupRejected("User already exists")
+
+        await outbox_dao.mark_create_issued(entry)
+        await session.commit()
+        await session.refresh(entry)
+
+        user_id = await self.user_client.create_user(
+            UserCreate(
+                full_name=entry.full_name,
+                username=entry.username,
+                phone_number=entry.phone_number,
+            )
+        )
+        if user_id is None:
+            raise Exception("User service did not return an id")
+
+        return str(user_id)
+
+    async def _process(self, signup_id: str) -> None:
+        async with self.session_factory() as session:
+            outbox_dao = SignupOutboxDAO(session)
+            auth_dao = SimplePasswordAuthDAO(session=session)
+
+            entry = await outbox_dao.get_by_signup_id(signup_id)
+            if entry is None or entry.status != "pending":
+                return
+
+            try:
+                if entry.user_id is None:
+                    user_id = await self._ensure_upstream_user(
+                        session, outbox_dao, entry
+                    )
+                    await outbox_dao.mark_user_created(entry, user_id)
+                    await session.commit()
+                    await session.refresh(entry)
+                    logger.info(f"Signup {signup_id}: user {user_id} created upstream")
+
+                if not await auth_dao.is_user_id_exist(entry.user_id):  # type: ignore
+                    await auth_dao.create_user(entry.user_id, entry.password_hash)  # type: ignore
+                await outbox_dao.mark_completed(entry)
+                await session.commit()
+                logger.info(f"Signup {signup_id} completed")
+
+            except SignupRejected as e:
+                await session.rollback()
+                await session.refresh(entry)
+                await outbox_dao.mark_failed(entry, str(e))
+                await session.commit()
+                logger.info(f"Signup {signup_id} rejected: {e}")
+
+            except Exception as e:
+                await session.rollback()
+                await session.refresh(entry)
+                if entry.attempts >= SIGNUP_MAX_ATTEMPTS:
+                    await outbox_dao.mark_failed(entry, str(e))
+                    logger.error(
+                        f"Signup {signup_id} failed after {entry.attempts} attempts: {e}"
+                    )
+                else:
+                    delay = min(
+                        SIGNUP_RETRY_MAX_SECONDS,
+                        SIGNUP_RETRY_BASE_SECONDS * 2 ** (entry.attempts - 1),
+                    )
+                    await outbox_dao.mark_retry(
+                        entry, str(e), utcnow() + timedelta(seconds=delay)
+                    )
+                    logger.warning(
+                        f"Signup {signup_id} attempt {entry.attempts} failed, "
+                        f"retrying in {delay}s: {e}"
+                    )
+                await session.commit()
@@ -1,28 +1,67 @@
 import asyncio
+import random
+from collections import Counter
 from functools import wraps
-from typing import Callable
+from typing import Any, Awaitable, Callable, Optional, TypeVar
 
+import aiohttp
+from loguru import logger
+
+from auth.utils.deadline import remaining
+
+T = TypeVar("T")
+
+# transport failures worth another try; HTTP error statuses are not
+RETRIABLE_ERRORS: tuple[type[BaseException], ...] = (
+    aiohttp.ClientConnectionError,
+    asyncio.TimeoutError,
+)
+
+# "<name>.retries", "<name>.exhausted" and "<name>.out_of_budget" counts
+retry_stats: Counter[str] = Counter()
+
+
+def retry_with_backoff(
+    tries: int = 3,
+    base: float = 0.05,
+    cap: float = 1.0,
+    retry_on: tuple[type[BaseException], ...] = RETRIABLE_ERRORS,
+    name: Optional[str] = None,
+) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """Retry an idempotent coroutine on ``retry_on`` errors.
+
+    Sleeps use full jitter, ``uniform(0, min(cap, base * 2 ** attempt))``,
+    so clients that failed together do not retry together. No retry is
+    made when the sleep would not leave any of the request's deadline for
+    the next attempt; the last error is raised instead.
+    """
+
+    def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        label = name or func.__qualname__
 
-def retry_with_backoff(tries: int = 3, backoff: float = 1.0) -> Callable:
-    def decorator(func: Callable) -> Callable:
         @wraps(func)
-        async def wrapper(*args, **kwargs):
-            current_tries = tries
-            current_backoff = backoff
-            while current_tries > 0:
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            attempt = 0
+            while True:
                 try:
                     return await func(*args, **kwargs)
-                except Exception as e:
-                    current_tries -= 1
-                    if current_tries > 0:
-                        print(
-                            f"Error {e}, Retrying in {current_backoff} seconds... ({current_tries} tries left)"
-                        )
-                        await asyncio.sleep(current_backoff)
-                        current_backoff *= 2  # Double the backoff for the next attempt
-                    else:
-                        print("All retries failed.")
-                        raise e
+                except retry_on as e:
+                    attempt += 1
+                    if attempt >= tries:
+                        retry_stats[f"{label}.exhausted"] += 1
+                        raise
+
+                    delay = random.uniform(0, min(cap, base * 2**attempt))
+                    left = remaining()
+                    if left is not None and left <= delay:
+                        retry_stats[f"{label}.out_of_budget"] += 1
+                        raise
+
+                    retry_stats[f"{label}.retries"] += 1
+                    logger.warning(
+                        f"{label} failed with {e!r}, retry {attempt} in {delay:.3f}s"
+                    )
+                    await asyncio.sleep(delay)
 
         return wrapper
 
@@ -0,0 +1,131 @@
+import asyncio
+import hashlib
+import math
+from typing import TYPE_CHECKING, Protocol
+
+from loguru import logger
+from redis.asyncio import Redis
+
+if TYPE_CHECKING:
+    RedisType = Redis[str]  # this is only processed by mypy
+else:
+    RedisType = Redis  # this is not seen by mypy but will be executed at runtime
+
+
+def bloom_parameters(capacity: int, error_rate: float) -> tuple[int, int]:
+    """Bit count and hash count for ``capacity`` items at ``error_rate``."""
+    bits = math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+    hashes = max(1, round(bits / capacity * math.log(2)))
+    return bits, hashes
+
+
+def bloom_positions(item: str, bits: int, hashes: int) -> list[int]:
+    # Kirsch-Mitzenmacher: k positions from two 64 bit halves of one digest
+    digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+    return [(h1 + i * h2) % bits for i in range(hashes)]
+
+
+class MembershipFilter(Protocol):
+    """Probabilistic set: no false negatives, rare false positives."""
+
+    async def add(self, item: str) -> None: ...
+
+    async def add_many(self, items: list[str]) -> None: ...
+
+    async def might_contain(self, item: str) -> bool: ...
+
+
+class BloomFilter:
+    """In-process Bloom filter backed by a bytearray."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.bits, self.hashes = bloom_parameters(capacity, error_rate)
+        self.array = bytearray((self.bits + 7) // 8)
+
+    def _add(self, item: str) -> None:
+        for position in bloom_positions(item, self.bits, self.hashes):
+            self.array[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self.array[position >> 3] & (1 << (position & 7))
+            for position in bloom_positions(item, self.bits, self.hashes)
+        )
+
+    async def add(self, item: str) -> None:
+        self._add(item)
+
+    async def add_many(self, items: list[str]) -> None:
+        for item in items:
+            self._add(item)
+
+    async def might_contain(self, item: str) -> bool:
+        return item in self
+
+
+# background adds in flight, referenced so they are not garbage collected
+_pending_adds: "set[asyncio.Task[None]]" = set()
+
+
+def add_later(membership: MembershipFilter, item: str) -> None:
+    """Add ``item`` without waiting on it, for hot paths like signin.
+
+    Items already in the filter are not written again; a failed add only
+    costs a filter miss later, so it is logged and dropped.
+    """
+    if isinstance(membership, BloomFilter):
+        # in memory, nothing to wait for
+        membership._add(item)
+        return
+
+    async def add() -> None:
+        try:
+            if not await membership.might_contain(item):
+                await membership.add(item)
+        except Exception as e:
+            logger.warning(f"Signup filter add failed: {e}")
+
+    task = asyncio.create_task(add())
+    _pending_adds.add(task)
+    task.add_done_callback(_pending_adds.discard)
+
+
+class RedisBloomFilter:
+    """Bloom filter stored as a Redis bitmap, shared by every worker."""
+
+    def __init__(
+        self,
+        redis: RedisType,
+        key: str,
+        capacity: int,
+        error_rate: float = 0.01,
+    ):
+        self.redis = redis
+        self.key = key
+        self.bits, self.hashes = bloom_parameters(capacity, error_rate)
+
+    def _client(self) -> RedisType:
+        # the whole bitmap is one key, pipeline against the shard that owns it
+        client_for = getattr(self.redis, "client_for", None)
+        return client_for(self.key) if client_for is not None else self.redis
+
+    async def exists(self) -> bool:
+        return bool(await self.redis.exists(self.key))
+
+    async def add(self, item: str) -> None:
+        await self.add_many([item])
+
+    async def add_many(self, items: list[str]) -> None:
+        pipe = self._client().pipeline(transaction=False)
+        for item in items:
+            for position in bloom_positions(item, self.bits, self.hashes):
+                pipe.setbit(self.key, position, 1)
+        await pipe.execute()
+
+    async def might_contain(self, item: str) -> bool:
+        pipe = self._client().pipeline(transaction=False)
+        for position in bloom_positions(item, self.bits, self.hashes):
+            pipe.getbit(self.key, position)
+        return all(await pipe.execute())
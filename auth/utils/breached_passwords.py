@@ -0,0 +1,246 @@
+import argparse
+import hashlib
+import heapq
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+from loguru import logger
+
+from auth.utils.bloom import bloom_parameters, bloom_positions
+
+MAGIC = b"BPW1"
+# magic, version, digest bytes kept, entries, bloom bits, bloom hashes
+HEADER = struct.Struct("<4sHHQQI")
+HEADER_SIZE = 64
+PREFIXES = 1 << 16
+# entry index where each 2 byte digest prefix starts, plus the end
+TABLE = struct.Struct(f"<{PREFIXES + 1}Q")
+TABLE_OFFSET = HEADER_SIZE
+BLOOM_OFFSET = TABLE_OFFSET + TABLE.size
+
+BREACHED_PASSWORD_DETAIL = (
+    "This password has appeared in a data breach, please choose another one"
+)
+
+
+def password_digest(password: str) -> bytes:
+    return hashlib.sha1(password.encode("utf-8")).digest()
+
+
+class BreachedPasswordIndex:
+    """Read side of the breached-password index built by ``build_index``.
+
+    File layout: header, a 65536-entry fan-out table on the first two
+    digest bytes, an optional Bloom filter, then the sorted SHA-1 digests
+    truncated to ``digest_bytes``. The file is mmap'd read-only, so every
+    worker shares the page cache instead of holding a copy. A lookup is
+    one Bloom probe, or a binary search over the ~N/65536 entries of one
+    prefix.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (
+            magic,
+            version,
+            self.digest_bytes,
+            self.count,
+            self.bloom_bits,
+            self.bloom_hashes,
+        ) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != 1:
+            raise ValueError(f"{path} is not a breached-password index")
+        self._digests_offset = BLOOM_OFFSET + (self.bloom_bits + 7) // 8
+
+    def _bloom_rejects(self, key: bytes) -> bool:
+        if not self.bloom_bits:
+            return False
+        for position in bloom_positions(key.hex(), self.bloom_bits, self.bloom_hashes):
+            if not self._mm[BLOOM_OFFSET + (position >> 3)] & (1 << (position & 7)):
+                return True
+        return False
+
+    def contains_digest(self, digest: bytes) -> bool:
+        key = digest[: self.digest_bytes]
+        if self._bloom_rejects(key):
+            return False
+
+        prefix = int.from_bytes(digest[:2], "big")
+        lo, hi = struct.unpack_from("<QQ", self._mm, TABLE_OFFSET + prefix * 8)
+        width = self.digest_bytes
+        base = self._digests_offset
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = base + mid * width
+            entry = self._mm[start : start + width]
+            if entry == key:
+                return True
+            if entry < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return False
+
+    def is_breached(self, password: str) -> bool:
+        return self.contains_digest(password_digest(password))
+
+    def close(self) -> None:
+        self._mm.close()
+
+
+def _parse_digests(lines: Iterable[bytes], plaintext: bool) -> Iterator[bytes]:
+    for line in lines:
+        line = line.rstrip(b"\r\n")
+        if not line:
+            continue
+        if plaintext:
+            yield hashlib.sha1(line).digest()
+            continue
+        # HIBP style "<40 hex>:<count>", the count is dropped
+        try:
+            digest = bytes.fromhex(line.split(b":", 1)[0].decode("ascii"))
+        except ValueError:
+            digest = b""
+        # a short digest would shift every fixed-width entry after it
+        if len(digest) != hashlib.sha1().digest_size:
+            logger.warning(f"Skipping malformed line {line[:60]!r}")
+            continue
+        yield digest
+
+
+def _write_run(digests: list[bytes], directory: str) -> str:
+    digests.sort()
+    fd, path = tempfile.mkstemp(suffix=".run", dir=directory)
+    with os.fdopen(fd, "wb") as f:
+        f.write(b"".join(digests))
+    return path
+
+
+def _read_run(path: str, width: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while chunk := f.read(width * 65536):
+            for start in range(0, len(chunk), width):
+                yield chunk[start : start + width]
+
+
+def build_index(
+    source: BinaryIO,
+    path: str,
+    digest_bytes: int = 10,
+    bloom_error_rate: Optional[float] = None,
+    plaintext: bool = False,
+    chunk_entries: int = 10_000_000,
+    tmp_dir: Optional[str] = None,
+) -> int:
+    """Convert a dump of SHA-1 hashes (or passwords) into an index at ``path``.
+
+    Dumps larger than memory are handled with an external sort: sorted
+    runs of ``chunk_entries`` digests go to temporary files and are merged
+    while writing. The index is written next to ``path`` and renamed over
+    it, so workers mapping the old one keep reading it. Returns the number
+    of distinct digests written.
+    """
+    if not 2 <= digest_bytes <= 20:
+        raise ValueError("digest_bytes must be between 2 and 20")
+
+    tmp_dir = tmp_dir or os.path.dirname(os.path.abspath(path))
+    runs: list[str] = []
+    total = 0
+    partial: Optional[str] = None
+    try:
+        chunk: list[bytes] = []
+        for digest in _parse_digests(source, plaintext):
+            chunk.append(digest[:digest_bytes])
+            if len(chunk) >= chunk_entries:
+                runs.append(_write_run(chunk, tmp_dir))
+                total += len(chunk)
+                chunk = []
+        if chunk:
+            runs.append(_write_run(chunk, tmp_dir))
+            total += len(chunk)
+
+        bloom_bits, bloom_hashes = 0, 0
+        if bloom_error_rate and total:
+            # sized for every input line, duplicates only lower the error rate
+            bloom_bits, bloom_hashes = bloom_parameters(total, bloom_error_rate)
+        bloom = bytearray((bloom_bits + 7) // 8)
+        table = [0] * (PREFIXES + 1)
+
+        count = 0
+        previous = b""
+        # next to path, so the rename stays on one filesystem
+        fd, partial = tempfile.mkstemp(
+            suffix=".partial", dir=os.path.dirname(os.path.abspath(path))
+        )
+        with os.fdopen(fd, "wb") as out:
+            out.seek(BLOOM_OFFSET + len(bloom))
+            merged = heapq.merge(*(_read_run(run, digest_bytes) for run in runs))
+            for digest in merged:
+                if digest == previous:
+                    continue
+                previous = digest
+                table[int.from_bytes(digest[:2], "big") + 1] += 1
+                if bloom_bits:
+                    for position in bloom_positions(
+                        digest.hex(), bloom_bits, bloom_hashes
+                    ):
+                        bloom[position >> 3] |= 1 << (position & 7)
+                out.write(digest)
+                count += 1
+
+            for prefix in range(PREFIXES):
+                table[prefix + 1] += table[prefix]
+            out.seek(0)
+            header = HEADER.pack(
+                MAGIC, 1, digest_bytes, count, bloom_bits, bloom_hashes
+            )
+            out.write(header.ljust(HEADER_SIZE, b"\0"))
+            out.write(TABLE.pack(*table))
+            out.write(bloom)
+        # mkstemp makes it private, workers may run as another user
+        os.chmod(partial, 0o644)
+        os.replace(partial, path)
+    finally:
+        for run in runs:
+            os.unlink(run)
+        if partial is not None and os.path.exists(partial):
+            os.unlink(partial)
+
+    return count
+
+
+if __name__ == "__main__":
+    # python -m auth.utils.breached_passwords pwned-passwords-sha1.txt breached.idx
+    parser = argparse.ArgumentParser(
+        description="Build the breached-password index from a hash dump."
+    )
+    parser.add_argument(
+        "source", help="one SHA-1 hex (optionally :count) per line, - for stdin"
+    )
+    parser.add_argument("index", help="output file")
+    parser.add_argument("--digest-bytes", type=int, default=10)
+    parser.add_argument("--bloom-error-rate", type=float, default=None)
+    parser.add_argument("--plaintext", action="store_true", help="lines are passwords")
+    parser.add_argument("--chunk-entries", type=int, default=10_000_000)
+    parser.add_argument("--tmp-dir", default=None)
+    args = parser.parse_args()
+
+    source = sys.stdin.buffer if args.source == "-" else open(args.source, "rb")
+    with source:
+        written = build_index(
+            source,
+            args.index,
+            digest_bytes=args.digest_bytes,
+            bloom_error_rate=args.bloom_error_rate,
+            plaintext=args.plaintext,
+            chunk_entries=args.chunk_entries,
+            tmp_dir=args.tmp_dir,
+        )
+    print(f"{written} digests written to {args.index}")
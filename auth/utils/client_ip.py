@@ -0,0 +1,15 @@
+import os
+from typing import Optional
+
+from fastapi import Request
+
+# set by the nginx in front of us; empty means trust the socket peer only
+FORWARDED_IP_HEADER = os.getenv("FORWARDED_IP_HEADER", "X-Real-IP")
+
+
+def client_ip(request: Request) -> Optional[str]:
+    if FORWARDED_IP_HEADER:
+        forwarded = request.headers.get(FORWARDED_IP_HEADER)
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else None
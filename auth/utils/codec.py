@@ -0,0 +1,28 @@
+from typing import Any, Iterable, Optional
+
+import orjson
+
+
+def loads(data: bytes | str) -> Any:
+    return orjson.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj)
+
+
+def dumps_str(obj: Any) -> str:
+    """JSON serializer for aiohttp's ``json_serialize`` hook, which expects a str."""
+    return orjson.dumps(obj).decode("utf-8")
+
+
+def pick(data: bytes | str, fields: Iterable[str]) -> Optional[dict[str, Any]]:
+    """Decode a JSON object and keep only ``fields``, skipping model validation.
+
+    Returns None when the payload is empty or not a JSON object.
+    """
+    payload = orjson.loads(data) if data else None
+    if not isinstance(payload, dict):
+        return None
+
+    return {field: payload[field] for field in fields if field in payload}
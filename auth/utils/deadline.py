@@ -0,0 +1,88 @@
+import asyncio
+import contextvars
+import time
+from collections import Counter
+from typing import Awaitable, Optional, TypeVar
+
+from auth.exceptions import DeadlineExceeded
+
+T = TypeVar("T")
+
+# absolute time.monotonic() by which the current request must be answered
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "request_deadline", default=None
+)
+
+# deadline exceeded counts per operation, for /health/outbound
+deadline_stats: Counter[str] = Counter()
+
+
+def set_deadline(seconds: float) -> "contextvars.Token[Optional[float]]":
+    """Start a budget of ``seconds``; a tighter enclosing deadline wins."""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    return _deadline.set(deadline)
+
+
+def reset_deadline(token: "contextvars.Token[Optional[float]]") -> None:
+    _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left for the current request, None outside of one."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def check_deadline(operation: str) -> None:
+    if expired():
+        deadline_stats[operation] += 1
+        raise DeadlineExceeded(f"Deadline exceeded before {operation}")
+
+
+def timeout_for(operation: str, default: float) -> float:
+    """Timeout for one call: ``default``, capped by the remaining budget."""
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        deadline_stats[operation] += 1
+        raise DeadlineExceeded(f"Deadline exceeded before {operation}")
+    return min(default, left)
+
+
+async def within_deadline(
+    awaitable: Awaitable[T], operation: str, default: Optional[float] = None
+) -> T:
+    """Await ``awaitable`` bounded by the request budget (and ``default``)."""
+    if _deadline.get() is None and default is None:
+        return await awaitable
+
+    timeout = remaining()
+    if default is not None:
+        timeout = default if timeout is None else min(default, timeout)
+    if timeout is not None and timeout <= 0:
+        # never started, make sure it does not run or warn
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        elif asyncio.isfuture(awaitable):
+            awaitable.cancel()
+        deadline_stats[operation] += 1
+        raise DeadlineExceeded(f"Deadline exceeded before {operation}")
+
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        if expired():
+            deadline_stats[operation] += 1
+            raise DeadlineExceeded(f"Deadline exceeded during {operation}") from None
+        raise
@@ -0,0 +1,212 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Optional
+
+from loguru import logger
+from redis.asyncio import Redis
+
+from auth.utils.shm_cache import SharedTokenCache
+
+if TYPE_CHECKING:
+    RedisType = Redis[str]  # this is only processed by mypy
+else:
+    RedisType = Redis  # this is not seen by mypy but will be executed at runtime
+
+
+def token_digest(token: str) -> str:
+    # tokens never leave the process in clear, invalidations carry the digest
+    return hashlib.blake2b(token.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class NearTokenCache:
+    """Per-worker cache of verified tokens in front of Redis.
+
+    Entries live at most ``ttl`` seconds (less if the Redis key expires
+    sooner). Revocations are broadcast on a pub/sub channel and every
+    worker drops the entry when the message arrives. While the subscription
+    is down the cache is bypassed, since invalidations could be missed.
+
+    With ``shared`` a local miss is looked up in the host-wide cache next,
+    so a token verified by one worker is a hit on the others. Its epoch is
+    part of ``generation``, so a worker the revocation has not reached yet
+    cannot put the record back for the others.
+    """
+
+    def __init__(
+        self,
+        pubsub_redis: RedisType,
+        channel: str = "token-invalidation",
+        max_entries: int = 100_000,
+        ttl: float = 30.0,
+        shared: Optional[SharedTokenCache] = None,
+    ):
+        self.pubsub_redis = pubsub_redis
+        self.channel = channel
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared = shared
+
+        self._entries: OrderedDict[str, tuple[dict[str, object], float]] = OrderedDict()
+        self._task: Optional[asyncio.Task[None]] = None
+        self._subscribed = asyncio.Event()
+
+        # bumped on every invalidation, lets a reader detect one raced its fetch
+        self._generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.total_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+
+    async def start(self, timeout: float = 5.0) -> None:
+        self._task = asyncio.create_task(self._listen())
+        try:
+            await asyncio.wait_for(self._subscribed.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Near cache not subscribed yet, serving from Redis")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.shared is not None:
+            self.shared.close()
+
+    @property
+    def generation(self) -> tuple[int, int]:
+        """Read before fetching a token, pass to ``put``."""
+        epoch = self.shared.epoch() if self.shared is not None else 0
+        return self._generation, epoch
+
+    def _get_shared(self, key: str) -> Optional[dict[str, object]]:
+        if self.shared is None:
+            return None
+        found = self.shared.get(key)
+        if found is None:
+            return None
+        value, expires_at = found
+        ttl = min(self.ttl, expires_at - time.time())
+        if ttl > 0:
+            self._store(key, value, ttl)
+        return value
+
+    def _store(self, key: str, value: dict[str, object], ttl: float) -> None:
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, token: str) -> Optional[dict[str, object]]:
+        if not self._subscribed.is_set():
+            return None
+
+        key = token_digest(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return self._get_shared(key)
+
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return self._get_shared(key)
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(
+        self,
+        token: str,
+        value: dict[str, object],
+        ttl: Optional[float] = None,
+        generation: Optional[tuple[int, int]] = None,
+    ) -> None:
+        """Cache ``value``; pass the ``generation`` read before the fetch."""
+        if not self._subscribed.is_set():
+            return
+        if generation is not None and generation[0] != self._generation:
+            return
+
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+
+        key = token_digest(token)
+        if self.shared is not None:
+            epoch = generation[1] if generation is not None else None
+            if not self.shared.put(key, value, ttl, epoch=epoch):
+                # revoked by some worker on the host since the fetch
+                return
+        self._store(key, value, ttl)
+
+    async def invalidate(self, token: str) -> None:
+        key = token_digest(token)
+        self._entries.pop(key, None)
+        if self.shared is not None:
+            self.shared.delete(key)
+        self._generation += 1
+        await self.pubsub_redis.publish(self.channel, f"{key}:{time.time()}")
+
+    def _on_invalidation(self, message: str) -> None:
+        key, _, published_at = message.partition(":")
+        self._entries.pop(key, None)
+        if self.shared is not None:
+            # every worker deletes it, the first one does the work
+            self.shared.delete(key)
+        self._generation += 1
+        self.invalidations += 1
+        if published_at:
+            # wall clock across hosts, only as good as their clock sync
+            lag_ms = max(0.0, (time.time() - float(published_at)) * 1000)
+            self.total_lag_ms += lag_ms
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self.pubsub_redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                # anything published before this point may have been missed
+                self._entries.clear()
+                if self.shared is not None:
+                    self.shared.clear()
+                self._generation += 1
+                self._subscribed.set()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._on_invalidation(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Near cache subscription lost: {e}")
+            finally:
+                self._subscribed.clear()
+                self._entries.clear()
+                await pubsub.close()
+
+            await asyncio.sleep(1)
+
+    def stats(self) -> dict[str, object]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self._subscribed.is_set(),
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "avg_invalidation_lag_ms": round(self.total_lag_ms / self.invalidations, 3)
+            if self.invalidations
+            else 0.0,
+            "max_invalidation_lag_ms": round(self.max_lag_ms, 3),
+            "shared": self.shared.stats() if self.shared is not None else None,
+        }
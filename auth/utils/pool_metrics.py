@@ -0,0 +1,111 @@
+import time
+from typing import Any, Optional
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+class PoolMetrics:
+    """Checkout telemetry for one connection pool."""
+
+    def __init__(self, name: str, warn_wait_ms: float) -> None:
+        self.name = name
+        self.warn_wait_ms = warn_wait_ms
+        self.pool: Optional[AsyncAdaptedQueuePool] = None
+
+        self.checkouts = 0
+        self.checkins = 0
+        self.slow_checkouts = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.last_wait_ms = 0.0
+        self.peak_in_use = 0
+
+    def record_wait(self, wait_ms: float) -> None:
+        self.total_wait_ms += wait_ms
+        self.last_wait_ms = wait_ms
+        if wait_ms > self.max_wait_ms:
+            self.max_wait_ms = wait_ms
+
+        if wait_ms > self.warn_wait_ms:
+            self.slow_checkouts += 1
+            logger.warning(
+                f"DB pool {self.name}: checkout waited {wait_ms:.1f} ms "
+                f"(threshold {self.warn_wait_ms:.0f} ms), {self.snapshot()}"
+            )
+
+    def on_checkout(self, *args: Any) -> None:
+        self.checkouts += 1
+        in_use = self.pool.checkedout() if self.pool is not None else 0
+        if in_use > self.peak_in_use:
+            self.peak_in_use = in_use
+
+    def on_checkin(self, *args: Any) -> None:
+        self.checkins += 1
+
+    def snapshot(self) -> dict[str, object]:
+        pool = self.pool
+        return {
+            "name": self.name,
+            "size": pool.size() if pool is not None else 0,
+            "in_use": pool.checkedout() if pool is not None else 0,
+            "idle": pool.checkedin() if pool is not None else 0,
+            # QueuePool counts unopened slots as negative overflow
+            "overflow": max(pool.overflow(), 0) if pool is not None else 0,
+            "peak_in_use": self.peak_in_use,
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "slow_checkouts": self.slow_checkouts,
+            "avg_wait_ms": round(self.total_wait_ms / self.checkouts, 3)
+            if self.checkouts
+            else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 3),
+            "last_wait_ms": round(self.last_wait_ms, 3),
+            "warn_wait_ms": self.warn_wait_ms,
+        }
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that times how long each checkout waits."""
+
+    metrics: Optional[PoolMetrics] = None
+
+    def _do_get(self) -> Any:
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            if self.metrics is not None:
+                self.metrics.record_wait((time.perf_counter() - start) * 1000)
+
+    def recreate(self) -> "InstrumentedAsyncQueuePool":
+        # engine.dispose() swaps in a fresh pool, keep reporting into the same metrics
+        new_pool: InstrumentedAsyncQueuePool = super().recreate()  # type: ignore
+        new_pool.metrics = self.metrics
+        if self.metrics is not None:
+            self.metrics.pool = new_pool
+        return new_pool
+
+
+# engine label -> metrics, read by the pool stats endpoint
+pool_metrics: dict[str, PoolMetrics] = {}
+
+
+def instrument_engine(engine: AsyncEngine, name: str, warn_wait_ms: float) -> PoolMetrics:
+    metrics = PoolMetrics(name, warn_wait_ms)
+    pool = engine.sync_engine.pool
+    if isinstance(pool, InstrumentedAsyncQueuePool):
+        pool.metrics = metrics
+        metrics.pool = pool
+
+    event.listen(engine.sync_engine, "checkout", metrics.on_checkout)
+    event.listen(engine.sync_engine, "checkin", metrics.on_checkin)
+
+    pool_metrics[name] = metrics
+    return metrics
+
+
+def pool_stats() -> dict[str, dict[str, object]]:
+    return {name: metrics.snapshot() for name, metrics in pool_metrics.items()}
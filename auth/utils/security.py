@@ -1,5 +1,13 @@
 import bcrypt
 
+from auth.utils.tracing import span
+
 
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
\ No newline at end of file
+    with span("bcrypt.hashpw"):
+        return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+
+
+def verify_password(password: str, password_hash: str) -> bool:
+    with span("bcrypt.checkpw"):
+        return bcrypt.checkpw(password.encode("utf-8"), password_hash.encode("utf-8"))
@@ -0,0 +1,251 @@
+import asyncio
+import bisect
+import hashlib
+from typing import TYPE_CHECKING, Any, Iterable, Optional
+
+from redis.asyncio import Redis
+
+if TYPE_CHECKING:
+    RedisType = Redis[str]  # this is only processed by mypy
+else:
+    RedisType = Redis  # this is not seen by mypy but will be executed at runtime
+
+
+# how long a delete during a reshard keeps a migration from restoring the key
+TOMBSTONE_SECONDS = 60
+
+# copy a migrated key to its new owner unless it was deleted meanwhile;
+# returns the value the new owner holds, nil if deleted
+MIGRATE_SCRIPT = """
+if redis.call("EXISTS", KEYS[2]) == 1 then
+    return false
+end
+local stored
+if tonumber(ARGV[2]) > 0 then
+    stored = redis.call("SET", KEYS[1], ARGV[1], "PX", ARGV[2], "NX")
+else
+    stored = redis.call("SET", KEYS[1], ARGV[1], "NX")
+end
+if stored then
+    return ARGV[1]
+end
+return redis.call("GET", KEYS[1])
+"""
+
+
+def _tombstone(key: str) -> str:
+    return f"reshard-deleted:{key}"
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big"
+    )
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes.
+
+    Adding or removing a node only moves the keys that hashed next to it,
+    roughly 1/N of the keyspace.
+    """
+
+    def __init__(self, nodes: Iterable[str], vnodes: int = 160):
+        self.nodes = list(nodes)
+        if not self.nodes:
+            raise ValueError("HashRing needs at least one node")
+
+        points = sorted(
+            (_hash(f"{node}#{replica}"), node)
+            for node in self.nodes
+            for replica in range(vnodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def node_for(self, key: str) -> str:
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+
+class ShardedRedis:
+    """Client side sharding of the token keyspace over several Redis nodes.
+
+    Implements the subset of the redis.asyncio API the token store uses.
+    Multi-key commands are split per shard. While ``previous_nodes`` is set
+    (during a reshard) a miss on the new owner falls back to the old owner
+    and the key is moved over with its remaining TTL, so live sessions
+    survive the change. Sets are not moved: they are read from both owners
+    and the old copy expires on its own. A delete leaves a short-lived
+    tombstone on the new owner, so a migration that read the old copy
+    before the delete cannot bring the key back.
+    """
+
+    def __init__(
+        self,
+        clients: dict[str, RedisType],
+        nodes: Optional[list[str]] = None,
+        previous_nodes: Optional[list[str]] = None,
+    ):
+        # clients holds every known node, retired ones are only read from
+        self.clients = clients
+        self.ring = HashRing(nodes or list(clients))
+        self.previous_ring = HashRing(previous_nodes) if previous_nodes else None
+
+    @classmethod
+    def from_urls(
+        cls, urls: list[str], previous_urls: Optional[list[str]] = None, **kwargs: Any
+    ) -> "ShardedRedis":
+        clients = {
+            url: Redis.from_url(url, **kwargs)
+            for url in dict.fromkeys(urls + (previous_urls or []))
+        }
+        return cls(clients, nodes=urls, previous_nodes=previous_urls)
+
+    def client_for(self, key: str) -> RedisType:
+        return self.clients[self.ring.node_for(key)]
+
+    def _previous_client_for(self, key: str) -> Optional[RedisType]:
+        if self.previous_ring is None:
+            return None
+        node = self.previous_ring.node_for(key)
+        if node == self.ring.node_for(key):
+            return None
+        return self.clients[node]
+
+    def _group(self, keys: Iterable[str]) -> dict[str, list[str]]:
+        groups: dict[str, list[str]] = {}
+        for key in keys:
+            groups.setdefault(self.ring.node_for(key), []).append(key)
+        return groups
+
+    async def _migrate(self, key: str, old: RedisType, new: RedisType) -> Optional[str]:
+        value = await old.get(key)
+        if value is None:
+            return None
+
+        ttl_ms = await old.pttl(key)
+        if ttl_ms == -2:
+            return None
+        # nx: never clobber a value written to the new owner meanwhile
+        value = await new.eval(
+            MIGRATE_SCRIPT, 2, key, _tombstone(key), value, max(ttl_ms, 0)
+        )
+        await old.delete(key)
+        return value
+
+    async def get(self, key: str) -> Optional[str]:
+        client = self.client_for(key)
+        value = await client.get(key)
+        if value is None:
+            previous = self._previous_client_for(key)
+            if previous is not None:
+                value = await self._migrate(key, previous, client)
+        return value
+
+    async def set(self, name: str, value: Any, **kwargs: Any) -> Any:
+        return await self.client_for(name).set(name, value, **kwargs)
+
+    async def mget(self, keys: list[str]) -> list[Optional[str]]:
+        groups = self._group(keys)
+        results = await asyncio.gather(
+            *(self.clients[node].mget(node_keys) for node, node_keys in groups.items())
+        )
+        found: dict[str, Optional[str]] = {}
+        for node_keys, values in zip(groups.values(), results):
+            found.update(zip(node_keys, values))
+
+        for key, value in found.items():
+            if value is None and self._previous_client_for(key) is not None:
+                found[key] = await self.get(key)
+
+        return [found[key] for key in keys]
+
+    async def delete(self, *names: str) -> int:
+        previous = {
+            name: client
+            for name in names
+            if (client := self._previous_client_for(name)) is not None
+        }
+        # tombstones first, a migration past its GET must see them
+        await asyncio.gather(
+            *(
+                self.client_for(name).set(_tombstone(name), 1, ex=TOMBSTONE_SECONDS)
+                for name in previous
+            )
+        )
+        deleted = sum(
+            await asyncio.gather(
+                *(
+                    self.clients[node].delete(*node_keys)
+                    for node, node_keys in self._group(names).items()
+                )
+            )
+        )
+        for name, client in previous.items():
+            deleted += await client.delete(name)
+        return deleted
+
+    async def exists(self, *names: str) -> int:
+        count = 0
+        for node, node_keys in self._group(names).items():
+            count += await self.clients[node].exists(*node_keys)
+        return count
+
+    async def _ttl(self, name: str, command: str) -> int:
+        client = self.client_for(name)
+        ttl = await getattr(client, command)(name)
+        previous = self._previous_client_for(name)
+        if ttl != -2 or previous is None:
+            return ttl
+        # not migrated yet, or moved by a concurrent get after we looked
+        ttl = await getattr(previous, command)(name)
+        if ttl != -2:
+            return ttl
+        return await getattr(client, command)(name)
+
+    async def ttl(self, name: str) -> int:
+        return await self._ttl(name, "ttl")
+
+    async def pttl(self, name: str) -> int:
+        return await self._ttl(name, "pttl")
+
+    async def expire(self, name: str, time: int) -> bool:
+        if await self.client_for(name).expire(name, time):
+            return True
+        previous = self._previous_client_for(name)
+        # still on the old owner, the migration carries the new TTL over
+        return previous is not None and bool(await previous.expire(name, time))
+
+    async def sadd(self, name: str, *values: str) -> int:
+        # new members only go to the new owner, smembers unions both
+        return await self.client_for(name).sadd(name, *values)
+
+    async def srem(self, name: str, *values: str) -> int:
+        removed = await self.client_for(name).srem(name, *values)
+        previous = self._previous_client_for(name)
+        if previous is not None:
+            removed += await previous.srem(name, *values)
+        return removed
+
+    async def smembers(self, name: str) -> Iterable[str]:
+        members = set(await self.client_for(name).smembers(name))
+        previous = self._previous_client_for(name)
+        if previous is not None:
+            members.update(await previous.smembers(name))
+        return members
+
+    async def eval(self, script: str, numkeys: int, *keys_and_args: str) -> Any:
+        # the keys of one script must live on the same node
+        return await self.client_for(keys_and_args[0]).eval(
+            script, numkeys, *keys_and_args
+        )
+
+    async def ping(self) -> bool:
+        for client in self.clients.values():
+            await client.ping()
+        return True
+
+    async def close(self) -> None:
+        for client in self.clients.values():
+            await client.close()
@@ -0,0 +1,205 @@
+import fcntl
+import mmap
+import os
+import struct
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from auth.utils import codec
+
+MAGIC = b"TKC1"
+HEADER = struct.Struct("<4sHHII")  # magic, version, ways, slots, slot size
+VERSION = 2
+# invalidation counter, right after the layout header
+EPOCH = struct.Struct("<Q")
+EPOCH_OFFSET = HEADER.size
+HEADER_SIZE = 64
+# digest, expires_at (wall clock), value length; then a crc32 of it and the value
+SLOT_KEY = struct.Struct("<16sdH")
+SLOT_HEAD = struct.Struct("<16sdHI")
+CRC = struct.Struct("<I")
+SLOT_SIZE = 256
+VALUE_SIZE = SLOT_SIZE - SLOT_HEAD.size
+WAYS = 4
+STRIPES = 64
+EMPTY = bytes(SLOT_HEAD.size)
+
+
+def layout_path(path: str, slots: int) -> str:
+    """File for a ``slots`` sized table, one per layout under ``path``."""
+    buckets = max(1, slots // WAYS)
+    return f"{path}.v{VERSION}-{buckets * WAYS}x{SLOT_SIZE}"
+
+
+class SharedTokenCache:
+    """Verified tokens shared by every worker on the host.
+
+    A fixed-size, 4-way set-associative hash table in an mmap'd file
+    (``/dev/shm`` keeps it in RAM), keyed by the 16 byte token digest of
+    ``NearTokenCache``. Readers take no lock: every slot carries a CRC and
+    a slot caught mid-write fails it and counts as a miss. Writers hold a
+    ``fcntl`` byte-range lock on one of ``STRIPES`` stripes. Expired slots
+    are only reclaimed when a write needs the space.
+
+    ``delete`` and ``clear`` bump a host-wide epoch in the header. A writer
+    reads ``epoch()`` before it fetches a value and hands it to ``put``,
+    which drops the value if an invalidation happened in between. Otherwise
+    a worker that has not seen a revocation yet could store the record again
+    for the other workers to pick up.
+
+    The layout is part of the file name (``layout_path``), so workers of a
+    rolling deploy with another slot count or version map their own file
+    and never resize one under the others.
+    """
+
+    def __init__(self, path: str, slots: int = 65536):
+        self.path = layout_path(path, slots)
+        self.buckets = max(1, slots // WAYS)
+        self.slots = self.buckets * WAYS
+        self.size = HEADER_SIZE + self.slots * SLOT_SIZE
+        # lock bytes sit past the end of the table, nothing is stored there
+        self._lock_base = self.size
+
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self._locked(STRIPES, 1):
+            header = HEADER.pack(MAGIC, VERSION, WAYS, self.slots, SLOT_SIZE)
+            if os.fstat(self._fd).st_size == 0:
+                os.ftruncate(self._fd, self.size)
+                os.pwrite(self._fd, header, 0)
+            valid = (
+                os.fstat(self._fd).st_size == self.size
+                and os.pread(self._fd, HEADER.size, 0) == header
+            )
+        if not valid:
+            # maybe mapped by others, never truncate it under them
+            os.close(self._fd)
+            raise ValueError(f"{self.path} holds another cache layout")
+        self._mm = mmap.mmap(self._fd, self.size)
+
+        self.hits = 0
+        self.misses = 0
+        self.torn = 0
+        self.evictions = 0
+        self.oversized = 0
+        self.stale = 0
+
+    @contextmanager
+    def _locked(self, offset: int, length: int) -> Iterator[None]:
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, length, self._lock_base + offset)
+        try:
+            yield
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, length, self._lock_base + offset)
+
+    def epoch(self) -> int:
+        return EPOCH.unpack_from(self._mm, EPOCH_OFFSET)[0]
+
+    def _bump_epoch(self) -> None:
+        # callers hold the stripe lock, so a put of the same key waits for us
+        with self._locked(STRIPES + 1, 1):
+            EPOCH.pack_into(self._mm, EPOCH_OFFSET, self.epoch() + 1)
+
+    def _bucket(self, digest: bytes) -> int:
+        return int.from_bytes(digest[:8], "little") % self.buckets
+
+    def _offset(self, bucket: int) -> int:
+        return HEADER_SIZE + bucket * WAYS * SLOT_SIZE
+
+    def get(self, key: str) -> Optional[tuple[dict[str, object], float]]:
+        """Value and expiry (wall clock) for a ``token_digest``, else None."""
+        digest = bytes.fromhex(key)
+        base = self._offset(self._bucket(digest))
+        bucket = self._mm[base : base + WAYS * SLOT_SIZE]
+        for way in range(WAYS):
+            offset = way * SLOT_SIZE
+            if bucket[offset : offset + 16] != digest:
+                continue
+            _, expires_at, length, crc = SLOT_HEAD.unpack_from(bucket, offset)
+            if expires_at <= time.time():
+                break
+            start = offset + SLOT_HEAD.size
+            value = bucket[start : start + length]
+            if length > VALUE_SIZE or crc != zlib.crc32(
+                value, zlib.crc32(bucket[offset : offset + SLOT_KEY.size])
+            ):
+                self.torn += 1
+                break
+            self.hits += 1
+            return codec.loads(value), expires_at
+        self.misses += 1
+        return None
+
+    def put(
+        self,
+        key: str,
+        value: dict[str, object],
+        ttl: float,
+        epoch: Optional[int] = None,
+    ) -> bool:
+        """Store ``value``; False if the epoch moved on from ``epoch``."""
+        payload = codec.dumps(value)
+        if len(payload) > VALUE_SIZE:
+            # not shared, but not stale either
+            self.oversized += 1
+            return True
+
+        digest = bytes.fromhex(key)
+        now = time.time()
+        head = SLOT_KEY.pack(digest, now + ttl, len(payload))
+        slot = head + CRC.pack(zlib.crc32(payload, zlib.crc32(head))) + payload
+
+        bucket = self._bucket(digest)
+        base = self._offset(bucket)
+        with self._locked(bucket % STRIPES, 1):
+            if epoch is not None and epoch != self.epoch():
+                self.stale += 1
+                return False
+            victim, victim_expires = 0, float("inf")
+            for way in range(WAYS):
+                offset = base + way * SLOT_SIZE
+                found, expires_at, _, _ = SLOT_HEAD.unpack_from(self._mm, offset)
+                if found == digest or expires_at <= now:
+                    victim = way
+                    break
+                if expires_at < victim_expires:
+                    victim, victim_expires = way, expires_at
+            else:
+                self.evictions += 1
+            offset = base + victim * SLOT_SIZE
+            self._mm[offset : offset + len(slot)] = slot
+        return True
+
+    def delete(self, key: str) -> None:
+        digest = bytes.fromhex(key)
+        bucket = self._bucket(digest)
+        base = self._offset(bucket)
+        with self._locked(bucket % STRIPES, 1):
+            self._bump_epoch()
+            for way in range(WAYS):
+                offset = base + way * SLOT_SIZE
+                if self._mm[offset : offset + 16] == digest:
+                    self._mm[offset : offset + SLOT_HEAD.size] = EMPTY
+
+    def clear(self) -> None:
+        with self._locked(0, STRIPES):
+            self._bump_epoch()
+            self._mm[HEADER_SIZE:] = bytes(self.size - HEADER_SIZE)
+
+    def close(self) -> None:
+        self._mm.close()
+        os.close(self._fd)
+
+    def stats(self) -> dict[str, object]:
+        lookups = self.hits + self.misses
+        return {
+            "slots": self.slots,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "torn_reads": self.torn,
+            "evictions": self.evictions,
+            "oversized": self.oversized,
+            "stale_puts": self.stale,
+        }
@@ -0,0 +1,238 @@
+import asyncio
+import math
+import time
+from typing import TYPE_CHECKING, Optional, Protocol
+
+from loguru import logger
+from redis.asyncio import Redis
+from redis.asyncio.cluster import RedisCluster
+
+if TYPE_CHECKING:
+    RedisType = Redis[str]  # this is only processed by mypy
+else:
+    RedisType = Redis  # this is not seen by mypy but will be executed at runtime
+
+
+class TokenStore(Protocol):
+    """Session tokens with expiry, indexed by owner (the auth subject)."""
+
+    async def set(self, token: str, value: str, ttl: float, owner: str) -> None: ...
+
+    async def get(self, token: str) -> Optional[str]: ...
+
+    async def get_with_ttl(self, token: str) -> tuple[Optional[str], Optional[float]]:
+        """Value and remaining seconds, None for no expiry."""
+        ...
+
+    async def mget(self, tokens: list[str]) -> list[Optional[str]]: ...
+
+    async def delete(self, token: str) -> bool: ...
+
+    async def tokens_of(self, owner: str) -> list[str]:
+        """Live tokens of ``owner``."""
+        ...
+
+    async def delete_owner(self, owner: str) -> list[str]:
+        """Revoke every token of ``owner`` and return them."""
+        ...
+
+    async def close(self) -> None: ...
+
+
+class RedisTokenStore:
+    """Token as the key, value as the value; ``sessions:<owner>`` sets index them.
+
+    Index members are not removed when a token expires or is deleted, they
+    are pruned whenever the index is read.
+    """
+
+    def __init__(self, redis: RedisType):
+        self.redis = redis
+
+    @staticmethod
+    def _index(owner: str) -> str:
+        return f"sessions:{owner}"
+
+    async def _add_to_index(self, owner: str, token: str, ex: int) -> None:
+        index = self._index(owner)
+        await self.redis.sadd(index, token)
+        # tokens share one lifetime, the newest one expires last
+        await self.redis.expire(index, ex)
+
+    async def set(self, token: str, value: str, ttl: float, owner: str) -> None:
+        ex = max(1, math.ceil(ttl))
+        await asyncio.gather(
+            self.redis.set(name=token, value=value, ex=ex),
+            self._add_to_index(owner, token, ex),
+        )
+
+    async def get(self, token: str) -> Optional[str]:
+        return await self.redis.get(token)
+
+    async def get_with_ttl(self, token: str) -> tuple[Optional[str], Optional[float]]:
+        value, ttl_ms = await asyncio.gather(
+            self.redis.get(token), self.redis.pttl(token)
+        )
+        # -1 no expiry, -2 gone since the GET
+        return value, ttl_ms / 1000 if ttl_ms != -1 else None
+
+    async def mget(self, tokens: list[str]) -> list[Optional[str]]:
+        if not tokens:
+            return []
+        if isinstance(self.redis, RedisCluster):
+            # keys live in different hash slots, let the client split the MGET
+            return await self.redis.mget_nonatomic(tokens)
+        return await self.redis.mget(tokens)
+
+    async def delete(self, token: str) -> bool:
+        return bool(await self.redis.delete(token))
+
+    async def tokens_of(self, owner: str) -> list[str]:
+        index = self._index(owner)
+        members = list(await self.redis.smembers(index))
+        values = await self.mget(members)
+        dead = [token for token, value in zip(members, values) if value is None]
+        if dead:
+            await self.redis.srem(index, *dead)
+        return [token for token, value in zip(members, values) if value is not None]
+
+    async def delete_owner(self, owner: str) -> list[str]:
+        tokens = await self.tokens_of(owner)
+        await self.redis.delete(*tokens, self._index(owner))
+        return tokens
+
+    async def close(self) -> None:
+        # the connection belongs to the container
+        pass
+
+
+class InMemoryTokenStore:
+    """Process-local token store for single-node deployments and benchmarks.
+
+    Expiry is enforced on read; memory is reclaimed by a hashed timing
+    wheel. A token sits in the slot of its expiry tick and is dropped when
+    the sweeper reaches that slot, or kept for another turn if it expires
+    further out than one rotation. Each tick only touches the tokens due
+    then, never the whole table. Not shared between workers, so run a
+    single worker with it.
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 4096):
+        self.tick = tick
+        self.slots = slots
+        # token -> (value, owner, expires_at on the monotonic clock)
+        self._tokens: dict[str, tuple[str, str, float]] = {}
+        self._owners: dict[str, set[str]] = {}
+        self._wheel: list[list[str]] = [[] for _ in range(slots)]
+        self._swept = int(time.monotonic() / tick)
+        self._task: Optional[asyncio.Task[None]] = None
+        self.expired = 0
+
+    def _slot(self, expires_at: float) -> int:
+        return math.ceil(expires_at / self.tick) % self.slots
+
+    def _drop(self, token: str, owner: str) -> None:
+        del self._tokens[token]
+        tokens = self._owners.get(owner)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._owners[owner]
+
+    def _sweep_slot(self, slot: int, now: float) -> None:
+        keep = []
+        for token in self._wheel[slot]:
+            entry = self._tokens.get(token)
+            if entry is None:
+                continue
+            _, owner, expires_at = entry
+            if expires_at <= now:
+                self._drop(token, owner)
+                self.expired += 1
+            elif self._slot(expires_at) == slot:
+                keep.append(token)
+            # else set again since, it is scheduled in another slot
+        self._wheel[slot] = keep
+
+    def advance(self, now: Optional[float] = None) -> None:
+        """Sweep every slot due up to ``now``."""
+        now = time.monotonic() if now is None else now
+        target = int(now / self.tick)
+        # after a long stall one full rotation covers every slot
+        for tick in range(max(self._swept, target - self.slots) + 1, target + 1):
+            self._sweep_slot(tick % self.slots, now)
+        self._swept = max(self._swept, target)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                self.advance()
+            except Exception as e:
+                logger.error(f"Token expiry sweep failed: {e}")
+
+    def _live(self, token: str) -> Optional[tuple[str, str, float]]:
+        entry = self._tokens.get(token)
+        if entry is None or entry[2] <= time.monotonic():
+            return None
+        return entry
+
+    async def set(self, token: str, value: str, ttl: float, owner: str) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        expires_at = time.monotonic() + ttl
+        previous = self._tokens.get(token)
+        if previous is not None:
+            self._drop(token, previous[1])
+        self._tokens[token] = (value, owner, expires_at)
+        self._owners.setdefault(owner, set()).add(token)
+        self._wheel[self._slot(expires_at)].append(token)
+
+    async def get(self, token: str) -> Optional[str]:
+        entry = self._live(token)
+        return entry[0] if entry is not None else None
+
+    async def get_with_ttl(self, token: str) -> tuple[Optional[str], Optional[float]]:
+        entry = self._live(token)
+        if entry is None:
+            return None, None
+        return entry[0], entry[2] - time.monotonic()
+
+    async def mget(self, tokens: list[str]) -> list[Optional[str]]:
+        now = time.monotonic()
+        values: list[Optional[str]] = []
+        for token in tokens:
+            entry = self._tokens.get(token)
+            values.append(entry[0] if entry is not None and entry[2] > now else None)
+        return values
+
+    async def delete(self, token: str) -> bool:
+        entry = self._live(token)
+        if token in self._tokens:
+            self._drop(token, self._tokens[token][1])
+        return entry is not None
+
+    async def tokens_of(self, owner: str) -> list[str]:
+        return [
+            token
+            for token in self._owners.get(owner, ())
+            if self._live(token) is not None
+        ]
+
+    async def delete_owner(self, owner: str) -> list[str]:
+        tokens = await self.tokens_of(owner)
+        for token in list(self._owners.get(owner, ())):
+            self._drop(token, owner)
+        return tokens
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def __len__(self) -> int:
+        return len(self._tokens)
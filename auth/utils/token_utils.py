@@ -1,15 +1,13 @@
 import secrets
 import string
 from datetime import timedelta
-from typing import TYPE_CHECKING
+from typing import Optional
 
-from loguru import logger
-from redis.asyncio import Redis
-
-if TYPE_CHECKING:
-    RedisType = Redis[str]  # this is only processed by mypy
-else:
-    RedisType = Redis  # this is not seen by mypy but will be executed at runtime
+from auth.utils import codec
+from auth.utils.deadline import within_deadline
+from auth.utils.near_cache import NearTokenCache
+from auth.utils.token_store import TokenStore
+from auth.utils.tracing import span
 
 
 def generate_token(length: int = 32) -> str:
@@ -30,6 +28,19 @@ def generate_token(length: int = 32) -> str:
     return token
 
 
+def parse_bearer(authorization: Optional[str]) -> Optional[str]:
+    """Token from an ``Authorization: Bearer <token>`` header, else None."""
+    if not authorization:
+        return None
+
+    scheme, _, token = authorization.partition(" ")
+    token = token.strip()
+    if scheme.lower() != "bearer" or not token or " " in token:
+        return None
+
+    return token
+
+
 # async def set_token(db_instance, key, user_info: dict):
 #     logger.debug(f"key: {key}, data={user_info}")
 #     await db_instance.hset(key, mapping=user_info)
@@ -38,28 +49,108 @@ def generate_token(length: int = 32) -> str:
 #     return
 
 
+def session_record(value: str) -> dict[str, object]:
+    """Decode a stored session, a JSON record or a legacy bare user id.
+
+    Records carry the auth ``subject`` (``42``, ``merchant:42``,
+    ``client:<id>``), since user and merchant ids overlap; legacy values
+    have none.
+    """
+    if value.startswith("{"):
+        return codec.loads(value)
+    return {"user_id": value}
+
+
 async def set_token(
-    redis_instance: RedisType,
+    store: TokenStore,
     user_id: str,
     access_token: str,
     expires_delta: timedelta,
+    owner: Optional[str] = None,
+    claims: Optional[dict[str, object]] = None,
 ) -> None:
-    # Convert timedelta to seconds
-    expires = int(expires_delta.total_seconds())
-    # Store the token as the key and the user_id as the value
-    logger.info(f"user_id: {user_id}, access_token: {access_token}, expires: {expires}")
-    await redis_instance.set(name=access_token, value=str(user_id), ex=expires)
-
-
-async def get_token(redis_instance: RedisType, token: str) -> dict[str, object] | None:
-    # We're now searching for the token itself, not the user_id
-    user_id = await redis_instance.get(token)
-    logger.info(f"user_id: {user_id}")
-    if not user_id:
-        print(f"No user found for token: {token}")
+    """Store ``access_token`` -> session, indexed under ``owner``.
+
+    ``owner`` is the auth subject and is kept in the record as ``subject``;
+    without it and ``claims`` the value stays the bare user id, as before.
+    """
+    value = str(user_id)
+    if owner is not None or claims:
+        record: dict[str, object] = {"user_id": value}
+        if owner is not None:
+            record["subject"] = owner
+        value = codec.dumps_str({**record, **(claims or {})})
+    async with span("token_store.set"):
+        await within_deadline(
+            store.set(
+                access_token,
+                value,
+                expires_delta.total_seconds(),
+                owner or str(user_id),
+            ),
+            "token_store.set",
+        )
+
+
+async def get_token(
+    store: TokenStore, token: str, cache: Optional[NearTokenCache] = None
+) -> dict[str, object] | None:
+    if cache is not None:
+        cached = cache.get(token)
+        if cached is not None:
+            return cached
+
+        generation = cache.generation
+        # the TTL caps how long the entry may live in the near cache
+        async with span("token_store.get"):
+            value, ttl = await within_deadline(
+                store.get_with_ttl(token), "token_store.get"
+            )
+        if value:
+            token_info = session_record(value)
+            cache.put(token, token_info, ttl=ttl, generation=generation)
+            return token_info
+        return None
+
+    async with span("token_store.get"):
+        value = await within_deadline(store.get(token), "token_store.get")
+    if not value:
         return None
 
-    return {"user_id": user_id}
+    return session_record(value)
+
+
+async def delete_token(
+    store: TokenStore, token: str, cache: Optional[NearTokenCache] = None
+) -> bool:
+    """Revoke ``token`` and tell every worker to drop it from its near cache."""
+    async with span("token_store.delete"):
+        deleted = await within_deadline(store.delete(token), "token_store.delete")
+    if cache is not None:
+        await cache.invalidate(token)
+    return deleted
+
+
+async def revoke_sessions(
+    store: TokenStore, owner: str, cache: Optional[NearTokenCache] = None
+) -> int:
+    """Revoke every token of ``owner``, e.g. after a password change."""
+    async with span("token_store.delete_owner"):
+        tokens = await within_deadline(
+            store.delete_owner(owner), "token_store.delete_owner"
+        )
+    if cache is not None:
+        for token in tokens:
+            await cache.invalidate(token)
+    return len(tokens)
+
+
+async def get_tokens(
+    store: TokenStore, tokens: list[str]
+) -> list[Optional[dict[str, object]]]:
+    """Look up several tokens in one round trip per shard."""
+    values = await store.mget(tokens)
+    return [session_record(value) if value else None for value in values]
 
 
 if __name__ == "__main__":
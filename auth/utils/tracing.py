@@ -0,0 +1,433 @@
+import asyncio
+import contextvars
+import secrets
+import time
+from collections import deque
+from contextlib import nullcontext
+from types import SimpleNamespace, TracebackType
+from typing import Any, Optional, Protocol, Union
+
+import aiohttp
+from loguru import logger
+
+from auth.utils import codec
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+# OTLP span kinds
+_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+
+class Span:
+    __slots__ = (
+        "name",
+        "kind",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "attributes",
+        "start_ns",
+        "end_ns",
+        "error",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: Optional[str] = None,
+        kind: str = "internal",
+        attributes: Optional[dict[str, Any]] = None,
+    ):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = attributes or {}
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.error = False
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.error = True
+        self.attributes["exception.type"] = type(exc).__name__
+        self.attributes["exception.message"] = str(exc)
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[tuple[str, str]]:
+    """(trace_id, parent span_id) of a W3C ``traceparent`` header, else None."""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) < 4 or len(parts[0]) != 2 or parts[0] == "ff":
+        return None
+    trace_id, span_id = parts[1].lower(), parts[2].lower()
+    if len(trace_id) != 32 or len(span_id) != 16:
+        return None
+    try:
+        if int(trace_id, 16) == 0 or int(span_id, 16) == 0:
+            return None
+    except ValueError:
+        return None
+    return trace_id, span_id
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def set_current_span(span: Span) -> "contextvars.Token[Optional[Span]]":
+    return _current_span.set(span)
+
+
+def reset_current_span(token: "contextvars.Token[Optional[Span]]") -> None:
+    _current_span.reset(token)
+
+
+class SpanExporter(Protocol):
+    async def export(self, spans: list[Span]) -> None: ...
+
+    async def close(self) -> None: ...
+
+
+class ConsoleSpanExporter:
+    async def export(self, spans: list[Span]) -> None:
+        for span in spans:
+            logger.info(
+                f"span {span.name} {span.duration_ms:.2f}ms trace={span.trace_id} "
+                f"span={span.span_id} parent={span.parent_id} "
+                f"{'error ' if span.error else ''}{span.attributes}"
+            )
+
+    async def close(self) -> None:
+        pass
+
+
+class FileSpanExporter:
+    """One JSON object per span and line, appended to ``path``."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _write(self, lines: bytes) -> None:
+        with open(self.path, "ab") as f:
+            f.write(lines)
+
+    async def export(self, spans: list[Span]) -> None:
+        lines = b"".join(codec.dumps(span.to_dict()) + b"\n" for span in spans)
+        await asyncio.to_thread(self._write, lines)
+
+    async def close(self) -> None:
+        pass
+
+
+def _otlp_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OtlpJsonSpanExporter:
+    """Posts batches to an OTLP/HTTP collector using the JSON encoding."""
+
+    def __init__(self, endpoint: str, service_name: str):
+        self.url = f"{endpoint.rstrip('/')}/v1/traces"
+        self.service_name = service_name
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _payload(self, spans: list[Span]) -> dict[str, Any]:
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {
+                                "key": "service.name",
+                                "value": {"stringValue": self.service_name},
+                            }
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "auth.utils.tracing"},
+                            "spans": [
+                                {
+                                    "traceId": span.trace_id,
+                                    "spanId": span.span_id,
+                                    "parentSpanId": span.parent_id or "",
+                                    "name": span.name,
+                                    "kind": _KINDS[span.kind],
+                                    "startTimeUnixNano": str(span.start_ns),
+                                    "endTimeUnixNano": str(span.end_ns),
+                                    "attributes": [
+                                        {"key": key, "value": _otlp_value(value)}
+                                        for key, value in span.attributes.items()
+                                    ],
+                                    # 1 ok, 2 error
+                                    "status": {"code": 2 if span.error else 1},
+                                }
+                                for span in spans
+                            ],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    async def export(self, spans: list[Span]) -> None:
+        if self._session is None:
+            # no trace config on this session, exporting must not trace itself
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=10)
+            )
+        async with self._session.post(
+            self.url,
+            data=codec.dumps(self._payload(spans)),
+            headers={"Content-Type": "application/json"},
+        ) as resp:
+            if resp.status >= 400:
+                logger.warning(f"OTLP export rejected with {resp.status}")
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+
+class BatchSpanProcessor:
+    """Buffers finished spans and exports them in batches off the request path.
+
+    Flushes every ``interval`` seconds or as soon as ``max_batch`` spans are
+    waiting. When the exporter falls behind the buffer keeps the newest
+    ``max_queue`` spans and counts the rest as dropped.
+    """
+
+    def __init__(
+        self,
+        exporter: SpanExporter,
+        max_batch: int = 512,
+        interval: float = 2.0,
+        max_queue: int = 8192,
+    ):
+        self.exporter = exporter
+        self.max_batch = max_batch
+        self.interval = interval
+        self._queue: deque[Span] = deque(maxlen=max_queue)
+        self._full = asyncio.Event()
+        self._task: Optional[asyncio.Task[None]] = None
+        self.dropped = 0
+
+    def on_end(self, span: Span) -> None:
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1
+        self._queue.append(span)
+        if len(self._queue) >= self.max_batch:
+            self._full.set()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        await self.exporter.close()
+
+    async def flush(self) -> None:
+        while self._queue:
+            batch = [
+                self._queue.popleft()
+                for _ in range(min(self.max_batch, len(self._queue)))
+            ]
+            try:
+                await self.exporter.export(batch)
+            except Exception as e:
+                logger.warning(f"Dropped {len(batch)} spans, export failed: {e!r}")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self.flush()
+
+
+class Tracer:
+    def __init__(self) -> None:
+        self.processor: Optional[BatchSpanProcessor] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.processor is not None
+
+    def start_span(
+        self,
+        name: str,
+        kind: str = "internal",
+        attributes: Optional[dict[str, Any]] = None,
+        parent: Optional[tuple[str, str]] = None,
+    ) -> Span:
+        """Child of ``parent`` (trace_id, span_id), else of the current span."""
+        if parent is None:
+            current = _current_span.get()
+            if current is not None:
+                parent = (current.trace_id, current.span_id)
+        if parent is None:
+            return Span(name, secrets.token_hex(16), None, kind, attributes)
+        return Span(name, parent[0], parent[1], kind, attributes)
+
+    def end_span(self, span: Span) -> None:
+        span.end_ns = time.time_ns()
+        if self.processor is not None:
+            self.processor.on_end(span)
+
+
+tracer = Tracer()
+
+
+class _SpanScope:
+    """Makes a span current for a ``with`` or ``async with`` block."""
+
+    __slots__ = ("name", "attributes", "span", "token")
+
+    def __init__(self, name: str, attributes: dict[str, Any]):
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self) -> Span:
+        self.span = tracer.start_span(self.name, attributes=self.attributes)
+        self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        if exc is not None:
+            self.span.record_exception(exc)
+        _current_span.reset(self.token)
+        tracer.end_span(self.span)
+
+    async def __aenter__(self) -> Span:
+        return self.__enter__()
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        self.__exit__(exc_type, exc, tb)
+
+
+_NOOP: "nullcontext[None]" = nullcontext()
+
+
+def span(name: str, **attributes: Any) -> Union[_SpanScope, "nullcontext[None]"]:
+    """Trace a block: ``with span("bcrypt.checkpw"):`` or ``async with``.
+
+    Costs one attribute check while tracing is off.
+    """
+    if tracer.processor is None:
+        return _NOOP
+    return _SpanScope(name, attributes)
+
+
+def create_exporter(
+    name: str, file_path: str, otlp_endpoint: str, service_name: str
+) -> SpanExporter:
+    if name == "console":
+        return ConsoleSpanExporter()
+    if name == "file":
+        return FileSpanExporter(file_path)
+    if name == "otlp":
+        return OtlpJsonSpanExporter(otlp_endpoint, service_name)
+    raise ValueError(f"Unknown tracing exporter {name!r}")
+
+
+def client_trace_config() -> aiohttp.TraceConfig:
+    """aiohttp hooks: a client span per request and a ``traceparent`` header."""
+
+    async def on_request_start(
+        session: aiohttp.ClientSession,
+        ctx: SimpleNamespace,
+        params: aiohttp.TraceRequestStartParams,
+    ) -> None:
+        if not tracer.enabled:
+            return
+        # the query can carry usernames, keep it out of the span
+        url = params.url.with_query(None)
+        ctx.span = tracer.start_span(
+            f"HTTP {params.method} {url.path}",
+            kind="client",
+            attributes={"http.method": params.method, "http.url": str(url)},
+        )
+        params.headers["traceparent"] = ctx.span.traceparent()
+
+    async def on_request_end(
+        session: aiohttp.ClientSession,
+        ctx: SimpleNamespace,
+        params: aiohttp.TraceRequestEndParams,
+    ) -> None:
+        client_span = getattr(ctx, "span", None)
+        if client_span is None:
+            return
+        client_span.set_attribute("http.status_code", params.response.status)
+        client_span.error = params.response.status >= 500
+        tracer.end_span(client_span)
+
+    async def on_request_exception(
+        session: aiohttp.ClientSession,
+        ctx: SimpleNamespace,
+        params: aiohttp.TraceRequestExceptionParams,
+    ) -> None:
+        client_span = getattr(ctx, "span", None)
+        if client_span is None:
+            return
+        client_span.record_exception(params.exception)
+        tracer.end_span(client_span)
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_exception)
+    return trace_config
@@ -0,0 +1,40 @@
+import asyncio
+from contextlib import AsyncExitStack
+from typing import Any
+
+import aiohttp
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+async def warm_engine(engine: AsyncEngine, connections: int) -> int:
+    """Open up to ``connections`` DB connections at once, then pool them."""
+    pool_size = getattr(engine.pool, "size", None)
+    if callable(pool_size):
+        # anything past pool_size is overflow and closed again on release
+        connections = min(connections, pool_size())
+
+    async with AsyncExitStack() as stack:
+        for _ in range(connections):
+            conn = await stack.enter_async_context(engine.connect())
+            await conn.execute(text("SELECT 1"))
+    return connections
+
+
+async def warm_redis(redis: Any, connections: int) -> int:
+    # concurrent commands each check out their own pooled connection
+    await asyncio.gather(*(redis.ping() for _ in range(connections)))
+    return connections
+
+
+async def warm_http(session: aiohttp.ClientSession, url: str, connections: int) -> int:
+    """Open keepalive connections to ``url``; any HTTP response counts."""
+
+    async def touch() -> None:
+        async with session.get(url) as resp:
+            await resp.read()
+
+    results = await asyncio.gather(
+        *(touch() for _ in range(connections)), return_exceptions=True
+    )
+    return sum(1 for result in results if not isinstance(result, BaseException))
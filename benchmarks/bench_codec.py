@@ -0,0 +1,74 @@
+"""Per-request CPU cost of decoding user-service payloads and encoding responses.
+
+Compares the previous path (``json`` + full ``UserGetInfo`` validation,
+``JSONResponse``) with the orjson-based codec layer.
+
+    python -m benchmarks.bench_codec
+"""
+
+import json
+import time
+from typing import Callable
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from auth.clients.user_client import AUTH_USER_FIELDS, UserGetInfo
+from auth.utils import codec
+
+ITERATIONS = 200_000
+
+USER_PAYLOAD = json.dumps(
+    {
+        "id": 4711,
+        "username": "jane.doe@example.com",
+        "is_active": True,
+        "full_name": "Jane Doe",
+        "phone_number": "9876543210",
+    }
+).encode("utf-8")
+
+TOKEN_RESPONSE = {
+    "access_token": "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9." + "x" * 180,
+    "token_type": "bearer",
+}
+
+
+def decode_full() -> object:
+    return UserGetInfo(**json.loads(USER_PAYLOAD)).id
+
+
+def decode_light() -> object:
+    fields = codec.pick(USER_PAYLOAD, AUTH_USER_FIELDS)
+    return fields["id"] if fields else None
+
+
+def encode_default() -> object:
+    return JSONResponse(TOKEN_RESPONSE).body
+
+
+def encode_orjson() -> object:
+    return ORJSONResponse(TOKEN_RESPONSE).body
+
+
+def cpu_per_call(func: Callable[[], object], iterations: int = ITERATIONS) -> float:
+    for _ in range(1_000):
+        func()
+
+    start = time.process_time()
+    for _ in range(iterations):
+        func()
+    return (time.process_time() - start) / iterations
+
+
+def report(label: str, before: Callable[[], object], after: Callable[[], object]) -> None:
+    before_us = cpu_per_call(before) * 1e6
+    after_us = cpu_per_call(after) * 1e6
+    print(
+        f"{label:<18} before {before_us:7.2f} us  after {after_us:7.2f} us  "
+        f"speedup {before_us / after_us:5.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    report("user decode", decode_full, decode_light)
+    report("response encode", encode_default, encode_orjson)
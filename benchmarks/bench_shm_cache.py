@@ -0,0 +1,127 @@
+"""Hit rate and lookup latency of per-worker vs host-wide verified-token caching.
+
+Eight worker processes serve ``/token/verify`` lookups for a shared,
+Zipf-distributed token population, each request landing on a random
+worker like behind a load balancer. Every worker runs ``NearTokenCache``;
+in the second run it is backed by one ``SharedTokenCache`` in /dev/shm.
+A miss stands for a Redis round trip of ``REDIS_RTT_US``, which is added
+to the measured cache cost to estimate the per-request latency. On hosts
+with fewer cores than workers the p99 includes preemption.
+
+    python -m benchmarks.bench_shm_cache
+"""
+
+import itertools
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from typing import Any, Optional
+
+from auth.utils.near_cache import NearTokenCache
+from auth.utils.shm_cache import SharedTokenCache, layout_path
+
+WORKERS = 8
+TOKENS = 200_000
+REQUESTS_PER_WORKER = 100_000
+LOCAL_ENTRIES = 10_000
+SHARED_SLOTS = 131_072
+ZIPF_S = 1.1
+REDIS_RTT_US = 250.0
+
+
+def shm_path() -> str:
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, f"bench-token-cache-{os.getpid()}")
+
+
+def worker(
+    seed: int,
+    path: Optional[str],
+    barrier: Any,
+    results: "multiprocessing.Queue[dict[str, Any]]",
+) -> None:
+    shared = SharedTokenCache(path, SHARED_SLOTS) if path else None
+    cache = NearTokenCache(
+        None, max_entries=LOCAL_ENTRIES, shared=shared  # type: ignore[arg-type]
+    )
+    # no Redis here: pretend the invalidation channel is up
+    cache._subscribed.set()
+
+    rng = random.Random(seed)
+    weights = list(
+        itertools.accumulate(1 / rank**ZIPF_S for rank in range(1, TOKENS + 1))
+    )
+    tokens = [f"token-{rank:08d}" for rank in range(TOKENS)]
+    requests = rng.choices(tokens, cum_weights=weights, k=REQUESTS_PER_WORKER)
+
+    barrier.wait()
+    hits: list[int] = []
+    misses: list[int] = []
+    for token in requests:
+        start = time.perf_counter_ns()
+        value = cache.get(token)
+        if value is None:
+            # the Redis answer is cached the way get_token does it
+            cache.put(token, {"user_id": token[-5:]}, ttl=1800)
+            misses.append(time.perf_counter_ns() - start)
+        else:
+            hits.append(time.perf_counter_ns() - start)
+
+    if shared is not None:
+        shared.close()
+    results.put({"hits": hits, "misses": misses})
+
+
+def percentiles(latencies_ns: list[int]) -> tuple[float, float]:
+    ordered = sorted(latencies_ns)
+    return ordered[len(ordered) // 2] / 1000, ordered[int(len(ordered) * 0.99)] / 1000
+
+
+def run(path: Optional[str]) -> None:
+    ctx = multiprocessing.get_context("fork")
+    barrier = ctx.Barrier(WORKERS)
+    results: "multiprocessing.Queue[dict[str, Any]]" = ctx.Queue()
+    processes = [
+        ctx.Process(target=worker, args=(seed, path, barrier, results))
+        for seed in range(WORKERS)
+    ]
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    hits = [latency for outcome in outcomes for latency in outcome["hits"]]
+    misses = [latency for outcome in outcomes for latency in outcome["misses"]]
+    hit_ratio = len(hits) / (len(hits) + len(misses))
+    hit_p50, hit_p99 = percentiles(hits)
+    miss_p50, miss_p99 = percentiles(misses)
+    verify_us = hit_ratio * hit_p50 + (1 - hit_ratio) * (miss_p50 + REDIS_RTT_US)
+
+    label = "per-worker + shared" if path else "per-worker only"
+    print(
+        f"{label:<20} hit ratio {hit_ratio:6.2%}  "
+        f"hit p50/p99 {hit_p50:5.2f}/{hit_p99:6.2f} us  "
+        f"miss p50/p99 {miss_p50:5.2f}/{miss_p99:6.2f} us  "
+        f"est. verify {verify_us:6.1f} us"
+    )
+
+
+def main() -> None:
+    print(
+        f"{WORKERS} workers, {TOKENS} tokens (zipf s={ZIPF_S}), "
+        f"{REQUESTS_PER_WORKER} requests each, {LOCAL_ENTRIES} local entries, "
+        f"{SHARED_SLOTS} shared slots, miss = {REDIS_RTT_US:.0f} us Redis RTT"
+    )
+    run(None)
+    path = shm_path()
+    try:
+        run(path)
+    finally:
+        os.unlink(layout_path(path, SHARED_SLOTS))
+
+
+if __name__ == "__main__":
+    main()
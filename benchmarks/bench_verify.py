@@ -0,0 +1,89 @@
+"""Per-request cost of ``POST /token/verify`` through FastAPI vs the ASGI fast path.
+
+Both apps are driven directly over ASGI (no server, no sockets) against the
+in-memory token store, so the numbers are framework overhead only.
+
+    python -m benchmarks.bench_verify
+"""
+
+import asyncio
+import os
+import time
+from types import SimpleNamespace
+from typing import Any
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+
+import views  # noqa: E402
+from auth.utils.token_store import InMemoryTokenStore  # noqa: E402
+
+ITERATIONS = 20_000
+TOKEN = "x" * 43
+
+
+def make_scope(authorization: bytes) -> dict[str, Any]:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/token/verify",
+        "raw_path": b"/token/verify",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench"), (b"authorization", authorization)],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000),
+    }
+
+
+async def call(app: Any, scope: dict[str, Any]) -> int:
+    status = 0
+
+    async def receive() -> dict[str, Any]:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: dict[str, Any]) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def per_request(app: Any, authorization: bytes, expected: int) -> float:
+    scope = make_scope(authorization)
+    for _ in range(500):
+        assert await call(app, dict(scope)) == expected
+
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        await call(app, dict(scope))
+    return (time.perf_counter() - start) / ITERATIONS
+
+
+async def main() -> None:
+    token_store = InMemoryTokenStore()
+    await token_store.set(TOKEN, "4711", 3600, "4711")
+    views.app.state.container = SimpleNamespace(
+        token_store=token_store, token_cache=None
+    )
+
+    cases = [
+        ("valid token", b"Bearer " + TOKEN.encode(), 200),
+        ("unknown token", b"Bearer " + b"y" * 43, 401),
+        ("malformed header", TOKEN.encode(), 401),
+    ]
+    for label, authorization, expected in cases:
+        before_us = await per_request(views.app, authorization, expected) * 1e6
+        after_us = await per_request(views.asgi_app, authorization, expected) * 1e6
+        print(
+            f"{label:<18} fastapi {before_us:7.2f} us  fast path {after_us:7.2f} us  "
+            f"speedup {before_us / after_us:5.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
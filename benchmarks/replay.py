@@ -0,0 +1,511 @@
+"""Replays traffic recorded by ``TrafficCaptureMiddleware`` against a local app.
+
+Record with ``CAPTURE_DIR`` set on the service, then replay the files::
+
+    python -m benchmarks.replay /var/tmp/capture/traffic-*.jsonl.gz --speed 4
+
+``views.asgi_app`` runs in this process and is driven over ASGI. Its
+dependencies are local stand-ins: a SQLite file, an aiohttp user service
+answering after ``--user-latency-ms``, the in-memory token store and a
+small in-process Redis (or a real one with ``--redis-url``). Requests are
+sent open loop at their captured offsets divided by ``--speed``, so a slow
+endpoint piles up in flight as it would in production.
+
+Hashed identities become synthetic users, seeded before the clock starts
+unless the capture saw them sign up. A token is the one its captured
+signin issued during the replay, or one minted up front if it was issued
+before the capture began. Routes with path parameters are not replayed.
+The report gives per-endpoint latency next to the captured latency and
+how often the replayed status matched the captured one.
+"""
+
+import argparse
+import asyncio
+import gzip
+import os
+import secrets
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import timedelta
+from typing import Any, Optional
+
+import jwt
+from aiohttp import web
+
+from auth.utils import codec
+
+PASSWORD = "replay-password"
+WRONG_PASSWORD = "not-the-replay-password"
+CLIENT_SECRET = "replay-client-secret"
+ADMIN_TOKEN = "replay-admin-token"
+
+
+def load(paths: list[str]) -> list[dict[str, Any]]:
+    records = []
+    for path in paths:
+        with gzip.open(path, "rb") as f:
+            records.extend(codec.loads(line) for line in f if line.strip())
+    records.sort(key=lambda record: record["t"])
+    return records
+
+
+def percentile(values: list[float], q: float) -> float:
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def kind_of(path: str) -> str:
+    return "merchant" if path.startswith("/merchant/") else "user"
+
+
+def username(identity: str) -> str:
+    return f"u{identity}@replay.example.com"
+
+
+def signup_payload(identity: str) -> dict[str, str]:
+    return {
+        "username": username(identity),
+        "password": PASSWORD,
+        "full_name": "Replay User",
+        "phone_number": "5550000000",
+    }
+
+
+class LocalRedis:
+    """In-process stand-in for the few Redis commands outside the token store."""
+
+    def __init__(self) -> None:
+        self._data: dict[str, tuple[str, Optional[float]]] = {}
+
+    def _live(self, key: str) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._live(key)
+
+    async def set(
+        self,
+        key: str,
+        value: str,
+        nx: bool = False,
+        ex: Optional[float] = None,
+        px: Optional[float] = None,
+    ) -> Optional[bool]:
+        if nx and self._live(key) is not None:
+            return None
+        ttl = ex if ex is not None else (px / 1000 if px is not None else None)
+        self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        return sum(self._data.pop(key, None) is not None for key in keys)
+
+    async def exists(self, *keys: str) -> int:
+        return sum(self._live(key) is not None for key in keys)
+
+    async def eval(self, script: str, numkeys: int, *keys_and_args: str) -> int:
+        """The owner-checked idempotency scripts, run in Python."""
+        from auth.services.idempotency_service import COMPLETE_SCRIPT, RELEASE_SCRIPT
+
+        key, owner = keys_and_args[0], keys_and_args[1]
+        raw = self._live(key)
+        ours = raw is None or codec.loads(raw).get("owner") == owner
+        if script == RELEASE_SCRIPT:
+            return await self.delete(key) if raw is not None and ours else 0
+        if script == COMPLETE_SCRIPT:
+            if not ours:
+                return 0
+            await self.set(key, keys_and_args[2], ex=float(keys_and_args[3]))
+            return 1
+        raise NotImplementedError("LocalRedis only runs the idempotency scripts")
+
+    async def ping(self) -> bool:
+        return True
+
+    async def close(self) -> None:
+        pass
+
+
+class UserServiceStandIn:
+    """Users and merchants in memory, every answer after ``latency`` seconds."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.identities: dict[str, dict[str, dict[str, object]]] = defaultdict(dict)
+        self.runner: Optional[web.AppRunner] = None
+
+    async def _get(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self.latency)
+        identities = self.identities[kind_of(request.path)]
+        identity = identities.get(request.query.get("username", ""))
+        if identity is None:
+            return web.json_response({}, status=404)
+        return web.json_response(identity, dumps=codec.dumps_str)
+
+    async def _create(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self.latency)
+        payload = await request.json(loads=codec.loads)
+        identities = self.identities[kind_of(request.path)]
+        if payload["username"] in identities:
+            return web.json_response({"detail": "exists"}, status=409)
+        identity = {**payload, "id": len(identities) + 1, "is_active": True}
+        identities[payload["username"]] = identity
+        return web.json_response(identity, dumps=codec.dumps_str)
+
+    async def _health(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok"})
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_get("/get_user", self._get)
+        app.router.add_get("/merchant/get_merchant", self._get)
+        for prefix in ("", "/merchant"):
+            app.router.add_post(f"{prefix}/create", self._create)
+            app.router.add_get(f"{prefix}/health", self._health)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self.runner.addresses[0][:2]
+        return f"http://{host}:{port}"
+
+    async def stop(self) -> None:
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+
+async def call(
+    app: Any,
+    method: str,
+    path: str,
+    headers: list[tuple[bytes, bytes]],
+    body: bytes = b"",
+) -> tuple[int, bytes]:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode("latin-1"),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"replay"), *headers],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000),
+    }
+    status = 0
+    chunks: list[bytes] = []
+    done = asyncio.Event()
+    sent = False
+
+    async def receive() -> dict[str, Any]:
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: dict[str, Any]) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                done.set()
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        done.set()
+    return status, b"".join(chunks)
+
+
+class Replay:
+    def __init__(self, app: Any, records: list[dict[str, Any]], speed: float):
+        self.app = app
+        self.records = records
+        self.speed = speed
+        # captured token hash -> token, resolved once its signin answers
+        self.tokens: dict[str, "asyncio.Future[Optional[str]]"] = {}
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.matched: dict[str, int] = defaultdict(int)
+        self.server_errors: dict[str, int] = defaultdict(int)
+        self.skipped: dict[str, int] = defaultdict(int)
+        self.max_lag_ms = 0.0
+
+    def replayable(self, record: dict[str, Any]) -> bool:
+        return record["p"] != "*" and "{" not in record["p"]
+
+    def request(
+        self, record: dict[str, Any], token: Optional[str]
+    ) -> tuple[list[tuple[bytes, bytes]], bytes]:
+        path, identity, ok = record["p"], record.get("id"), record["s"] < 400
+        headers: list[tuple[bytes, bytes]] = []
+        body = b""
+        if token is not None:
+            headers.append((b"authorization", f"Bearer {token}".encode()))
+        if "idem" in record:
+            headers.append((b"idempotency-key", record["idem"].encode()))
+        if "dl" in record:
+            headers.append((b"x-request-timeout-ms", record["dl"].encode()))
+        if path.startswith("/admin/"):
+            headers.append((b"x-admin-token", ADMIN_TOKEN.encode()))
+
+        if path.endswith("/oauth/token") and identity:
+            secret = CLIENT_SECRET if ok else WRONG_PASSWORD
+            headers.append((b"content-type", b"application/x-www-form-urlencoded"))
+            body = (
+                f"grant_type=client_credentials&client_id={identity}"
+                f"&client_secret={secret}"
+            ).encode()
+        elif path.endswith("/signup") and identity:
+            headers.append((b"content-type", b"application/json"))
+            body = codec.dumps(signup_payload(identity))
+        elif path.endswith("/signin") and identity:
+            # a captured failure was most likely a wrong password
+            payload = {
+                "username": username(identity),
+                "password": PASSWORD if ok else WRONG_PASSWORD,
+            }
+            headers.append((b"content-type", b"application/json"))
+            body = codec.dumps(payload)
+        return headers, body
+
+    async def fire(self, record: dict[str, Any], due: float) -> None:
+        loop = asyncio.get_running_loop()
+        self.max_lag_ms = max(self.max_lag_ms, (loop.time() - due) * 1000)
+
+        token = None
+        if "tok" in record:
+            # a client only sends its token after the signin answered
+            issued = self.tokens.get(record["tok"])
+            token = await issued if issued is not None else None
+            # never issued here, e.g. its signin failed: an unknown token
+            token = token or secrets.token_urlsafe(32)
+        headers, body = self.request(record, token)
+
+        endpoint = f"{record['m']} {record['p']}"
+        start = time.perf_counter()
+        status, response = await call(self.app, record["m"], record["p"], headers, body)
+        self.latencies[endpoint].append((time.perf_counter() - start) * 1000)
+        self.matched[endpoint] += status == record["s"]
+        self.server_errors[endpoint] += status >= 500
+
+        issued = self.tokens.get(record.get("iss", ""))
+        if issued is not None and not issued.done():
+            access_token = None
+            if status == 200:
+                access_token = codec.loads(response).get("access_token")
+            issued.set_result(access_token)
+
+    async def seed(self, token_store: Any) -> None:
+        """Identities and tokens that existed before the capture began."""
+        from auth.services.oauth_password_auth_service import ALGORITHM, SECRET_KEY
+        from auth.utils.token_utils import set_token
+
+        first_seen: dict[tuple[str, str], dict[str, Any]] = {}
+        for record in self.records:
+            if "id" in record and record["p"].endswith(("/signin", "/signup")):
+                first_seen.setdefault((kind_of(record["p"]), record["id"]), record)
+        limit = asyncio.Semaphore(8)
+
+        async def signup(kind: str, identity: str) -> None:
+            path = "/merchant/signup" if kind == "merchant" else "/signup"
+            headers = [(b"content-type", b"application/json")]
+            body = codec.dumps(signup_payload(identity))
+            async with limit:
+                status, _ = await call(self.app, "POST", path, headers, body)
+            if status >= 400:
+                print(f"seeding {kind} {identity} failed: {status}", file=sys.stderr)
+
+        await asyncio.gather(
+            *(
+                signup(kind, identity)
+                for (kind, identity), record in first_seen.items()
+                # signed up during the capture, the replay creates it itself
+                if not (record["p"].endswith("/signup") and record["s"] < 400)
+            )
+        )
+
+        issued = {record["iss"] for record in self.records if "iss" in record}
+        # accepted at least once, so a token that was valid when captured
+        valid = {
+            record["tok"]
+            for record in self.records
+            if "tok" in record and record["s"] < 400
+        }
+        loop = asyncio.get_running_loop()
+        for user_id, token_hash in enumerate(sorted(valid - issued), start=1_000_000):
+            token = jwt.encode(
+                {
+                    "user_id": user_id,
+                    "role": ["user"],
+                    "exp": int(time.time()) + 3600,
+                    "jti": secrets.token_hex(8),
+                },
+                SECRET_KEY,
+                algorithm=ALGORITHM,
+            )
+            await set_token(
+                token_store, user_id, token, timedelta(hours=1), owner=str(user_id)
+            )
+            self.tokens[token_hash] = loop.create_future()
+            self.tokens[token_hash].set_result(token)
+
+    async def run(self) -> float:
+        loop = asyncio.get_running_loop()
+        tasks = set()
+        first = self.records[0]["t"]
+        start = loop.time()
+        for record in self.records:
+            if not self.replayable(record):
+                self.skipped[f"{record['m']} {record['p']}"] += 1
+                continue
+            if "iss" in record and record["iss"] not in self.tokens:
+                self.tokens[record["iss"]] = loop.create_future()
+
+            due = start + (record["t"] - first) / self.speed
+            delay = due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.create_task(self.fire(record, due))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        await asyncio.gather(*tasks)
+        return loop.time() - start
+
+    def report(self, elapsed: float) -> dict[str, Any]:
+        captured: dict[str, list[float]] = defaultdict(list)
+        for record in self.records:
+            captured[f"{record['m']} {record['p']}"].append(record["d"])
+
+        endpoints = {}
+        for endpoint, latencies in sorted(self.latencies.items()):
+            latencies.sort()
+            before = sorted(captured[endpoint])
+            endpoints[endpoint] = {
+                "requests": len(latencies),
+                "status_match": round(self.matched[endpoint] / len(latencies), 4),
+                "server_errors": self.server_errors[endpoint],
+                "p50_ms": round(percentile(latencies, 0.5), 3),
+                "p90_ms": round(percentile(latencies, 0.9), 3),
+                "p99_ms": round(percentile(latencies, 0.99), 3),
+                "max_ms": round(latencies[-1], 3),
+                "captured_p50_ms": round(percentile(before, 0.5), 3),
+                "captured_p99_ms": round(percentile(before, 0.99), 3),
+            }
+        replayed = sum(len(latencies) for latencies in self.latencies.values())
+        return {
+            "speed": self.speed,
+            "captured_seconds": round(self.records[-1]["t"] - self.records[0]["t"], 3),
+            "replay_seconds": round(elapsed, 3),
+            "requests": replayed,
+            "requests_per_second": round(replayed / elapsed, 1) if elapsed else 0.0,
+            # how far the driver fell behind the schedule, high means it is
+            # the bottleneck and the rate is lower than asked for
+            "max_schedule_lag_ms": round(self.max_lag_ms, 3),
+            "skipped": dict(self.skipped),
+            "endpoints": endpoints,
+        }
+
+
+def print_report(report: dict[str, Any]) -> None:
+    print(
+        f"{report['requests']} requests in {report['replay_seconds']}s "
+        f"({report['requests_per_second']}/s) at {report['speed']}x, captured over "
+        f"{report['captured_seconds']}s; max schedule lag "
+        f"{report['max_schedule_lag_ms']} ms"
+    )
+    print(
+        f"{'endpoint':<28} {'n':>7} {'match':>6} {'5xx':>5} {'p50':>8} {'p90':>8} "
+        f"{'p99':>8} {'max':>8} | {'cap p50':>8} {'cap p99':>8}"
+    )
+    for endpoint, row in report["endpoints"].items():
+        print(
+            f"{endpoint:<28} {row['requests']:>7} {row['status_match']:>6.0%} "
+            f"{row['server_errors']:>5} {row['p50_ms']:>8.2f} {row['p90_ms']:>8.2f} "
+            f"{row['p99_ms']:>8.2f} {row['max_ms']:>8.2f} | "
+            f"{row['captured_p50_ms']:>8.2f} {row['captured_p99_ms']:>8.2f}"
+        )
+    for endpoint, count in report["skipped"].items():
+        print(f"skipped {count} x {endpoint}, not replayable")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("captures", nargs="+", help="traffic-*.jsonl.gz files")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 = as captured")
+    parser.add_argument("--user-latency-ms", type=float, default=2.0)
+    parser.add_argument("--redis-url", help="a real Redis instead of the stand-in")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    records = load(args.captures)
+    if not records:
+        sys.exit("no records in the capture")
+
+    users = UserServiceStandIn(args.user_latency_ms / 1000)
+    workdir = tempfile.mkdtemp(prefix="auth-replay-")
+    os.environ.update(
+        {
+            "USER_SERVICE_URL": await users.start(),
+            "DATABASE_URL": f"sqlite+aiosqlite:///{workdir}/auth.db",
+            "ADMIN_TOKEN": ADMIN_TOKEN,
+        }
+    )
+    os.environ.pop("CAPTURE_DIR", None)
+    if args.redis_url:
+        os.environ["REDIS_URL"] = args.redis_url
+        os.environ.setdefault("TOKEN_STORE", "redis")
+    else:
+        os.environ["TOKEN_STORE"] = "memory"
+
+    # the app reads its settings at import, so only now
+    import views
+    from auth.services.client_credentials_service import hash_client_secret
+
+    if not args.redis_url:
+        views.create_redis = LocalRedis  # type: ignore[assignment]
+    clients = {
+        record["id"]
+        for record in records
+        if record["p"].endswith("/oauth/token") and "id" in record
+    }
+    os.environ["OAUTH_CLIENTS"] = codec.dumps_str(
+        [
+            {
+                "client_id": client_id,
+                "secret_sha256": hash_client_secret(CLIENT_SECRET),
+                "scopes": [],
+            }
+            for client_id in sorted(clients)
+        ]
+    )
+
+    replay = Replay(views.asgi_app, records, args.speed)
+    async with views.lifespan(views.app):
+        await replay.seed(views.app.state.container.token_store)
+        report = replay.report(await replay.run())
+    await users.stop()
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "wb") as f:
+            f.write(codec.dumps(report))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
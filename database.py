@@ -1,6 +1,7 @@
+import itertools
 import os
 import time
-from typing import AsyncGenerator
+from typing import Any, AsyncGenerator, Optional
 
 from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import (
@@ -11,6 +12,8 @@ from sqlalchemy.ext.asyncio import (
 )
 from sqlalchemy.orm import DeclarativeBase
 
+from auth.utils.pool_metrics import InstrumentedAsyncQueuePool, instrument_engine
+
 
 class Engine(BaseModel):
     engine: AsyncEngine | None = Field(default=None)
@@ -30,16 +33,78 @@ HOST = os.environ.get("MYSQL_HOST", "localhost")
 PORT = os.environ.get("MYSQL_PORT", 3308)
 DATABASE = os.environ.get("MYSQL_DATABASE", "auth")
 DATABASE_URL = os.environ.get("DATABASE_URL")
+# Optional comma separated replica URLs, used for read only queries
+READ_DATABASE_URLS = [
+    url.strip()
+    for url in os.environ.get("READ_DATABASE_URLS", "").split(",")
+    if url.strip()
+]
+
+# Pool presets, picked with DB_POOL_PROFILE and overridable per setting below
+POOL_PROFILES: dict[str, dict[str, Any]] = {
+    "default": {
+        "pool_size": 20,
+        "max_overflow": 0,
+        "pool_timeout": 30,
+        "pool_recycle": 1800,
+        "pool_pre_ping": True,
+    },
+    # a few connections per worker, e.g. many uvicorn workers per host
+    "small": {
+        "pool_size": 5,
+        "max_overflow": 5,
+        "pool_timeout": 10,
+        "pool_recycle": 1800,
+        "pool_pre_ping": True,
+    },
+    # one or two workers per host taking all the traffic
+    "large": {
+        "pool_size": 50,
+        "max_overflow": 10,
+        "pool_timeout": 30,
+        "pool_recycle": 1800,
+        "pool_pre_ping": True,
+    },
+}
+
+POOL_PROFILE = os.environ.get("DB_POOL_PROFILE", "default")
+if POOL_PROFILE not in POOL_PROFILES:
+    raise ValueError(f"Unknown DB_POOL_PROFILE {POOL_PROFILE!r}")
+
+# Checkouts waiting longer than this are logged as warnings
+POOL_WAIT_WARN_MS = float(os.environ.get("DB_POOL_WAIT_WARN_MS", "100"))
+
+
+def pool_settings() -> dict[str, Any]:
+    settings = dict(POOL_PROFILES[POOL_PROFILE])
+    overrides = {
+        "pool_size": ("DB_POOL_SIZE", int),
+        "max_overflow": ("DB_MAX_OVERFLOW", int),
+        "pool_timeout": ("DB_POOL_TIMEOUT", float),
+        "pool_recycle": ("DB_POOL_RECYCLE", int),
+        "pool_pre_ping": ("DB_POOL_PRE_PING", lambda v: v.lower() == "true"),
+    }
+    for key, (env, cast) in overrides.items():
+        value = os.environ.get(env)
+        if value is not None:
+            settings[key] = cast(value)
+
+    settings["echo"] = os.environ.get("DB_ECHO", "false").lower() == "true"
+    return settings
+
+
+def create_pooled_engine(url: str, name: str) -> AsyncEngine:
+    engine = create_async_engine(
+        url=url, poolclass=InstrumentedAsyncQueuePool, **pool_settings()
+    )
+    instrument_engine(engine, name, POOL_WAIT_WARN_MS)
+    return engine
+
 
 attempt = 1
 while attempt < 10:
     try:
-        engine = create_async_engine(
-            url=str(DATABASE_URL),
-            pool_size=20,
-            max_overflow=0,
-            echo=True,
-        )
+        engine = create_pooled_engine(str(DATABASE_URL), "primary")
         engine_cfg.engine = engine
 
     except Exception as e:
@@ -59,11 +124,35 @@ SessionLocal = async_sessionmaker(
 )
 
 
+read_engines: list[AsyncEngine] = [
+    create_pooled_engine(url, f"replica-{index}")
+    for index, url in enumerate(READ_DATABASE_URLS)
+]
+ReadSessionLocals = [
+    async_sessionmaker(
+        autocommit=False, autoflush=False, bind=read_engine, class_=AsyncSession
+    )
+    for read_engine in read_engines
+]
+# round robin over the replicas, one pick per request
+_read_session_factories = itertools.cycle(ReadSessionLocals)
+
+
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with SessionLocal() as db:
         yield db
 
 
+async def get_read_db() -> AsyncGenerator[Optional[AsyncSession], None]:
+    """Session on a read replica, or None when no replica is configured."""
+    if not ReadSessionLocals:
+        yield None
+        return
+
+    async with next(_read_session_factories)() as db:
+        yield db
+
+
 async def get_engine() -> AsyncEngine:
     if engine_cfg.engine is None:
         raise Exception("Engine not initialized")
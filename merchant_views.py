@@ -1,85 +1,60 @@
-# from contextlib import asynccontextmanager
-
-# import aiohttp
-# from redis.asyncio import Redis
-# from fastapi import Depends, FastAPI, Request
-# from sqlalchemy.ext.asyncio import AsyncSession
-
-# from auth.clients import MerchantApiClient
-# from auth.dao import SimplePasswordAuthDAO
-# from auth.dto import AuthCredentials, UserPrivate
-# from auth.services.merchant_oauth_service import MerchantOAuthPasswordAuthService
-# from database import get_db
-
-# merchant_app = FastAPI(prefix="/merchant", tags=["merchant"])
-
-
-# async def get_merchant_client(request: Request):
-#     return MerchantApiClient(session=request.state.session)
-
-
-# async def get_redis():
-#     return aioredis.Redis()
-
-
-# async def get_merchant_dao(
-#     session: AsyncSession = Depends(get_db),
-# ):
-#     return SimplePasswordAuthDAO(session=session)
-
-
-# async def get_merchant_auth_service(
-#     session: AsyncSession = Depends(get_db),
-#     merchant_dao: SimplePasswordAuthDAO = Depends(get_merchant_dao),
-#     merchantClient: MerchantApiClient = Depends(get_merchant_client),
-#     redis: aioredis.Redis = Depends(get_redis),
-# ):
-#     return MerchantOAuthPasswordAuthService(
-#         session=session,
-#         auth_dao=merchant_dao,
-#         merchant_client=merchantClient,
-#         redis=redis,
-#     )
-
-
-# @merchant_app.get("/signin")
-# async def authenticate_merchant(
-#     auth_info: AuthCredentials,
-#     merchant_service: MerchantOAuthPasswordAuthService = Depends(
-#         get_merchant_auth_service
-#     ),
-# ):
-#     token_info = merchant_service.login_for_access_token(auth_info, role=["merchant"])
-#     return token_info
-
-
-# @merchant_app.get("/signup")
-# async def register_merchant(
-#     registration_info: UserPrivate,
-#     merchant_service: MerchantOAuthPasswordAuthService = Depends(
-#         get_merchant_auth_service
-#     ),
-# ):
-#     auth_model = merchant_service.create_user(registration_info)
-#     return auth_model
-
-
-# # @merchant_app.on_event("startup")
-# # async def startup_event(request: Request):
-# #     async with aiohttp.ClientSession() as session:
-# #         request.state.session = session
-
-
-# # @merchant_app.on_event("shutdown")
-# # async def shutdown_event(request: Request):
-# #     await request.state.session.close()
-
-
-# @asynccontextmanager
-# async def lifespan(app: FastAPI):
-#     async with aiohttp.ClientSession() as sess:
-#         app.state.session = sess
-
-#     yield
-
-#     await app.state.session.close()
+from typing import Awaitable, Callable
+
+from fastapi import APIRouter, Depends, Request, status
+from fastapi.exceptions import HTTPException
+from loguru import logger
+
+from auth.dto import AuthCredentials, UserPrivate
+from auth.exceptions import DeadlineExceeded
+from auth.services import OAuthPasswordAuthService
+from auth.utils.client_ip import client_ip
+
+AuthServiceDependency = Callable[..., Awaitable[OAuthPasswordAuthService]]
+
+
+def build_auth_router(
+    role: str, auth_service_dependency: AuthServiceDependency
+) -> APIRouter:
+    """Signin/signup routes for ``role``, mounted on the main app.
+
+    The service dependency decides which upstream client is used; the DB
+    engine, Redis pool and HTTP session are the app-wide ones.
+    """
+    router = APIRouter(tags=[role])
+
+    @router.post("/signin")
+    async def login(
+        request: Request,
+        auth_info: AuthCredentials,
+        authService: OAuthPasswordAuthService = Depends(auth_service_dependency),
+    ) -> dict[str, str]:
+        try:
+            token_info = await authService.login_for_access_token(
+                auth_info, role=[role], client_ip=client_ip(request)
+            )
+        except (HTTPException, DeadlineExceeded) as e:
+            logger.error(f"Error while authenticating {role}: {e}")
+            raise e
+        except Exception as e:
+            logger.error(f"Error while authenticating {role}: {e}")
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        return token_info
+
+    @router.post("/signup")
+    async def register(
+        auth_info: UserPrivate,
+        authService: OAuthPasswordAuthService = Depends(auth_service_dependency),
+    ) -> dict[str, str]:
+        try:
+            await authService.create_user(auth_info)
+        except (HTTPException, DeadlineExceeded) as e:
+            logger.error(f"Error while creating {role}: {e}")
+            raise e
+        except Exception as e:
+            logger.error(f"Error while creating {role}: {e}")
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        return {"message": f"{role.capitalize()} created successfully"}
+
+    return router
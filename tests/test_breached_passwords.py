@@ -0,0 +1,67 @@
+import hashlib
+import io
+from pathlib import Path
+
+import pytest
+
+from auth.utils.breached_passwords import BreachedPasswordIndex, build_index
+
+BREACHED = [f"password{i}" for i in range(500)]
+
+
+def dump(passwords: list[str]) -> io.BytesIO:
+    lines = [
+        f"{hashlib.sha1(p.encode()).hexdigest().upper()}:{i + 1}"
+        for i, p in enumerate(passwords)
+    ]
+    return io.BytesIO("\r\n".join(lines).encode("ascii"))
+
+
+@pytest.mark.parametrize("bloom_error_rate", [None, 0.01])
+def test_build_and_lookup_round_trip(
+    tmp_path: Path, bloom_error_rate: float | None
+) -> None:
+    path = str(tmp_path / "breached.idx")
+    source = dump(BREACHED + BREACHED[:10])
+    assert build_index(source, path, bloom_error_rate=bloom_error_rate) == 500
+
+    index = BreachedPasswordIndex(path)
+    try:
+        assert all(index.is_breached(p) for p in BREACHED)
+        assert not any(index.is_breached(f"unbreached{i}") for i in range(500))
+    finally:
+        index.close()
+
+
+def test_rebuild_leaves_open_indexes_intact(tmp_path: Path) -> None:
+    path = str(tmp_path / "breached.idx")
+    build_index(dump(BREACHED[:100]), path)
+    old = BreachedPasswordIndex(path)
+    try:
+        build_index(dump(BREACHED[100:]), path)
+        new = BreachedPasswordIndex(path)
+        try:
+            assert old.is_breached(BREACHED[0])
+            assert not old.is_breached(BREACHED[100])
+            assert new.is_breached(BREACHED[100])
+            assert not new.is_breached(BREACHED[0])
+        finally:
+            new.close()
+    finally:
+        old.close()
+    assert [p.name for p in tmp_path.iterdir()] == ["breached.idx"]
+
+
+def test_malformed_lines_are_skipped(tmp_path: Path) -> None:
+    path = str(tmp_path / "breached.idx")
+    source = dump(BREACHED[:100])
+    # valid hex of the wrong length, and not hex at all
+    source = io.BytesIO(b"ABCD:1\nXYZ:2\n" + source.getvalue() + b"\n0123:3")
+    assert build_index(source, path, chunk_entries=7) == 100
+
+    index = BreachedPasswordIndex(path)
+    try:
+        assert all(index.is_breached(p) for p in BREACHED[:100])
+        assert not index.is_breached(BREACHED[100])
+    finally:
+        index.close()
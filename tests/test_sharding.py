@@ -0,0 +1,165 @@
+import asyncio
+from collections import Counter
+from typing import Any, Awaitable, TypeVar
+
+import fakeredis
+
+from auth.utils.sharding import HashRing, ShardedRedis
+from auth.utils.token_store import RedisTokenStore
+
+T = TypeVar("T")
+
+KEYS = [f"token-{i}" for i in range(2000)]
+
+
+def run(coro: Awaitable[T]) -> T:
+    return asyncio.run(coro)  # type: ignore[arg-type]
+
+
+def nodes(*names: str) -> dict[str, Any]:
+    """An independent fake Redis server per node."""
+    return {
+        name: fakeredis.FakeAsyncRedis(
+            server=fakeredis.FakeServer(), decode_responses=True
+        )
+        for name in names
+    }
+
+
+def test_ring_spreads_keys_evenly() -> None:
+    ring = HashRing(["a", "b", "c", "d"])
+    counts = Counter(ring.node_for(key) for key in KEYS)
+    assert set(counts) == {"a", "b", "c", "d"}
+    for count in counts.values():
+        assert 0.15 * len(KEYS) < count < 0.35 * len(KEYS)
+
+
+def test_ring_moves_only_keys_to_the_new_node() -> None:
+    before = HashRing(["a", "b", "c", "d"])
+    after = HashRing(["a", "b", "c", "d", "e"])
+    moved = [key for key in KEYS if before.node_for(key) != after.node_for(key)]
+    assert all(after.node_for(key) == "e" for key in moved)
+    assert 0.1 * len(KEYS) < len(moved) < 0.3 * len(KEYS)
+
+
+def test_mget_and_delete_are_split_per_shard() -> None:
+    async def scenario() -> None:
+        clients = nodes("a", "b", "c")
+        redis = ShardedRedis(clients)
+        keys = KEYS[:100]
+        for key in keys:
+            await redis.set(key, f"value-{key}")
+
+        for key in keys:
+            owner = redis.ring.node_for(key)
+            for name, client in clients.items():
+                assert (await client.get(key) is not None) == (name == owner)
+
+        values = await redis.mget([*keys, "missing"])
+        assert values == [f"value-{key}" for key in keys] + [None]
+
+        assert await redis.delete(*keys[:50], "missing") == 50
+        assert await redis.mget(keys[:50]) == [None] * 50
+        assert await redis.exists(*keys[50:]) == 50
+
+    run(scenario())
+
+
+def reshard() -> tuple[ShardedRedis, ShardedRedis, list[str]]:
+    clients = nodes("a", "b", "c")
+    old = ShardedRedis(clients, nodes=["a", "b"])
+    new = ShardedRedis(clients, nodes=["a", "b", "c"], previous_nodes=["a", "b"])
+    moved = [key for key in KEYS if new.ring.node_for(key) == "c"][:20]
+    return old, new, moved
+
+
+def test_reads_fall_back_to_the_previous_ring_and_migrate() -> None:
+    async def scenario() -> None:
+        old, new, moved = reshard()
+        for key in moved:
+            await old.set(key, f"value-{key}", ex=600)
+
+        assert await new.get(moved[0]) == f"value-{moved[0]}"
+        c = new.clients["c"]
+        assert await c.get(moved[0]) == f"value-{moved[0]}"
+        assert 0 < await c.pttl(moved[0]) <= 600_000
+        assert await old.get(moved[0]) is None
+
+        values = await new.mget(moved[1:])
+        assert values == [f"value-{key}" for key in moved[1:]]
+        assert await c.exists(*moved) == len(moved)
+
+    run(scenario())
+
+
+def test_delete_during_a_migration_is_not_undone() -> None:
+    async def scenario() -> None:
+        old, new, moved = reshard()
+        key = moved[0]
+        await old.set(key, "value", ex=600)
+
+        assert new.previous_ring is not None
+        previous = new.clients[new.previous_ring.node_for(key)]
+        pttl = previous.pttl
+
+        async def delete_then_pttl(name: str) -> int:
+            # the migration has read the value, the revocation lands now
+            ttl = await pttl(name)
+            assert await new.delete(key) == 1
+            return ttl
+
+        previous.pttl = delete_then_pttl
+        assert await new.get(key) is None
+        previous.pttl = pttl
+
+        assert await new.get(key) is None
+        for client in new.clients.values():
+            assert await client.get(key) is None
+
+    run(scenario())
+
+
+def test_ttl_and_expire_see_keys_not_migrated_yet() -> None:
+    async def scenario() -> None:
+        old, new, moved = reshard()
+        key = moved[0]
+        await old.set(key, "value", ex=600)
+
+        assert 0 < await new.pttl(key) <= 600_000
+        assert 0 < await new.ttl(key) <= 600
+        assert await new.expire(key, 900)
+        assert 600 < await new.ttl(key) <= 900
+        assert await new.pttl("missing") == -2
+        assert not await new.expire("missing", 10)
+
+        # GET and PTTL run concurrently here, the GET migrates the key
+        store = RedisTokenStore(new)  # type: ignore[arg-type]
+        value, ttl = await store.get_with_ttl(key)
+        assert value == "value"
+        assert ttl is not None and 600 < ttl <= 900
+
+    run(scenario())
+
+
+def test_session_index_spans_both_rings() -> None:
+    async def scenario() -> None:
+        old, new, _ = reshard()
+        # an owner whose index moves to the new node
+        owner = next(
+            f"user-{i}"
+            for i in range(1000)
+            if new.ring.node_for(f"sessions:user-{i}") == "c"
+        )
+        before = RedisTokenStore(old)  # type: ignore[arg-type]
+        after = RedisTokenStore(new)  # type: ignore[arg-type]
+        await before.set("token-old", "1", 600, owner)
+        await after.set("token-new", "1", 600, owner)
+
+        assert sorted(await after.tokens_of(owner)) == ["token-new", "token-old"]
+        assert sorted(await after.delete_owner(owner)) == ["token-new", "token-old"]
+        assert await new.mget(["token-old", "token-new"]) == [None, None]
+        assert await after.tokens_of(owner) == []
+        assert not await old.clients["a"].exists("sessions:" + owner)
+        assert not await old.clients["b"].exists("sessions:" + owner)
+
+    run(scenario())
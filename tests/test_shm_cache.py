@@ -0,0 +1,57 @@
+from pathlib import Path
+
+import pytest
+
+from auth.utils.near_cache import NearTokenCache, token_digest
+from auth.utils.shm_cache import SharedTokenCache, layout_path
+
+RECORD = {"user_id": "1", "subject": "1"}
+
+
+def worker(path: Path) -> NearTokenCache:
+    """A worker's near cache over the host-wide file, already subscribed."""
+    shared = SharedTokenCache(str(path), slots=64)
+    cache = NearTokenCache(None, shared=shared)  # type: ignore[arg-type]
+    cache._subscribed.set()
+    return cache
+
+
+def test_put_and_get_across_workers(tmp_path: Path) -> None:
+    a, b = worker(tmp_path / "cache"), worker(tmp_path / "cache")
+    a.put("token", RECORD, ttl=10, generation=a.generation)
+    assert b.get("token") == RECORD
+    assert b.shared is not None and b.shared.hits == 1
+
+
+def test_revocation_is_not_put_back_by_a_lagging_worker(tmp_path: Path) -> None:
+    a, b, c = (worker(tmp_path / "cache") for _ in range(3))
+    # b reads the record from Redis, then a revokes it before b caches it
+    generation = b.generation
+    assert a.shared is not None
+    a.shared.delete(token_digest("token"))
+
+    b.put("token", RECORD, ttl=10, generation=generation)
+    assert b.get("token") is None
+    assert c.get("token") is None
+    assert b.shared is not None and b.shared.stale == 1
+
+
+def test_layouts_do_not_share_a_file(tmp_path: Path) -> None:
+    path = str(tmp_path / "cache")
+    cache = SharedTokenCache(path, slots=64)
+    cache.put(token_digest("token"), RECORD, ttl=10)
+
+    resized = SharedTokenCache(path, slots=128)
+    assert resized.path != cache.path
+    assert resized.get(token_digest("token")) is None
+    # the old layout keeps serving its workers
+    assert cache.get(token_digest("token")) is not None
+
+
+def test_foreign_file_is_not_truncated(tmp_path: Path) -> None:
+    path = str(tmp_path / "cache")
+    with open(layout_path(path, 64), "wb") as f:
+        f.write(b"not a cache")
+    with pytest.raises(ValueError):
+        SharedTokenCache(path, slots=64)
+    assert Path(layout_path(path, 64)).read_bytes() == b"not a cache"
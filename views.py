@@ -1,24 +1,74 @@
+import base64
+import binascii
+import hmac
+import os
+import time
 from contextlib import asynccontextmanager
-from typing import TYPE_CHECKING, AsyncGenerator
+from datetime import datetime
+from urllib.parse import parse_qs, unquote_plus
+from typing import TYPE_CHECKING, AsyncGenerator, Optional, Union
 
 import aiohttp
-from fastapi import Depends, FastAPI, Request, status
+from fastapi import Depends, FastAPI, Header, Query, Request, Response, status
 from fastapi.exceptions import HTTPException
+from fastapi.responses import ORJSONResponse
 
 # add file handler for View layer
 from fastapi.middleware.cors import CORSMiddleware
 from loguru import logger
 from redis.asyncio import Redis
+from redis.asyncio.cluster import RedisCluster
 
 # from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from auth.clients import UserApiClient
-from auth.dao import SimplePasswordAuthDAO
+from auth.container import ServiceContainer
+from auth.dao import LoginAuditDAO, SignupOutboxDAO
 from auth.dto import AuthCredentials, UserPrivate
-from auth.services import OAuthPasswordAuthService
-from auth.utils.token_utils import get_token
-from database import get_db
+from auth.exceptions import DeadlineExceeded
+from auth.middleware import (
+    DeadlineMiddleware,
+    ProfileStore,
+    ProfilingMiddleware,
+    TokenVerifyFastPath,
+    TracingMiddleware,
+    TrafficCaptureMiddleware,
+)
+from auth.middleware.token_verify import ASGIApp
+from auth.services import (
+    ClientRegistry,
+    LoginAuditLogger,
+    MerchantOAuthPasswordAuthService,
+    OAuthPasswordAuthService,
+    SignupOutboxService,
+    SignupOutboxWorker,
+)
+from auth.services.oauth_password_auth_service import decode_access_token
+from auth.utils import codec
+from auth.utils.api_utils import retry_stats
+from auth.utils.client_ip import client_ip
+from auth.utils.bloom import BloomFilter, MembershipFilter, RedisBloomFilter
+from auth.utils.breached_passwords import BreachedPasswordIndex
+from auth.utils.deadline import deadline_stats
+from auth.utils.near_cache import NearTokenCache
+from auth.utils.pool_metrics import pool_stats
+from auth.utils.sharding import ShardedRedis
+from auth.utils.shm_cache import SharedTokenCache
+from auth.utils.token_store import InMemoryTokenStore, RedisTokenStore, TokenStore
+from auth.utils.token_utils import (
+    delete_token,
+    get_token,
+    parse_bearer,
+    revoke_sessions,
+)
+from auth.utils.tracing import (
+    BatchSpanProcessor,
+    client_trace_config,
+    create_exporter,
+    tracer,
+)
+from database import SessionLocal, get_db, get_read_db
+from merchant_views import build_auth_router
 
 logger.add("views.log")
 
@@ -27,65 +77,305 @@ if TYPE_CHECKING:
 else:
     RedisType = Redis  # this is not seen by mypy but will be executed at runtime
 
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis")
+# Either a Redis Cluster seed node, or comma separated nodes for client side
+# sharding. REDIS_PREVIOUS_SHARD_URLS lists the old nodes while resharding.
+REDIS_CLUSTER_URL = os.getenv("REDIS_CLUSTER_URL")
+REDIS_SHARD_URLS = [u for u in os.getenv("REDIS_SHARD_URLS", "").split(",") if u]
+REDIS_PREVIOUS_SHARD_URLS = [
+    u for u in os.getenv("REDIS_PREVIOUS_SHARD_URLS", "").split(",") if u
+]
+
+# "redis", or "memory" for a single worker without a shared token store
+TOKEN_STORE = os.getenv("TOKEN_STORE", "redis")
+
+# per-worker cache of verified tokens, invalidated over Redis pub/sub
+NEAR_CACHE = os.getenv("NEAR_CACHE", "on") == "on"
+NEAR_CACHE_TTL = float(os.getenv("NEAR_CACHE_TTL", "30"))
+NEAR_CACHE_MAX_ENTRIES = int(os.getenv("NEAR_CACHE_MAX_ENTRIES", "100000"))
+# host-wide second level shared by the workers, e.g. /dev/shm/auth-token-cache;
+# the table layout is appended to the file name
+SHM_CACHE_PATH = os.getenv("SHM_CACHE_PATH")
+SHM_CACHE_SLOTS = int(os.getenv("SHM_CACHE_SLOTS", "65536"))
+
+# upper bound on how long the edge may cache an introspection decision
+INTROSPECT_MAX_AGE = int(os.getenv("INTROSPECT_MAX_AGE", "30"))
+
+# time budget per request, outbound calls get whatever is left of it
+REQUEST_DEADLINE_MS = float(os.getenv("REQUEST_DEADLINE_MS", "5000"))
+
+# keepalive pool to the user service
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))
+
+# connections opened before the app reports ready, 0 disables
+WARMUP_DB_CONNECTIONS = int(os.getenv("WARMUP_DB_CONNECTIONS", "5"))
+WARMUP_REDIS_CONNECTIONS = int(os.getenv("WARMUP_REDIS_CONNECTIONS", "5"))
+WARMUP_HTTP_CONNECTIONS = int(os.getenv("WARMUP_HTTP_CONNECTIONS", "5"))
+WARMUP_HTTP_PATH = os.getenv("WARMUP_HTTP_PATH", "/health")
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "10"))
+
+# opt-in request profiling, enabled by a signing secret or a sample rate
+PROFILE_SECRET = os.getenv("PROFILE_SECRET")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+PROFILE_MAX_PROFILES = int(os.getenv("PROFILE_MAX_PROFILES", "50"))
+
+# "off", "console", "file" (TRACING_FILE) or "otlp" (OTLP/HTTP JSON)
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "off")
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "auth-service")
+OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318")
+
+# anonymized request shapes for python -m benchmarks.replay, written to
+# CAPTURE_DIR; workers sharing CAPTURE_SECRET hash identities alike
+CAPTURE_DIR = os.getenv("CAPTURE_DIR")
+CAPTURE_SECRET = os.getenv("CAPTURE_SECRET")
+
+# buffered signin audit trail, see LoginAuditLogger for the AUDIT_* knobs
+AUDIT_LOG = os.getenv("AUDIT_LOG", "on") == "on"
+
+# guards the /admin endpoints, which are disabled while it is unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# "sync" creates the user inline, "outbox" queues it for the signup worker
+SIGNUP_MODE = os.getenv("SIGNUP_MODE", "sync")
+
+# index built with python -m auth.utils.breached_passwords, checked at signup
+BREACHED_PASSWORDS_INDEX = os.getenv("BREACHED_PASSWORDS_INDEX")
+
+# duplicate signup pre-check: "local" per worker, "redis" shared, or "off"
+SIGNUP_FILTER = os.getenv("SIGNUP_FILTER", "local")
+SIGNUP_FILTER_CAPACITY = int(os.getenv("SIGNUP_FILTER_CAPACITY", "1000000"))
+SIGNUP_FILTER_ERROR_RATE = float(os.getenv("SIGNUP_FILTER_ERROR_RATE", "0.01"))
+
+
+def create_redis() -> RedisType:
+    if REDIS_CLUSTER_URL:
+        return RedisCluster.from_url(REDIS_CLUSTER_URL, decode_responses=True)  # type: ignore
+
+    if REDIS_SHARD_URLS:
+        return ShardedRedis.from_urls(  # type: ignore
+            REDIS_SHARD_URLS,
+            previous_urls=REDIS_PREVIOUS_SHARD_URLS or None,
+            decode_responses=True,
+        )
 
-async def get_aio_session(request: Request) -> aiohttp.ClientSession:
-    if (
-        hasattr(request.app.state, "aio_session")
-        and type(request.app.state.aio_session) is aiohttp.ClientSession
-    ):
-        return request.app.state.aio_session
-    else:
-        logger.error("failed to get attribute aio_session")
-        logger.error("AIO session not created")
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-
-async def get_redis() -> RedisType:
     # redis_client = aioredis.from_url(url="redis://redis", decode_responses=True)
-    redis_client = Redis.from_url(url="redis://redis", decode_responses=True)
+    redis_client = Redis.from_url(url=REDIS_URL, decode_responses=True)
     return redis_client
 
 
-async def getUserClient(
-    session: aiohttp.ClientSession = Depends(get_aio_session),
-) -> UserApiClient:
-    return UserApiClient(session=session)
+def create_invalidation_redis(redis: RedisType) -> RedisType:
+    """Client for the token invalidation channel."""
+    if isinstance(redis, ShardedRedis):
+        # every worker hashes the channel name to the same node
+        return redis.client_for("token-invalidation")
+    if isinstance(redis, RedisCluster):
+        # cluster pub/sub is broadcast to all nodes, any node will do
+        return Redis.from_url(REDIS_CLUSTER_URL, decode_responses=True)  # type: ignore
+    return redis
+
+
+def create_token_store(redis: RedisType) -> TokenStore:
+    if TOKEN_STORE == "memory":
+        logger.warning("Tokens are kept in process memory, run a single worker")
+        return InMemoryTokenStore()
+    if TOKEN_STORE == "redis":
+        return RedisTokenStore(redis)
+    raise ValueError(f"Unknown token store {TOKEN_STORE!r}")
+
+
+def create_aio_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_POOL_LIMIT, keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        json_serialize=codec.dumps_str,
+        trace_configs=[client_trace_config()] if TRACING_EXPORTER != "off" else None,
+    )
+
+
+async def get_container(request: Request) -> ServiceContainer:
+    return request.app.state.container
+
+
+async def require_admin(request: Request) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    supplied = request.headers.get("X-Admin-Token", "")
+    if not hmac.compare_digest(supplied.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+
+
+async def get_redis(
+    container: ServiceContainer = Depends(get_container),
+) -> RedisType:
+    # one connection pool per app, shared by every role
+    return container.redis
 
 
 async def getAuthService(
     session: AsyncSession = Depends(get_db),
-    userClient: UserApiClient = Depends(getUserClient),
-    redis: RedisType = Depends(get_redis),
+    read_session: Optional[AsyncSession] = Depends(get_read_db),
+    container: ServiceContainer = Depends(get_container),
 ) -> OAuthPasswordAuthService:
-    auth_dao = SimplePasswordAuthDAO(session=session)
-    return OAuthPasswordAuthService(
-        session, auth_dao=auth_dao, user_client=userClient, redis=redis
-    )
+    return container.auth_service(session, read_session)
+
+
+async def getMerchantAuthService(
+    session: AsyncSession = Depends(get_db),
+    read_session: Optional[AsyncSession] = Depends(get_read_db),
+    container: ServiceContainer = Depends(get_container),
+) -> MerchantOAuthPasswordAuthService:
+    return container.merchant_auth_service(session, read_session)
+
+
+async def getSignupOutboxService(
+    session: AsyncSession = Depends(get_db),
+    container: ServiceContainer = Depends(get_container),
+) -> SignupOutboxService:
+    return container.signup_outbox_service(session)
+
+
+def signup_filter_key(username: str, subject: str) -> str:
+    """``username_key`` of the service that owns auth ``subject``."""
+    kind, separator, _ = subject.rpartition(":")
+    return f"username:{kind}:{username}" if separator else f"username:{username}"
+
+
+async def build_signup_filter(redis: RedisType) -> Optional[MembershipFilter]:
+    signup_filter: MembershipFilter
+    if SIGNUP_FILTER == "redis":
+        signup_filter = RedisBloomFilter(
+            redis, "signup_filter", SIGNUP_FILTER_CAPACITY, SIGNUP_FILTER_ERROR_RATE
+        )
+        # another worker (or an earlier run) already seeded the shared bitmap
+        if await signup_filter.exists():
+            return signup_filter
+    elif SIGNUP_FILTER == "local":
+        signup_filter = BloomFilter(SIGNUP_FILTER_CAPACITY, SIGNUP_FILTER_ERROR_RATE)
+    else:
+        return None
+
+    # usernames live upstream; seed the ones this service has seen sign in or
+    # sign up, the rest are learned as they do
+    loaded = 0
+    async with SessionLocal() as session:
+        audit_dao = LoginAuditDAO(session)
+        after = ("", "")
+        while True:
+            pairs = await audit_dao.list_signed_in(after, 10_000)
+            if not pairs:
+                break
+            await signup_filter.add_many(
+                [signup_filter_key(username, subject) for username, subject in pairs]
+            )
+            after = pairs[-1]
+            loaded += len(pairs)
+
+        outbox_dao = SignupOutboxDAO(session)
+        last_id = 0
+        while True:
+            rows = await outbox_dao.list_completed_usernames(last_id, 10_000)
+            if not rows:
+                break
+            # the outbox only signs up users
+            await signup_filter.add_many(
+                [signup_filter_key(username, "") for _, username in rows]
+            )
+            last_id = rows[-1][0]
+            loaded += len(rows)
+
+    logger.info(f"Signup filter ({SIGNUP_FILTER}) seeded with {loaded} usernames")
+    return signup_filter
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     from sqlmodel import SQLModel
 
-    from database import engine
+    from database import engine, read_engines
 
+    # create only: the signup outbox and the login audit must survive restarts,
+    # and other workers may already be serving from these tables
     async with engine.begin() as conn:
-        await conn.run_sync(SQLModel.metadata.drop_all)
         await conn.run_sync(SQLModel.metadata.create_all)
 
-    app.state.redis = await get_redis()
-    app.state.aio_session = aiohttp.ClientSession()
+    if TRACING_EXPORTER != "off":
+        tracer.processor = BatchSpanProcessor(
+            create_exporter(
+                TRACING_EXPORTER, TRACING_FILE, OTLP_ENDPOINT, TRACING_SERVICE_NAME
+            )
+        )
+        tracer.processor.start()
+
+    redis = create_redis()
+    token_store = create_token_store(redis)
+    token_cache = None
+    # an in-process store is as fast as the near cache, nothing to add
+    if NEAR_CACHE and TOKEN_STORE == "redis":
+        token_cache = NearTokenCache(
+            create_invalidation_redis(redis),
+            max_entries=NEAR_CACHE_MAX_ENTRIES,
+            ttl=NEAR_CACHE_TTL,
+            shared=SharedTokenCache(SHM_CACHE_PATH, SHM_CACHE_SLOTS)
+            if SHM_CACHE_PATH
+            else None,
+        )
+        await token_cache.start()
+
+    audit = None
+    if AUDIT_LOG:
+        audit = LoginAuditLogger(SessionLocal)
+        audit.start()
+
+    container = ServiceContainer(
+        redis,
+        token_store,
+        create_aio_session(),
+        signup_filter=await build_signup_filter(redis),
+        token_cache=token_cache,
+        audit=audit,
+        breached_passwords=BreachedPasswordIndex(BREACHED_PASSWORDS_INDEX)
+        if BREACHED_PASSWORDS_INDEX
+        else None,
+        oauth_clients=ClientRegistry.from_env(),
+    )
+    if SIGNUP_MODE == "outbox":
+        container.signup_worker = SignupOutboxWorker(
+            SessionLocal, container.user_client
+        )
+        container.signup_worker.start()
+
+    # the app only reports ready (lifespan startup complete) after this
+    await container.warm_up(
+        [engine, *read_engines],
+        db_connections=WARMUP_DB_CONNECTIONS,
+        redis_connections=WARMUP_REDIS_CONNECTIONS,
+        http_connections=WARMUP_HTTP_CONNECTIONS,
+        http_path=WARMUP_HTTP_PATH,
+        timeout=WARMUP_TIMEOUT,
+    )
+    app.state.container = container
 
     logger.info("lifespan started")
-    logger.info(app.state.aio_session)
     yield
 
-    await app.state.redis.close()
-    await app.state.aio_session.close()
+    await container.close()
+    if tracer.processor is not None:
+        await tracer.processor.stop()
+        tracer.processor = None
 
 
-app = FastAPI(root_path="/auth", lifespan=lifespan)
+app = FastAPI(
+    root_path="/auth", lifespan=lifespan, default_response_class=ORJSONResponse
+)
+
 
+app.add_middleware(DeadlineMiddleware, default_ms=REQUEST_DEADLINE_MS)
 
 app.add_middleware(
     CORSMiddleware,
@@ -95,12 +385,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# profiles are kept per worker process, the id carries the pid
+profile_store = ProfileStore(PROFILE_MAX_PROFILES)
+if PROFILE_SECRET or PROFILE_SAMPLE_RATE > 0:
+    app.add_middleware(
+        ProfilingMiddleware,
+        store=profile_store,
+        secret=PROFILE_SECRET,
+        sample_rate=PROFILE_SAMPLE_RATE,
+        interval_ms=PROFILE_INTERVAL_MS,
+    )
+
+if TRACING_EXPORTER != "off":
+    app.add_middleware(TracingMiddleware)
+
+app.include_router(
+    build_auth_router("merchant", getMerchantAuthService), prefix="/merchant"
+)
+
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(
+    request: Request, exc: DeadlineExceeded
+) -> ORJSONResponse:
+    logger.warning(f"{request.method} {request.url.path}: {exc}")
+    return ORJSONResponse(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        content={"detail": "Request deadline exceeded"},
+    )
+
 
 # @app.on_event("startup")
 # async def init_tables():
 #     from sqlmodel import SQLModel
 
-#     from database import engine
+#     from database import engine, read_engines
 
 #     async with engine.begin() as conn:
 #         # await conn.run_sync(SQLModel.metadata.drop_all)
@@ -112,7 +431,7 @@ app.add_middleware(
 
 # @app.on_event("shutdown")
 # async def shutdown():
-#     await app.state.redis.close()
+#     await app.state.container.redis.close()
 #     await app.state.aio_session.close()
 
 
@@ -123,8 +442,10 @@ async def login(
     authService: OAuthPasswordAuthService = Depends(getAuthService),
 ) -> dict[str, str]:
     try:
-        token_info = await authService.login_for_access_token(auth_info, role=["user"])
-    except HTTPException as e:
+        token_info = await authService.login_for_access_token(
+            auth_info, role=["user"], client_ip=client_ip(request)
+        )
+    except (HTTPException, DeadlineExceeded) as e:
         logger.error(f"Error while authenticating user: {e}")
         raise e
     except Exception as e:
@@ -134,18 +455,88 @@ async def login(
     return token_info
 
 
+async def token_request_params(request: Request) -> dict[str, str]:
+    """Token endpoint parameters from a form (RFC 6749) or JSON body.
+
+    Client credentials may also come as HTTP Basic auth, which wins.
+    """
+    body = await request.body()
+    if request.headers.get("Content-Type", "").startswith("application/json"):
+        try:
+            payload = codec.loads(body) if body else {}
+        except ValueError:
+            payload = None
+        if not isinstance(payload, dict):
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, detail="invalid_request")
+        params = {key: str(value) for key, value in payload.items()}
+    else:
+        params = {
+            key: values[0]
+            for key, values in parse_qs(body.decode("latin-1")).items()
+        }
+
+    scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() == "basic":
+        try:
+            decoded = base64.b64decode(credentials, validate=True).decode("utf-8")
+        except (binascii.Error, UnicodeDecodeError):
+            raise HTTPException(
+                status.HTTP_401_UNAUTHORIZED,
+                detail="invalid_client",
+                headers={"WWW-Authenticate": "Basic"},
+            )
+        client_id, _, client_secret = decoded.partition(":")
+        params["client_id"] = unquote_plus(client_id)
+        params["client_secret"] = unquote_plus(client_secret)
+    return params
+
+
+@app.post("/oauth/token")
+async def oauth_token(
+    request: Request,
+    response: Response,
+    container: ServiceContainer = Depends(get_container),
+) -> dict[str, object]:
+    """Client-credentials grant for service-to-service tokens."""
+    params = await token_request_params(request)
+    if params.get("grant_type") != "client_credentials":
+        raise HTTPException(
+            status.HTTP_400_BAD_REQUEST, detail="unsupported_grant_type"
+        )
+    if not params.get("client_id") or "client_secret" not in params:
+        raise HTTPException(
+            status.HTTP_401_UNAUTHORIZED,
+            detail="invalid_client",
+            headers={"WWW-Authenticate": "Basic"},
+        )
+
+    token = await container.client_credentials.issue_token(
+        params["client_id"],
+        params["client_secret"],
+        scope=params.get("scope"),
+        client_ip=client_ip(request),
+    )
+    response.headers["Cache-Control"] = "no-store"
+    return token
+
+
 @app.post("/token/verify")
-async def token_verify(request: Request) -> dict[str, object]:
-    token = request.headers.get("Authorization")
-    if token is None:
+async def token_verify(
+    request: Request, container: ServiceContainer = Depends(get_container)
+) -> dict[str, object]:
+    # served by TokenVerifyFastPath when running asgi_app, kept for views:app
+    authorization = request.headers.get("Authorization")
+    if authorization is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="No token provided"
         )
-    # split bearer
-    token = token.split("Bearer ")[1]
 
-    token_info = await get_token(redis_instance=app.state.redis, token=token)
-    logger.info(f"token {token} info: {token_info}")
+    token = parse_bearer(authorization)
+    token_info = None
+    if token is not None:
+        token_info = await get_token(
+            container.token_store, token=token, cache=container.token_cache
+        )
 
     if token_info:
         return token_info
@@ -155,23 +546,219 @@ async def token_verify(request: Request) -> dict[str, object]:
     )
 
 
-@app.post("/signup")
-async def create_auth_user(
+@app.get("/token/introspect")
+async def token_introspect(
+    request: Request, container: ServiceContainer = Depends(get_container)
+) -> Response:
+    """nginx ``auth_request`` target: 204 with identity headers, or 401.
+
+    The 204 may be cached by the edge for up to INTROSPECT_MAX_AGE seconds,
+    never past the token's expiry; a revoked token can therefore still pass
+    at the edge for that long.
+    """
+    denied = Response(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        headers={"Cache-Control": "no-store", "WWW-Authenticate": "Bearer"},
+    )
+
+    token = parse_bearer(request.headers.get("Authorization"))
+    if token is None:
+        return denied
+
+    claims = decode_access_token(token)
+    if claims is None:
+        return denied
+
+    token_info = await get_token(
+        container.token_store, token=token, cache=container.token_cache
+    )
+    if token_info is None or str(token_info["user_id"]) != str(claims.get("user_id")):
+        return denied
+
+    max_age = min(INTROSPECT_MAX_AGE, int(float(claims["exp"]) - time.time()))  # type: ignore
+    roles = claims.get("role") or []
+    subject = token_info.get("subject", token_info["user_id"])
+    return Response(
+        status_code=status.HTTP_204_NO_CONTENT,
+        headers={
+            "X-User-Id": str(token_info["user_id"]),
+            # user and merchant ids overlap, the subject tells them apart
+            "X-Auth-Subject": str(subject),
+            "X-Roles": ",".join(roles),  # type: ignore
+            "Cache-Control": f"max-age={max_age}" if max_age > 0 else "no-store",
+            "Vary": "Authorization",
+        },
+    )
+
+
+@app.post("/token/revoke")
+async def token_revoke(
+    request: Request, container: ServiceContainer = Depends(get_container)
+) -> dict[str, object]:
+    token = parse_bearer(request.headers.get("Authorization"))
+    if token is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="No token provided"
+        )
+
+    revoked = await delete_token(
+        container.token_store, token, cache=container.token_cache
+    )
+    return {"revoked": revoked}
+
+
+@app.delete("/admin/sessions/{subject}", dependencies=[Depends(require_admin)])
+async def revoke_subject_sessions(
+    subject: str, container: ServiceContainer = Depends(get_container)
+) -> dict[str, object]:
+    """Revoke every token of an auth subject (``42`` or ``merchant:42``)."""
+    revoked = await revoke_sessions(
+        container.token_store, subject, cache=container.token_cache
+    )
+    return {"revoked": revoked}
+
+
+@app.get("/token/cache/stats", dependencies=[Depends(require_admin)])
+async def token_cache_stats(
+    container: ServiceContainer = Depends(get_container),
+) -> dict[str, object]:
+    if container.token_cache is None:
+        return {"enabled": False}
+    return container.token_cache.stats()
+
+
+async def _create_auth_user(
     auth_info: UserPrivate,
-    authService: OAuthPasswordAuthService = Depends(getAuthService),
+    response: Response,
+    authService: OAuthPasswordAuthService,
+    signupOutbox: SignupOutboxService,
 ) -> dict[str, str]:
     try:
-        auth = await authService.create_user(auth_info)
-        if auth:
-            return {"message": "User created successfully"}
-    except HTTPException as e:
-        logger.error("Error while creating user: {e}")
+        if SIGNUP_MODE == "outbox":
+            entry = await signupOutbox.submit(auth_info)
+            response.status_code = status.HTTP_202_ACCEPTED
+            return {"status": entry.status, "signup_id": entry.signup_id}
+
+        await authService.create_user(auth_info)
+        return {"message": "User created successfully"}
+    except (HTTPException, DeadlineExceeded) as e:
+        logger.error(f"Error while creating user: {e}")
         raise e
     except Exception as e:
         logger.error(f"Error while creating user: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@app.post("/signup", response_model=None)
+async def create_auth_user(
+    auth_info: UserPrivate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(
+        default=None, alias="Idempotency-Key", min_length=1, max_length=255
+    ),
+    authService: OAuthPasswordAuthService = Depends(getAuthService),
+    signupOutbox: SignupOutboxService = Depends(getSignupOutboxService),
+    container: ServiceContainer = Depends(get_container),
+) -> Union[dict[str, str], ORJSONResponse]:
+    if idempotency_key is None:
+        return await _create_auth_user(auth_info, response, authService, signupOutbox)
+
+    # the password stays out of the fingerprint, it is kept in Redis for a day
+    payload = auth_info.model_dump(mode="json", exclude={"password"})
+    claim = await container.idempotency.begin("signup", idempotency_key, payload)
+    if claim.replay is not None:
+        return ORJSONResponse(
+            claim.replay["body"],
+            status_code=claim.replay["status"],
+            headers={"Idempotent-Replayed": "true"},
+        )
+
+    try:
+        body = await _create_auth_user(auth_info, response, authService, signupOutbox)
+    except HTTPException as e:
+        # a 4xx is the answer for this request, a 5xx is worth retrying
+        if e.status_code < 500:
+            await claim.complete(e.status_code, {"detail": e.detail})
+        else:
+            await claim.release()
+        raise
+    except BaseException:
+        await claim.release()
+        raise
+
+    await claim.complete(response.status_code or status.HTTP_200_OK, body)
+    return body
+
+
+@app.get("/signup/{signup_id}")
+async def signup_status(
+    signup_id: str,
+    signupOutbox: SignupOutboxService = Depends(getSignupOutboxService),
+) -> dict[str, object]:
+    return await signupOutbox.get_status(signup_id)
+
+
 @app.get("/health")
 async def health() -> dict[str, object]:
     return {"health": "Good"}
+
+
+@app.get("/health/db-pool")
+async def db_pool_health() -> dict[str, object]:
+    return {"pools": pool_stats()}
+
+
+@app.get("/health/outbound")
+async def outbound_health() -> dict[str, object]:
+    return {"retries": dict(retry_stats), "deadline_exceeded": dict(deadline_stats)}
+
+
+@app.get("/admin/login-audit", dependencies=[Depends(require_admin)])
+async def search_login_audit(
+    username: Optional[str] = None,
+    user_id: Optional[str] = None,
+    ip: Optional[str] = None,
+    success: Optional[bool] = None,
+    since: Optional[datetime] = None,
+    limit: int = Query(default=100, ge=1, le=1000),
+    session: AsyncSession = Depends(get_db),
+    read_session: Optional[AsyncSession] = Depends(get_read_db),
+    container: ServiceContainer = Depends(get_container),
+) -> dict[str, object]:
+    """Signin events, newest first. Events still buffered are not included."""
+    events = await LoginAuditDAO(read_session or session).search(
+        username=username,
+        user_id=user_id,
+        ip=ip,
+        success=success,
+        since=since,
+        limit=limit,
+    )
+    return {
+        "events": [event.model_dump() for event in events],
+        "stats": container.audit.stats() if container.audit is not None else None,
+    }
+
+
+@app.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles() -> dict[str, object]:
+    return {"profiles": profile_store.summaries()}
+
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str) -> dict[str, object]:
+    """Speedscope JSON, open it at https://www.speedscope.app."""
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    return profile
+
+
+# entrypoint: token verification is answered before FastAPI routing, under
+# the same deadline (the nested one inside app never extends it)
+asgi_app: ASGIApp = DeadlineMiddleware(
+    TokenVerifyFastPath(app), default_ms=REQUEST_DEADLINE_MS
+)
+if CAPTURE_DIR:
+    # outermost, so fast path requests are captured too
+    asgi_app = TrafficCaptureMiddleware(asgi_app, CAPTURE_DIR, CAPTURE_SECRET)